@@ -1,39 +1,251 @@
 # api/currency_api.py
-import requests
+import asyncio
+import json
+import threading
+from pathlib import Path
+
+import httpx
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date, timedelta
+
+from api.rate_cache import RateCache
+from monitoring.metrics import instrument
 
 
 class CurrencyAPI:
     """Работа с API курсов валют (используем ЦБ РФ API)"""
 
-    def __init__(self):
-        self.base_url = "https://www.cbr-xml-daily.ru/daily_json.js"
+    # Имя файла курсов в архиве cbr-xml-daily.ru: archive/YYYY/MM/DD/daily_json.js
+    ARCHIVE_FILE_NAME = "daily_json.js"
+    BASE_URL = "https://www.cbr-xml-daily.ru/daily_json.js"
+    ARCHIVE_URL = "https://www.cbr-xml-daily.ru/archive/{date:%Y/%m/%d}/daily_json.js"
+
+    # Курсы на случай, когда нет ни сети, ни кэша
+    DEFAULT_RATES = {'usd_to_rub': 90.0, 'eur_to_rub': 100.0, 'usd_to_eur': 0.9}
+
+    def __init__(self, base_url=None, archive_url=None, cache_dir=None, cache_ttl=3600,
+                 timeout=10, max_concurrency=8):
+        """
+        Args:
+            base_url: URL текущих курсов (daily_json.js)
+            archive_url: шаблон URL архива с полем {date}
+            cache_dir: каталог дискового кэша курсов (None - без кэша)
+            cache_ttl: время жизни курсов текущего дня в кэше, секунд
+            timeout: таймаут HTTP-запроса, секунд
+            max_concurrency: максимум одновременных запросов к архиву
+        """
+        self.base_url = base_url or self.BASE_URL
+        self.archive_url = archive_url or self.ARCHIVE_URL
+        self.cache = RateCache(cache_dir, cache_ttl) if cache_dir else None
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._refresh_thread = None
+
+    @staticmethod
+    def _parse_rates(data, rate_date):
+        """Извлечение курсов USD/EUR из ответа в формате daily_json ЦБ РФ"""
+        usd = data['Valute']['USD']['Value']
+        eur = data['Valute']['EUR']['Value']
+        return {
+            'date': rate_date,
+            'usd_to_rub': usd,
+            'eur_to_rub': eur,
+            'usd_to_eur': usd / eur
+        }
+
+    @staticmethod
+    async def _get_json(client, url):
+        """GET JSON; None, если за дату нет файла (404 - выходные и праздники)"""
+        response = await client.get(url)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    async def fetch_current_rates_async(self):
+        """Текущие курсы ЦБ РФ (без кэша)"""
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            data = await self._get_json(client, self.base_url)
+        if data is None:
+            raise ValueError(f"Нет данных по адресу {self.base_url}")
+        return self._parse_rates(data, datetime.now().date())
+
+    async def fetch_range_async(self, start_date, end_date):
+        """
+        Исторические курсы за диапазон дат из архива ЦБ РФ
+
+        Даты из кэша не запрашиваются; остальные запрашиваются параллельно,
+        не более max_concurrency запросов одновременно. Прошедшие даты
+        кэшируются навсегда (в том числе дни без курсов).
+
+        Args:
+            start_date: начальная дата (включительно)
+            end_date: конечная дата (включительно)
+
+        Returns:
+            DataFrame с курсами валют, отсортированный по дате
+        """
+        today = datetime.now().date()
+        records, missing = [], []
+        for day in pd.date_range(start_date, end_date, freq='D').date:
+            found, rates, fresh = self.cache.get(day) if self.cache else (False, None, False)
+            if found and fresh:
+                if rates is not None:
+                    records.append(rates)
+            else:
+                missing.append(day)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch(client, day):
+            async with semaphore:
+                data = await self._get_json(client, self.archive_url.format(date=day))
+            rates = None
+            if data is not None:
+                # В архиве ЦБ поле Date - дата, на которую установлен курс
+                rate_date = (datetime.fromisoformat(data['Date']).date()
+                             if 'Date' in data else day)
+                rates = self._parse_rates(data, rate_date)
+            if self.cache:
+                self.cache.put(day, rates, final=day < today)
+            return rates
+
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            results = await asyncio.gather(*(fetch(client, day) for day in missing),
+                                           return_exceptions=True)
+
+        errors = 0
+        for day, result in zip(missing, results):
+            if isinstance(result, Exception):
+                errors += 1
+                print(f"⚠ Курсы за {day} не получены: {result!r}")
+            elif result is not None:
+                records.append(result)
+
+        df = pd.DataFrame(records, columns=['date', 'usd_to_rub', 'eur_to_rub', 'usd_to_eur'])
+        df = df.drop_duplicates(subset=['date'], keep='last').sort_values('date').reset_index(drop=True)
+        print(f"✓ Исторические курсы: {len(df)} дат, запрошено {len(missing)}, ошибок {errors}")
+        return df
+
+    def fetch_range(self, start_date, end_date):
+        """Синхронная обертка над fetch_range_async"""
+        return asyncio.run(self.fetch_range_async(start_date, end_date))
+
+    def _refresh_current_rates(self, today):
+        """Обновление курсов текущего дня в кэше (фоновый поток)"""
+        try:
+            self.cache.put(today, asyncio.run(self.fetch_current_rates_async()))
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            print(f"⚠ Фоновое обновление курсов не удалось: {e!r}")
+
+    def get_current_rates(self):
+        """
+        Текущие курсы с учетом кэша (stale-while-revalidate)
+
+        Свежая запись кэша возвращается сразу. Устаревшая тоже возвращается
+        сразу, а обновление запускается в фоновом потоке. Без кэша курсы
+        запрашиваются у ЦБ; при ошибке берутся последние курсы из кэша,
+        а если их нет - DEFAULT_RATES (с предупреждением).
+
+        Returns:
+            dict: курсы на текущую дату
+        """
+        today = datetime.now().date()
+        if self.cache:
+            found, rates, fresh = self.cache.get(today)
+            if found and fresh:
+                print("✓ Курсы валют из кэша")
+                return rates
+            if found:
+                print("Курсы валют в кэше устарели - используем их и обновляем в фоне")
+                self._refresh_thread = threading.Thread(target=self._refresh_current_rates,
+                                                        args=(today,), name='rates-refresh')
+                self._refresh_thread.start()
+                return rates
 
-    def get_exchange_rates(self):
-        """Получение текущих курсов валют через API"""
         try:
             print("Получение курсов валют от ЦБ РФ...")
-            response = requests.get(self.base_url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            rates = {
-                'date': datetime.now().date(),
-                'usd_to_rub': data['Valute']['USD']['Value'],
-                'eur_to_rub': data['Valute']['EUR']['Value'],
-                'usd_to_eur': data['Valute']['USD']['Value'] / data['Valute']['EUR']['Value']
-            }
-
-            print(f"✓ Курсы получены: USD={rates['usd_to_rub']:.2f} RUB, EUR={rates['eur_to_rub']:.2f} RUB")
-            return pd.DataFrame([rates])
-
-        except requests.exceptions.RequestException as e:
-            print(f"⚠ Ошибка при получении курсов валют: {e}")
-            print("Используем дефолтные значения...")
-            return pd.DataFrame([{
-                'date': datetime.now().date(),
-                'usd_to_rub': 90.0,
-                'eur_to_rub': 100.0,
-                'usd_to_eur': 0.9
-            }])
+            rates = asyncio.run(self.fetch_current_rates_async())
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            print(f"⚠ Ошибка при получении курсов валют: {e!r}")
+            cached = self.cache.latest() if self.cache else None
+            if cached is not None:
+                print(f"⚠ Используем последние курсы из кэша за {cached['date']}")
+                return {**cached, 'date': today}
+            print("⚠ Кэша нет - используем дефолтные значения курсов")
+            return {'date': today, **self.DEFAULT_RATES}
+
+        if self.cache:
+            self.cache.put(today, rates)
+        print(f"✓ Курсы получены: USD={rates['usd_to_rub']:.2f} RUB, EUR={rates['eur_to_rub']:.2f} RUB")
+        return rates
+
+    @instrument()
+    def get_exchange_rates(self, archive_dir=None, history_days=0):
+        """
+        Получение курсов валют: текущих и (опционально) исторических
+
+        Args:
+            archive_dir: каталог с локальным архивом ЦБ РФ (optional);
+                если указан, к текущим курсам добавляется история из архива
+            history_days: число прошедших дней, курсы за которые
+                запрашиваются из онлайн-архива ЦБ (0 - не запрашивать)
+        """
+        current_df = pd.DataFrame([self.get_current_rates()])
+
+        frames = []
+        if archive_dir is not None:
+            frames.append(self.load_archive_rates(archive_dir))
+        if history_days:
+            today = datetime.now().date()
+            frames.append(self.fetch_range(today - timedelta(days=history_days),
+                                           today - timedelta(days=1)))
+        if not frames:
+            return current_df
+
+        return (pd.concat([*frames, current_df], ignore_index=True)
+                .drop_duplicates(subset=['date'], keep='last')
+                .sort_values('date')
+                .reset_index(drop=True))
+
+    def load_archive_rates(self, archive_dir, start_date=None, end_date=None):
+        """
+        Загрузка исторических курсов из локального архива ЦБ РФ (backfill)
+
+        Ожидается структура архива cbr-xml-daily.ru:
+        <archive_dir>/YYYY/MM/DD/daily_json.js. Дни без файла (выходные,
+        праздники) пропускаются - для них действует предыдущий курс.
+
+        Args:
+            archive_dir: корневой каталог архива
+            start_date: начальная дата (включительно, optional)
+            end_date: конечная дата (включительно, optional)
+
+        Returns:
+            DataFrame с курсами валют, отсортированный по дате
+        """
+        archive_dir = Path(archive_dir)
+        print(f"Загрузка исторических курсов из архива: {archive_dir}")
+
+        records = []
+        for file_path in sorted(archive_dir.glob(f"*/*/*/{self.ARCHIVE_FILE_NAME}")):
+            year, month, day = (int(part) for part in file_path.parts[-4:-1])
+            file_date = date(year, month, day)
+            if start_date is not None and file_date < start_date:
+                continue
+            if end_date is not None and file_date > end_date:
+                continue
+
+            try:
+                data = json.loads(file_path.read_text(encoding='utf-8'))
+                # В архиве ЦБ поле Date - дата, на которую установлен курс
+                rate_date = (datetime.fromisoformat(data['Date']).date()
+                             if 'Date' in data else file_date)
+                records.append(self._parse_rates(data, rate_date))
+            except (ValueError, KeyError) as e:
+                print(f"⚠ Пропуск файла {file_path}: {e}")
+
+        df = pd.DataFrame(records, columns=['date', 'usd_to_rub', 'eur_to_rub', 'usd_to_eur'])
+        df = df.drop_duplicates(subset=['date'], keep='last').sort_values('date').reset_index(drop=True)
+        print(f"✓ Загружено курсов из архива: {len(df)} дат")
+        return df
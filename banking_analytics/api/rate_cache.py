@@ -0,0 +1,85 @@
+# api/rate_cache.py
+"""
+Дисковый кэш курсов валют по датам
+"""
+import json
+import os
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+
+
+class RateCache:
+    """
+    Кэш курсов в каталоге: один JSON-файл на дату
+
+    Записи за прошедшие даты помечаются как окончательные и не устаревают;
+    запись за текущий день устаревает через ttl секунд и тогда отдается
+    как устаревшая (stale) до обновления.
+    """
+
+    def __init__(self, cache_dir, ttl=3600):
+        """
+        Args:
+            cache_dir: каталог кэша
+            ttl: время жизни неокончательных записей, секунд
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+
+    def _path(self, rate_date):
+        return self.cache_dir / f"{rate_date.isoformat()}.json"
+
+    @staticmethod
+    def _decode(rates):
+        if rates is None:
+            return None
+        return {**rates, 'date': date.fromisoformat(rates['date'])}
+
+    def get(self, rate_date):
+        """
+        Запись кэша за дату
+
+        Returns:
+            tuple: (найдена ли запись, курсы или None для дня без курсов,
+                    свежая ли запись)
+        """
+        path = self._path(rate_date)
+        try:
+            entry = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return False, None, False
+
+        age = (datetime.now() - datetime.fromisoformat(entry['fetched_at'])).total_seconds()
+        fresh = entry['final'] or age < self.ttl
+        return True, self._decode(entry['rates']), fresh
+
+    def put(self, rate_date, rates, final=False):
+        """
+        Запись курсов за дату
+
+        Args:
+            rate_date: дата запроса (ключ кэша)
+            rates: словарь курсов (CurrencyAPI._parse_rates) или None,
+                если за дату курсов нет (выходной)
+            final: запись не устаревает (курсы за прошедшие даты)
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry = {
+            'fetched_at': datetime.now().isoformat(),
+            'final': final,
+            'rates': None if rates is None else {**rates, 'date': rates['date'].isoformat()},
+        }
+        # Запись через временный файл: кэш может обновляться из фонового потока
+        path = self._path(rate_date)
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(entry), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def latest(self):
+        """Курсы из самой поздней записи кэша (для работы без сети) или None"""
+        for path in sorted(self.cache_dir.glob('*.json'), reverse=True):
+            found, rates, _ = self.get(date.fromisoformat(path.stem))
+            if found and rates is not None:
+                return rates
+        return None
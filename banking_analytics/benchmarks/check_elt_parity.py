@@ -0,0 +1,94 @@
+# benchmarks/check_elt_parity.py
+"""
+Проверка совпадения fact таблицы pandas-пути и ELT-запроса
+
+Запуск из каталога banking_analytics:
+    python -m benchmarks.check_elt_parity
+    python -m benchmarks.check_elt_parity --transactions 100000 --seed 7
+
+Данные генерируются с фиксированным seed, курсы - синтетические и
+начинаются позже первых транзакций, с пропущенными днями; часть
+транзакций получает валюту без курса. Оба пути считаются во временной
+базе (как в run_benchmarks) и сравниваются DataLoader.check_elt_parity
+(EXCEPT ALL в обе стороны). Код возврата 1 - есть расхождения.
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.run_benchmarks import synthetic_exchange_rates, throwaway_database
+from config.config import get_config
+from create_schemas import create_schemas
+from data_generator.fake_data_generator import BankingDataGenerator
+from etl.extract import DataExtractor
+from etl.load import DataLoader
+from etl.transform import DataTransformer
+
+# Валюта без колонки *_to_rub в staging.exchange_rates - курс 1.0 в обоих путях
+UNKNOWN_CURRENCY = 'CNY'
+
+
+def parity_rates(transaction_dates, seed):
+    """
+    Курсы для сверки: первый курс позже первых транзакций, каждый пятый
+    день пропущен - проверяются as-of по прошлой дате и ранние транзакции
+    """
+    start, end = transaction_dates.min().date(), transaction_dates.max().date()
+    rates = synthetic_exchange_rates(start + pd.Timedelta(days=3), end, seed=seed)
+    return rates[np.arange(len(rates)) % 5 != 4].reset_index(drop=True)
+
+
+def check_elt_parity(config, num_customers, num_transactions, seed):
+    """
+    Оба пути на одних и тех же данных
+
+    Returns:
+        tuple: (строк только в pandas, строк только в ELT)
+    """
+    generator = BankingDataGenerator(num_customers=num_customers,
+                                     num_transactions=num_transactions, seed=seed)
+    customers_df = generator.generate_customers_vectorized()
+    accounts_df = generator.generate_accounts_vectorized(customers_df['customer_id'].to_numpy())
+    transactions_df = generator.generate_transactions_vectorized(accounts_df)
+    transactions_df.loc[transactions_df.index % 50 == 0, 'currency'] = UNKNOWN_CURRENCY
+    exchange_rates_df = parity_rates(pd.to_datetime(transactions_df['transaction_date']), seed)
+
+    with throwaway_database(config) as db:
+        create_schemas(db)
+        for df, table_name in [(customers_df, 'customers'), (accounts_df, 'accounts'),
+                               (transactions_df, 'transactions'),
+                               (generator.generate_branches(), 'branches'),
+                               (exchange_rates_df, 'exchange_rates')]:
+            db.load_dataframe(df, table_name, schema='staging')
+
+        # Тот же порядок, что в Pipeline.extract / transform / load
+        staging_data = DataExtractor(db).extract_all_staging_data()
+        transformer = DataTransformer(staging_data['exchange_rates'])
+        transactions_enriched = transformer.enrich_with_currency_rates(
+            transformer.clean_transactions(staging_data['transactions'])
+        )
+        date_from, date_to = transformer.get_date_range(staging_data['transactions'])
+
+        loader = DataLoader(db)
+        loader.load_dimensions(transformer.clean_customers(staging_data['customers']),
+                               staging_data['accounts'], staging_data['branches'],
+                               transformer.create_date_dimension(date_from, date_to))
+        return loader.check_elt_parity(transactions_enriched)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сверка pandas и ELT путей fact таблицы")
+    parser.add_argument('--customers', type=int, default=1000, help="число клиентов")
+    parser.add_argument('--transactions', type=int, default=10000, help="число транзакций")
+    parser.add_argument('--seed', type=int, default=42, help="seed генератора и курсов")
+    args = parser.parse_args(argv)
+
+    only_pandas, only_elt = check_elt_parity(get_config(), args.customers,
+                                             args.transactions, args.seed)
+    return 1 if only_pandas or only_elt else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
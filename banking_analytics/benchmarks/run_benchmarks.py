@@ -0,0 +1,328 @@
+# benchmarks/run_benchmarks.py
+"""
+Бенчмарки этапов пайплайна на уровнях объема 10K / 1M / 10M транзакций
+
+Запуск из каталога banking_analytics:
+    python -m benchmarks.run_benchmarks --tiers 10k,1m
+    python -m benchmarks.run_benchmarks --tiers 10k --baseline logs/benchmarks/prev.json
+
+Загрузка в БД замеряется во временной базе bench_<id> на сервере из
+Config (DB_HOST, DB_PORT, DB_USER, DB_PASSWORD); база удаляется после
+прогона. --skip-db оставляет только генерацию и трансформации.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from config.config import get_config
+from create_schemas import create_schemas
+from data_generator.fake_data_generator import BankingDataGenerator
+from data_generator.sharded_generator import ShardedDataGenerator
+from database.db_connection import DatabaseConnection
+from etl.load import DataLoader
+from etl.transform import DataTransformer
+from monitoring.metrics import peak_rss_mb
+
+
+# Уровень -> (клиентов, транзакций)
+TIERS = {
+    '10k': (1000, 10000),
+    '1m': (100000, 1000000),
+    '10m': (1000000, 10000000),
+}
+
+# Построчные генераторы Faker и execute_values на больших объемах
+# работают часами - выше этих порогов они не замеряются
+FAKER_MAX_ROWS = 100000
+INSERT_MAX_ROWS = 1000000
+
+
+def synthetic_exchange_rates(start, end, seed=0):
+    """Курсы валют на каждый день диапазона (без обращения к API ЦБ)"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, end, freq='D')
+    usd = np.round(90 + np.cumsum(rng.normal(0, 0.3, len(dates))), 4)
+    eur = np.round(usd * 1.08, 4)
+    return pd.DataFrame({
+        'date': dates.date,
+        'usd_to_rub': usd,
+        'eur_to_rub': eur,
+        'usd_to_eur': np.round(usd / eur, 4),
+    })
+
+
+class BenchmarkRunner:
+    """Замеры функций пайплайна с накоплением результатов"""
+
+    def __init__(self, repeat=1):
+        """
+        Args:
+            repeat: число повторов для функций без побочных эффектов в БД
+                (в результат идет лучший замер)
+        """
+        self.repeat = repeat
+        self.results = []
+
+    def measure(self, tier, name, rows, func, *args, repeat=None, **kwargs):
+        """
+        Замер вызова func(*args, **kwargs)
+
+        Args:
+            rows: число обработанных строк или функция от результата func,
+                если оно известно только после вызова
+
+        Returns:
+            результат последнего вызова func
+        """
+        best_wall, best_cpu, result = None, None, None
+        for _ in range(repeat or self.repeat):
+            gc.collect()
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            result = func(*args, **kwargs)
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            if best_wall is None or wall < best_wall:
+                best_wall, best_cpu = wall, cpu
+        if callable(rows):
+            rows = rows(result)
+
+        record = {
+            'tier': tier,
+            'benchmark': name,
+            'rows': rows,
+            'wall_sec': round(best_wall, 4),
+            'cpu_sec': round(best_cpu, 4),
+            'rows_per_sec': round(rows / best_wall, 1) if best_wall > 0 else None,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        self.results.append(record)
+        print(f"  {name:<55} {best_wall:>9.3f} сек  {record['rows_per_sec'] or 0:>14,.0f} строк/сек")
+        return result
+
+    def run_tier(self, tier, config, skip_db=False, load_methods=('copy',)):
+        """Все бенчмарки одного уровня"""
+        num_customers, num_transactions = TIERS[tier]
+        print(f"\n=== Уровень {tier}: {num_customers} клиентов, {num_transactions} транзакций ===")
+
+        generator = BankingDataGenerator(num_customers=num_customers,
+                                         num_transactions=num_transactions, seed=42)
+
+        # Генерация
+        customers_df = self.measure(tier, 'BankingDataGenerator.generate_customers_vectorized',
+                                    num_customers, generator.generate_customers_vectorized)
+        # Счетов от 1 до 3 на клиента - число строк берется из результата
+        accounts_df = self.measure(tier, 'BankingDataGenerator.generate_accounts_vectorized',
+                                   len, generator.generate_accounts_vectorized,
+                                   customers_df['customer_id'].to_numpy())
+        transactions_df = self.measure(tier, 'BankingDataGenerator.generate_transactions_vectorized',
+                                       num_transactions, generator.generate_transactions_vectorized,
+                                       accounts_df)
+        if num_transactions <= FAKER_MAX_ROWS:
+            self.measure(tier, 'BankingDataGenerator.generate_customers', num_customers,
+                         generator.generate_customers)
+            self.measure(tier, 'BankingDataGenerator.generate_transactions', num_transactions,
+                         generator.generate_transactions, accounts_df)
+        # Шардированная генерация: один процесс и все ядра (шарды - во временном каталоге)
+        for workers in sorted({1, os.cpu_count() or 1}):
+            with tempfile.TemporaryDirectory() as shard_dir:
+                sharded = ShardedDataGenerator(num_customers=num_customers,
+                                               num_transactions=num_transactions, seed=42,
+                                               num_workers=workers, output_dir=shard_dir,
+                                               file_format=config.GENERATOR_SHARD_FORMAT)
+                self.measure(tier, f'ShardedDataGenerator.run[{workers} процессов]',
+                             num_transactions, sharded.run)
+        branches_df = generator.generate_branches()
+
+        # Трансформации
+        dates = pd.to_datetime(transactions_df['transaction_date'])
+        exchange_rates_df = synthetic_exchange_rates(dates.min().date(), dates.max().date())
+        transformer = DataTransformer(exchange_rates_df)
+
+        customers_clean = self.measure(tier, 'DataTransformer.clean_customers', num_customers,
+                                       transformer.clean_customers, customers_df)
+        transactions_clean = self.measure(tier, 'DataTransformer.clean_transactions',
+                                          num_transactions, transformer.clean_transactions,
+                                          transactions_df)
+        transactions_enriched = self.measure(tier, 'DataTransformer.enrich_with_currency_rates',
+                                             len(transactions_clean),
+                                             transformer.enrich_with_currency_rates,
+                                             transactions_clean)
+        date_from, date_to = transformer.get_date_range(transactions_clean)
+        date_dim_df = self.measure(tier, 'DataTransformer.create_date_dimension',
+                                   (date_to - date_from).days + 1,
+                                   transformer.create_date_dimension, date_from, date_to)
+
+        if skip_db:
+            return
+
+        # Загрузка - во временной базе, отдельной для каждого уровня
+        with throwaway_database(config) as db:
+            create_schemas(db)
+            for method in load_methods:
+                if method == 'insert' and num_transactions > INSERT_MAX_ROWS:
+                    continue
+                db.execute_query("TRUNCATE staging.transactions")
+                self.measure(tier, f'DatabaseConnection.load_dataframe[{method}] staging.transactions',
+                             num_transactions, db.load_dataframe, transactions_df,
+                             'transactions', schema='staging', method=method, repeat=1)
+
+            loader = DataLoader(db, fact_load_workers=config.FACT_LOAD_WORKERS,
+                                bulk_load_threshold=config.BULK_LOAD_THRESHOLD,
+                                maintenance_work_mem_mb=config.MAINTENANCE_WORK_MEM_MB,
+                                swap_min_ratio=config.FACT_SWAP_MIN_RATIO)
+            self.measure(tier, 'DataLoader.load_dimensions',
+                         num_customers + len(accounts_df) + len(date_dim_df),
+                         loader.load_dimensions, customers_clean, accounts_df, branches_df,
+                         date_dim_df, repeat=1)
+            # customer_id добавляет запрос staging (LEFT JOIN accounts) -
+            # как в extract_all_from_stage_store, берем его из счетов
+            transactions_enriched['customer_id'] = transactions_enriched['account_id'].map(
+                accounts_df.set_index('account_id')['customer_id']
+            )
+            self.measure(tier, 'DataLoader.load_fact_table', len(transactions_enriched),
+                         loader.load_fact_table, transactions_enriched, repeat=1)
+
+
+def _admin_execute(config, statement):
+    """Команда вне транзакции в служебной базе postgres (CREATE/DROP DATABASE)"""
+    conn = psycopg2.connect(host=config.DB_HOST, port=config.DB_PORT, user=config.DB_USER,
+                            password=config.DB_PASSWORD, database='postgres')
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(statement)
+    finally:
+        conn.close()
+
+
+@contextmanager
+def throwaway_database(config):
+    """
+    Временная база для замеров загрузки: создается на входе, удаляется на выходе
+
+    Yields:
+        подключенный DatabaseConnection к временной базе
+    """
+    name = f"bench_{uuid.uuid4().hex[:8]}"
+    _admin_execute(config, f"CREATE DATABASE {name}")
+    db = DatabaseConnection(
+        host=config.DB_HOST, database=name, user=config.DB_USER,
+        password=config.DB_PASSWORD, port=config.DB_PORT,
+        load_method='copy', copy_chunk_size=config.COPY_CHUNK_SIZE,
+        pool_size=config.DB_POOL_SIZE
+    )
+    try:
+        db.connect()
+        yield db
+    finally:
+        db.close()
+        _admin_execute(config, f"DROP DATABASE IF EXISTS {name}")
+
+
+def git_commit():
+    """Текущий коммит репозитория (если доступен git)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_with_baseline(results, baseline_path, threshold):
+    """
+    Сравнение с предыдущим прогоном по (уровень, бенчмарк)
+
+    Returns:
+        list: записи, замедлившиеся больше чем на threshold
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['tier'], r['benchmark']): r for r in json.load(f)['results']}
+
+    print(f"\n=== Сравнение с {baseline_path} ===")
+    regressions = []
+    for record in results:
+        previous = baseline.get((record['tier'], record['benchmark']))
+        if previous is None or not previous['wall_sec']:
+            continue
+        ratio = record['wall_sec'] / previous['wall_sec']
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = '  ✗ медленнее'
+            regressions.append({**record, 'baseline_wall_sec': previous['wall_sec'],
+                                'ratio': round(ratio, 3)})
+        elif ratio < 1 - threshold:
+            mark = '  ✓ быстрее'
+        print(f"  {record['tier']:<4} {record['benchmark']:<55} "
+              f"{previous['wall_sec']:>9.3f} -> {record['wall_sec']:>9.3f} сек ({ratio:.2f}x){mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки пайплайна Banking Analytics")
+    parser.add_argument('--tiers', default='10k',
+                        help="уровни через запятую: " + ', '.join(TIERS))
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="повторы для замеров без записи в БД (берется лучший)")
+    parser.add_argument('--skip-db', action='store_true', help="без замеров загрузки в БД")
+    parser.add_argument('--load-methods', default='copy,insert',
+                        help="способы DatabaseConnection.load_dataframe через запятую")
+    parser.add_argument('--output', help="JSON с результатами "
+                                         "(по умолчанию LOGS_DIR/benchmarks/bench_<время>.json)")
+    parser.add_argument('--baseline', help="JSON предыдущего прогона для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="допустимое замедление относительно baseline (доля)")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help="код возврата 1 при замедлении больше threshold")
+    args = parser.parse_args(argv)
+
+    config = get_config()
+    tiers = [tier.strip().lower() for tier in args.tiers.split(',') if tier.strip()]
+    unknown = [tier for tier in tiers if tier not in TIERS]
+    if unknown:
+        parser.error(f"неизвестные уровни: {', '.join(unknown)}")
+
+    runner = BenchmarkRunner(repeat=args.repeat)
+    started_at = datetime.now()
+    for tier in tiers:
+        runner.run_tier(tier, config, skip_db=args.skip_db,
+                        load_methods=[m.strip() for m in args.load_methods.split(',') if m.strip()])
+
+    output = Path(args.output) if args.output else \
+        config.LOGS_DIR / 'benchmarks' / f"bench_{started_at.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': started_at.isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': sys.version.split()[0],
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'tiers': tiers,
+            'results': runner.results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ Результаты записаны: {output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(runner.results, args.baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,13 +10,22 @@ class Config:
     PROJECT_NAME = "Banking Analytics Pipeline"
     VERSION = "1.0.0"
 
-    # Пути
+    # Пути (каталоги создаются при первой записи, а не при импорте конфигурации)
     BASE_DIR = Path(__file__).resolve().parent.parent
     DATA_DIR = BASE_DIR / "data"
     LOGS_DIR = BASE_DIR / "logs"
-
-    DATA_DIR.mkdir(exist_ok=True)
-    LOGS_DIR.mkdir(exist_ok=True)
+    # Артефакты между подкомандами CLI (main.py generate/transform/...)
+    ARTIFACTS_DIR = DATA_DIR / "artifacts"
+    # Контрольные точки шагов: повторный запуск пропускает шаги с неизменными входами
+    CHECKPOINTS_ENABLED = os.getenv('CHECKPOINTS', '0') == '1'
+    CHECKPOINT_DIR = DATA_DIR / "checkpoints"
+
+    # Метрики этапов (JSON Lines, включаются METRICS=1) и дампы cProfile по этапам
+    METRICS_ENABLED = os.getenv('METRICS', '0') == '1'
+    METRICS_LOG = LOGS_DIR / "stage_metrics.jsonl"
+    PROFILE_STAGES = os.getenv('PROFILE_STAGES', '0') == '1'
+    PROFILE_DIR = LOGS_DIR / "profiles"
+    TRACE_MEMORY = os.getenv('TRACE_MEMORY', '0') == '1'
 
     # PostgreSQL настройки
     DB_HOST = os.getenv('DB_HOST', 'localhost')
@@ -25,14 +34,74 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'postgres')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '123')
 
+    # Загрузка: 'insert' (execute_values) или 'copy' (COPY FROM STDIN)
+    LOAD_METHOD = os.getenv('LOAD_METHOD', 'insert')
+    COPY_CHUNK_SIZE = int(os.getenv('COPY_CHUNK_SIZE', 100000))
+    # Параллельные соединения для загрузки fact таблицы по месячным партициям
+    FACT_LOAD_WORKERS = int(os.getenv('FACT_LOAD_WORKERS', 1))
+    # Доля строк партиции, от которой месяц при параллельной загрузке
+    # пересобирается и подменяется; меньшие порции дописываются (0 - всегда подмена)
+    FACT_SWAP_MIN_RATIO = float(os.getenv('FACT_SWAP_MIN_RATIO', 0.1))
+    # Пул соединений для параллельной загрузки таблиц (1 - последовательно);
+    # при FACT_LOAD_WORKERS > 1 не меньше FACT_LOAD_WORKERS + 1: по соединению
+    # на воркер fact таблицы и одно для фоновой записи staging и блокировок
+    # подменяемых партиций
+    DB_POOL_SIZE = max(int(os.getenv('DB_POOL_SIZE', 1)),
+                       FACT_LOAD_WORKERS + 1 if FACT_LOAD_WORKERS > 1 else 1)
+    # Порционная загрузка DataFrame с COMMIT на порцию и журналом dwh.etl_load_log
+    # (0 - весь DataFrame одной транзакцией); повторы при обрыве соединения
+    # с паузой LOAD_RETRY_BACKOFF * 2^n сек; ошибочные строки - в dwh.etl_rejects
+    LOAD_BATCH_SIZE = int(os.getenv('LOAD_BATCH_SIZE', 0))
+    LOAD_MAX_RETRIES = int(os.getenv('LOAD_MAX_RETRIES', 3))
+    LOAD_RETRY_BACKOFF = float(os.getenv('LOAD_RETRY_BACKOFF', 1.0))
+    LOAD_ISOLATE_REJECTS = os.getenv('LOAD_ISOLATE_REJECTS', '1') == '1'
+    # Порог строк для загрузки fact таблицы без индексов и FK
+    BULK_LOAD_THRESHOLD = int(os.getenv('BULK_LOAD_THRESHOLD', 1000000))
+    MAINTENANCE_WORK_MEM_MB = int(os.getenv('MAINTENANCE_WORK_MEM_MB', 1024))
+    # Потоковое извлечение транзакций порциями (0 - читать целиком)
+    EXTRACT_CHUNK_SIZE = int(os.getenv('EXTRACT_CHUNK_SIZE', 0))
+    # Построение fact таблицы: 'pandas' - в Python, 'elt' - INSERT ... SELECT
+    # в PostgreSQL; ELT_PARITY_CHECK=1 дополнительно сверяет оба пути
+    # (отдельная проверка на фиксированном seed: python -m benchmarks.check_elt_parity)
+    TRANSFORM_MODE = os.getenv('TRANSFORM_MODE', 'pandas')
+    ELT_PARITY_CHECK = os.getenv('ELT_PARITY_CHECK', '0') == '1'
+    # Компактные типы колонок (категории, int32, Arrow-строки) в памяти
+    COMPACT_DTYPES = os.getenv('COMPACT_DTYPES', '0') == '1'
+    # Инкрементальная загрузка по watermark-ам из dwh.etl_state
+    INCREMENTAL = os.getenv('INCREMENTAL', '0') == '1'
+    # Локальный Parquet staging; загрузка в PostgreSQL staging идет в фоне
+    STAGE_STORE_ENABLED = os.getenv('STAGE_STORE', '0') == '1'
+    STAGE_STORE_DIR = DATA_DIR / "stage"
+
     # Генератор данных
     NUM_CUSTOMERS = int(os.getenv('NUM_CUSTOMERS', 1000))
     NUM_TRANSACTIONS = int(os.getenv('NUM_TRANSACTIONS', 10000))
     NUM_BRANCHES = int(os.getenv('NUM_BRANCHES', 50))
+    # 'faker' - построчная генерация, 'vectorized' - numpy с seed (все таблицы),
+    # 'sharded' - параллельная генерация блоками в DATA_DIR/shards (шарды пишутся
+    # на диск и читаются обратно, поэтому на одном ядре медленнее 'vectorized')
+    GENERATOR_MODE = os.getenv('GENERATOR_MODE', 'faker')
+    GENERATOR_SEED = int(os.getenv('GENERATOR_SEED')) if os.getenv('GENERATOR_SEED') else None
+    GENERATOR_WORKERS = int(os.getenv('GENERATOR_WORKERS', os.cpu_count() or 1))
+    GENERATOR_SHARD_FORMAT = os.getenv('GENERATOR_SHARD_FORMAT', 'csv')
+    # Потоковая генерация прямо в staging порциями (0 - выключено)
+    STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 0))
 
     # API
-    CURRENCY_API_URL = "https://www.cbr-xml-daily.ru/daily_json.js"
+    # URL переопределяются для тестов на локальном stub-сервере
+    CURRENCY_API_URL = os.getenv('CURRENCY_API_URL', "https://www.cbr-xml-daily.ru/daily_json.js")
+    CURRENCY_ARCHIVE_URL = os.getenv(
+        'CURRENCY_ARCHIVE_URL', "https://www.cbr-xml-daily.ru/archive/{date:%Y/%m/%d}/daily_json.js"
+    )
     API_TIMEOUT = 10
+    API_MAX_CONCURRENCY = int(os.getenv('API_MAX_CONCURRENCY', 8))
+    # Дисковый кэш курсов: TTL для курсов текущего дня, секунд
+    RATES_CACHE_DIR = DATA_DIR / "rates_cache"
+    RATES_CACHE_TTL = int(os.getenv('RATES_CACHE_TTL', 3600))
+    # Сколько прошедших дней истории курсов запрашивать из онлайн-архива ЦБ
+    CBR_HISTORY_DAYS = int(os.getenv('CBR_HISTORY_DAYS', 0))
+    # Локальный архив ЦБ РФ (YYYY/MM/DD/daily_json.js) для backfill истории курсов
+    CBR_ARCHIVE_DIR = DATA_DIR / "cbr_archive"
 
     # Схемы БД
     STAGING_SCHEMA = "staging"
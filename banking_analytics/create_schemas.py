@@ -5,6 +5,265 @@
 from database.db_connection import DatabaseConnection
 
 
+# SQL команды для создания всех схем и таблиц
+SCHEMA_SQL = """
+-- Создание staging схемы
+CREATE SCHEMA IF NOT EXISTS staging;
+
+-- Создание dwh схемы
+CREATE SCHEMA IF NOT EXISTS dwh;
+
+-- Staging таблицы
+CREATE TABLE IF NOT EXISTS staging.customers (
+    customer_id INTEGER PRIMARY KEY,
+    first_name VARCHAR(100),
+    last_name VARCHAR(100),
+    email VARCHAR(200),
+    phone VARCHAR(50),
+    date_of_birth DATE,
+    city VARCHAR(100),
+    country VARCHAR(100),
+    registration_date DATE,
+    customer_segment VARCHAR(50)
+);
+
+CREATE TABLE IF NOT EXISTS staging.accounts (
+    account_id INTEGER PRIMARY KEY,
+    customer_id INTEGER,
+    account_number VARCHAR(50),
+    account_type VARCHAR(50),
+    currency VARCHAR(10),
+    balance DECIMAL(15, 2),
+    opening_date DATE,
+    status VARCHAR(50)
+);
+
+CREATE TABLE IF NOT EXISTS staging.transactions (
+    transaction_id INTEGER PRIMARY KEY,
+    account_id INTEGER,
+    transaction_date TIMESTAMP,
+    transaction_type VARCHAR(50),
+    amount DECIMAL(15, 2),
+    currency VARCHAR(10),
+    merchant_name VARCHAR(200),
+    transaction_status VARCHAR(50),
+    channel VARCHAR(50)
+);
+
+CREATE TABLE IF NOT EXISTS staging.branches (
+    branch_id INTEGER PRIMARY KEY,
+    branch_name VARCHAR(100),
+    city VARCHAR(100),
+    address TEXT,
+    region VARCHAR(50),
+    opening_date DATE
+);
+
+CREATE TABLE IF NOT EXISTS staging.exchange_rates (
+    date DATE PRIMARY KEY,
+    usd_to_rub DECIMAL(10, 4),
+    eur_to_rub DECIMAL(10, 4),
+    usd_to_eur DECIMAL(10, 4)
+);
+
+-- DWH Dimension Tables
+CREATE TABLE IF NOT EXISTS dwh.dim_customer (
+    customer_key SERIAL PRIMARY KEY,
+    customer_id INTEGER,
+    first_name VARCHAR(100),
+    last_name VARCHAR(100),
+    full_name VARCHAR(200),
+    email VARCHAR(200),
+    phone VARCHAR(50),
+    age INTEGER,
+    city VARCHAR(100),
+    country VARCHAR(100),
+    customer_segment VARCHAR(50),
+    registration_date DATE,
+    effective_date DATE,
+    expiration_date DATE,
+    is_current BOOLEAN DEFAULT TRUE,
+    -- Хэш отслеживаемых атрибутов (считается в pandas при SCD2-слиянии)
+    row_hash BIGINT
+);
+ALTER TABLE dwh.dim_customer ADD COLUMN IF NOT EXISTS row_hash BIGINT;
+
+CREATE TABLE IF NOT EXISTS dwh.dim_account (
+    account_key SERIAL PRIMARY KEY,
+    account_id INTEGER,
+    account_number VARCHAR(50),
+    account_type VARCHAR(50),
+    currency VARCHAR(10),
+    opening_date DATE,
+    status VARCHAR(50)
+);
+
+CREATE TABLE IF NOT EXISTS dwh.dim_date (
+    date_key INTEGER PRIMARY KEY,
+    date DATE,
+    year INTEGER,
+    quarter INTEGER,
+    month INTEGER,
+    month_name VARCHAR(20),
+    week INTEGER,
+    day_of_month INTEGER,
+    day_of_week INTEGER,
+    day_name VARCHAR(20),
+    is_weekend BOOLEAN
+);
+
+CREATE TABLE IF NOT EXISTS dwh.dim_transaction_type (
+    transaction_type_key SERIAL PRIMARY KEY,
+    transaction_type VARCHAR(50),
+    transaction_category VARCHAR(50),
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS dwh.dim_branch (
+    branch_key SERIAL PRIMARY KEY,
+    branch_id INTEGER,
+    branch_name VARCHAR(100),
+    city VARCHAR(100),
+    region VARCHAR(50),
+    address TEXT
+);
+
+-- DWH Fact Table (секционирована по месяцам date_key)
+CREATE TABLE IF NOT EXISTS dwh.fact_transactions (
+    transaction_key SERIAL,
+    transaction_id INTEGER,
+    date_key INTEGER,
+    customer_key INTEGER,
+    account_key INTEGER,
+    transaction_type_key INTEGER,
+    branch_key INTEGER,
+    amount_original DECIMAL(15, 2),
+    original_currency VARCHAR(10),
+    amount_rub DECIMAL(15, 2),
+    exchange_rate DECIMAL(10, 4),
+    transaction_status VARCHAR(50),
+    channel VARCHAR(50),
+    merchant_name VARCHAR(200),
+    PRIMARY KEY (transaction_key, date_key)
+) PARTITION BY RANGE (date_key);
+
+-- Агрегаты для дашбордов (обновляются по затронутым date_key после загрузки фактов)
+CREATE TABLE IF NOT EXISTS dwh.agg_daily_account_type (
+    date_key INTEGER NOT NULL,
+    account_key INTEGER NOT NULL,
+    transaction_type_key INTEGER NOT NULL,
+    transaction_count BIGINT NOT NULL,
+    amount_rub_sum DECIMAL(18, 2),
+    amount_rub_avg DECIMAL(15, 2),
+    PRIMARY KEY (date_key, account_key, transaction_type_key)
+);
+
+CREATE TABLE IF NOT EXISTS dwh.agg_daily_channel (
+    date_key INTEGER NOT NULL,
+    channel VARCHAR(50) NOT NULL,
+    transaction_count BIGINT NOT NULL,
+    amount_rub_sum DECIMAL(18, 2),
+    amount_rub_avg DECIMAL(15, 2),
+    PRIMARY KEY (date_key, channel)
+);
+
+-- Состояние инкрементальной загрузки (watermark-и источников)
+CREATE TABLE IF NOT EXISTS dwh.etl_state (
+    source_table VARCHAR(100) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    last_timestamp TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Журнал порционной загрузки (DatabaseConnection.load_dataframe, LOAD_BATCH_SIZE)
+CREATE TABLE IF NOT EXISTS dwh.etl_load_log (
+    log_id BIGSERIAL PRIMARY KEY,
+    load_id VARCHAR(32) NOT NULL,
+    schema_name VARCHAR(63) NOT NULL,
+    table_name VARCHAR(63) NOT NULL,
+    batch_no INTEGER NOT NULL,
+    row_offset BIGINT NOT NULL,
+    rows_loaded INTEGER NOT NULL,
+    rows_rejected INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    load_method VARCHAR(10),
+    loaded_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE (load_id, batch_no)
+);
+
+-- Строки, отклоненные при порционной загрузке
+CREATE TABLE IF NOT EXISTS dwh.etl_rejects (
+    reject_id BIGSERIAL PRIMARY KEY,
+    load_id VARCHAR(32) NOT NULL,
+    schema_name VARCHAR(63) NOT NULL,
+    table_name VARCHAR(63) NOT NULL,
+    batch_no INTEGER NOT NULL,
+    row_data JSONB NOT NULL,
+    error TEXT,
+    rejected_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Индексы и FK, удаленные на время массовой загрузки fact таблицы
+-- (DataLoader._bulk_load_mode); строка удаляется после восстановления
+CREATE TABLE IF NOT EXISTS dwh.etl_dropped_objects (
+    table_name VARCHAR(127) NOT NULL,
+    object_name VARCHAR(63) NOT NULL,
+    object_type VARCHAR(20) NOT NULL,
+    definition TEXT NOT NULL,
+    dropped_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (table_name, object_name)
+);
+
+-- Создание индексов для оптимизации запросов
+CREATE INDEX IF NOT EXISTS idx_fact_date ON dwh.fact_transactions(date_key);
+CREATE INDEX IF NOT EXISTS idx_fact_customer ON dwh.fact_transactions(customer_key);
+CREATE INDEX IF NOT EXISTS idx_fact_account ON dwh.fact_transactions(account_key);
+CREATE INDEX IF NOT EXISTS idx_dim_customer_current
+    ON dwh.dim_customer(customer_id) WHERE is_current;
+
+-- Уникальные натуральные ключи: повторная загрузка (ON CONFLICT DO NOTHING)
+-- не дублирует строки измерений и фактов. В базе, где дубликаты уже
+-- накоплены, индекс не создается - только предупреждение
+DO $$
+DECLARE
+    natural_key RECORD;
+BEGIN
+    FOR natural_key IN
+        SELECT * FROM (VALUES
+            ('uq_dim_account_account_id', 'dwh.dim_account (account_id)'),
+            ('uq_dim_branch_branch_id', 'dwh.dim_branch (branch_id)'),
+            ('uq_dim_transaction_type', 'dwh.dim_transaction_type (transaction_type)'),
+            ('uq_fact_transaction_id', 'dwh.fact_transactions (transaction_id, date_key)')
+        ) AS keys (index_name, target)
+    LOOP
+        BEGIN
+            EXECUTE format('CREATE UNIQUE INDEX IF NOT EXISTS %I ON %s',
+                           natural_key.index_name, natural_key.target);
+        EXCEPTION WHEN unique_violation THEN
+            RAISE WARNING 'Индекс % не создан: в % есть дубликаты',
+                natural_key.index_name, natural_key.target;
+        END;
+    END LOOP;
+END $$;
+"""
+
+
+def create_schemas(db):
+    """
+    Создание схем staging и dwh с таблицами в открытом подключении
+
+    Args:
+        db: подключенный экземпляр DatabaseConnection
+    """
+    print("Выполнение SQL команд...")
+    db.conn.notices.clear()
+    db.execute_query(SCHEMA_SQL)
+    # Предупреждения миграции (например, не созданный уникальный индекс)
+    for notice in db.conn.notices:
+        if notice.startswith('WARNING'):
+            print(f"⚠ {notice.split(':', 1)[1].strip()}")
+
+
 def create_schemas_and_tables():
     """Создание схем staging и dwh с таблицами"""
 
@@ -19,153 +278,7 @@ def create_schemas_and_tables():
 
     try:
         db.connect()
-
-        # SQL команды для создания всех схем и таблиц
-        sql_commands = """
-        -- Создание staging схемы
-        CREATE SCHEMA IF NOT EXISTS staging;
-
-        -- Создание dwh схемы
-        CREATE SCHEMA IF NOT EXISTS dwh;
-
-        -- Staging таблицы
-        CREATE TABLE IF NOT EXISTS staging.customers (
-            customer_id INTEGER PRIMARY KEY,
-            first_name VARCHAR(100),
-            last_name VARCHAR(100),
-            email VARCHAR(200),
-            phone VARCHAR(50),
-            date_of_birth DATE,
-            city VARCHAR(100),
-            country VARCHAR(100),
-            registration_date DATE,
-            customer_segment VARCHAR(50)
-        );
-
-        CREATE TABLE IF NOT EXISTS staging.accounts (
-            account_id INTEGER PRIMARY KEY,
-            customer_id INTEGER,
-            account_number VARCHAR(50),
-            account_type VARCHAR(50),
-            currency VARCHAR(10),
-            balance DECIMAL(15, 2),
-            opening_date DATE,
-            status VARCHAR(50)
-        );
-
-        CREATE TABLE IF NOT EXISTS staging.transactions (
-            transaction_id INTEGER PRIMARY KEY,
-            account_id INTEGER,
-            transaction_date TIMESTAMP,
-            transaction_type VARCHAR(50),
-            amount DECIMAL(15, 2),
-            currency VARCHAR(10),
-            merchant_name VARCHAR(200),
-            transaction_status VARCHAR(50),
-            channel VARCHAR(50)
-        );
-
-        CREATE TABLE IF NOT EXISTS staging.branches (
-            branch_id INTEGER PRIMARY KEY,
-            branch_name VARCHAR(100),
-            city VARCHAR(100),
-            address TEXT,
-            region VARCHAR(50),
-            opening_date DATE
-        );
-
-        CREATE TABLE IF NOT EXISTS staging.exchange_rates (
-            date DATE PRIMARY KEY,
-            usd_to_rub DECIMAL(10, 4),
-            eur_to_rub DECIMAL(10, 4),
-            usd_to_eur DECIMAL(10, 4)
-        );
-
-        -- DWH Dimension Tables
-        CREATE TABLE IF NOT EXISTS dwh.dim_customer (
-            customer_key SERIAL PRIMARY KEY,
-            customer_id INTEGER,
-            first_name VARCHAR(100),
-            last_name VARCHAR(100),
-            full_name VARCHAR(200),
-            email VARCHAR(200),
-            phone VARCHAR(50),
-            age INTEGER,
-            city VARCHAR(100),
-            country VARCHAR(100),
-            customer_segment VARCHAR(50),
-            registration_date DATE,
-            effective_date DATE,
-            expiration_date DATE,
-            is_current BOOLEAN DEFAULT TRUE
-        );
-
-        CREATE TABLE IF NOT EXISTS dwh.dim_account (
-            account_key SERIAL PRIMARY KEY,
-            account_id INTEGER,
-            account_number VARCHAR(50),
-            account_type VARCHAR(50),
-            currency VARCHAR(10),
-            opening_date DATE,
-            status VARCHAR(50)
-        );
-
-        CREATE TABLE IF NOT EXISTS dwh.dim_date (
-            date_key INTEGER PRIMARY KEY,
-            date DATE,
-            year INTEGER,
-            quarter INTEGER,
-            month INTEGER,
-            month_name VARCHAR(20),
-            week INTEGER,
-            day_of_month INTEGER,
-            day_of_week INTEGER,
-            day_name VARCHAR(20),
-            is_weekend BOOLEAN
-        );
-
-        CREATE TABLE IF NOT EXISTS dwh.dim_transaction_type (
-            transaction_type_key SERIAL PRIMARY KEY,
-            transaction_type VARCHAR(50),
-            transaction_category VARCHAR(50),
-            description TEXT
-        );
-
-        CREATE TABLE IF NOT EXISTS dwh.dim_branch (
-            branch_key SERIAL PRIMARY KEY,
-            branch_id INTEGER,
-            branch_name VARCHAR(100),
-            city VARCHAR(100),
-            region VARCHAR(50),
-            address TEXT
-        );
-
-        -- DWH Fact Table
-        CREATE TABLE IF NOT EXISTS dwh.fact_transactions (
-            transaction_key SERIAL PRIMARY KEY,
-            transaction_id INTEGER,
-            date_key INTEGER,
-            customer_key INTEGER,
-            account_key INTEGER,
-            transaction_type_key INTEGER,
-            branch_key INTEGER,
-            amount_original DECIMAL(15, 2),
-            original_currency VARCHAR(10),
-            amount_rub DECIMAL(15, 2),
-            exchange_rate DECIMAL(10, 4),
-            transaction_status VARCHAR(50),
-            channel VARCHAR(50),
-            merchant_name VARCHAR(200)
-        );
-
-        -- Создание индексов для оптимизации запросов
-        CREATE INDEX IF NOT EXISTS idx_fact_date ON dwh.fact_transactions(date_key);
-        CREATE INDEX IF NOT EXISTS idx_fact_customer ON dwh.fact_transactions(customer_key);
-        CREATE INDEX IF NOT EXISTS idx_fact_account ON dwh.fact_transactions(account_key);
-        """
-
-        print("Выполнение SQL команд...")
-        db.execute_query(sql_commands)
+        create_schemas(db)
 
         print("\n✓ Все схемы и таблицы успешно созданы!\n")
 
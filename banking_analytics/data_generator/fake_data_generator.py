@@ -1,20 +1,72 @@
-from faker import Faker
+import functools
+import numpy as np
 import pandas as pd
 import random
 from datetime import datetime, timedelta
+from etl.dtypes import to_compact_dtypes
+from monitoring.metrics import instrument
 
-fake = Faker('ru_RU')
+
+@functools.lru_cache(maxsize=None)
+def get_fake():
+    """Общий экземпляр Faker('ru_RU'); Faker импортируется при первом вызове"""
+    from faker import Faker
+    return Faker('ru_RU')
 
 
 class BankingDataGenerator:
     """Генератор синтетических банковских данных"""
 
-    def __init__(self, num_customers=1000, num_transactions=10000):
+    # Справочники значений; повторы задают веса (как в random.choice)
+    TRANSACTION_TYPES = ['Deposit', 'Withdrawal', 'Transfer', 'Payment', 'ATM']
+    CURRENCIES = ['RUB', 'USD', 'EUR']
+    TRANSACTION_STATUSES = ['Completed', 'Completed', 'Pending', 'Failed']
+    CHANNELS = ['Online', 'Mobile', 'ATM', 'Branch']
+    CUSTOMER_SEGMENTS = ['Retail', 'Premium', 'Corporate']
+    ACCOUNT_TYPES = ['Checking', 'Savings', 'Credit', 'Investment']
+    ACCOUNT_STATUSES = ['Active', 'Active', 'Active', 'Frozen', 'Closed']
+
+    # Генераторы Faker для пулов значений векторизованного режима
+    POOL_FACTORIES = {
+        'merchant_name': lambda f: f.company(),
+        'first_name': lambda f: f.first_name(),
+        'last_name': lambda f: f.last_name(),
+        'city': lambda f: f.city(),
+        'phone': lambda f: f.phone_number(),
+        'email_domain': lambda f: f.free_email_domain(),
+    }
+
+    def __init__(self, num_customers=1000, num_transactions=10000, seed=None,
+                 pool_size=1000, reference_date=None, compact_dtypes=False):
+        """
+        Args:
+            num_customers: количество клиентов
+            num_transactions: количество транзакций
+            seed: seed для векторизованной генерации (numpy.random.Generator
+                и пулов значений Faker)
+            pool_size: размер заранее сгенерированных пулов значений Faker
+            reference_date: конец интервала дат; по умолчанию начало
+                текущих суток (для воспроизводимости в течение дня)
+            compact_dtypes: приводить таблицы к компактным типам
+                (etl.dtypes.TABLE_DTYPES)
+        """
         self.num_customers = num_customers
         self.num_transactions = num_transactions
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.pool_size = pool_size
+        self.reference_date = reference_date
+        self.compact_dtypes = compact_dtypes
+        self._pools = {}
 
+    def _finish(self, df, table_name):
+        """Приведение сгенерированной таблицы к компактным типам (если включено)"""
+        return to_compact_dtypes(df, table_name) if self.compact_dtypes else df
+
+    @instrument()
     def generate_customers(self):
         """Генерация данных о клиентах"""
+        fake = get_fake()
         customers = []
         for i in range(1, self.num_customers + 1):
             customers.append({
@@ -29,10 +81,12 @@ class BankingDataGenerator:
                 'registration_date': fake.date_between(start_date='-5y', end_date='today'),
                 'customer_segment': random.choice(['Retail', 'Premium', 'Corporate'])
             })
-        return pd.DataFrame(customers)
+        return self._finish(pd.DataFrame(customers), 'customers')
 
+    @instrument()
     def generate_accounts(self, num_customers):
         """Генерация банковских счетов"""
+        fake = get_fake()
         accounts = []
         account_id = 1
         for customer_id in range(1, num_customers + 1):
@@ -50,10 +104,12 @@ class BankingDataGenerator:
                     'status': random.choice(['Active', 'Active', 'Active', 'Frozen', 'Closed'])
                 })
                 account_id += 1
-        return pd.DataFrame(accounts)
+        return self._finish(pd.DataFrame(accounts), 'accounts')
 
+    @instrument()
     def generate_transactions(self, accounts_df):
         """Генерация транзакций"""
+        fake = get_fake()
         transactions = []
         account_ids = accounts_df['account_id'].tolist()
 
@@ -70,10 +126,203 @@ class BankingDataGenerator:
                 'transaction_status': random.choice(['Completed', 'Completed', 'Pending', 'Failed']),
                 'channel': random.choice(['Online', 'Mobile', 'ATM', 'Branch'])
             })
-        return pd.DataFrame(transactions)
+        return self._finish(pd.DataFrame(transactions), 'transactions')
+
+    def get_pool(self, name):
+        """Пул значений, сгенерированный Faker один раз (по seed)"""
+        if name not in self._pools:
+            from faker import Faker
+
+            pool_fake = Faker('ru_RU')
+            pool_fake.seed_instance(self.seed)
+            factory = self.POOL_FACTORIES[name]
+            self._pools[name] = np.array(
+                [factory(pool_fake) for _ in range(self.pool_size)], dtype=object
+            )
+        return self._pools[name]
+
+    def get_merchant_pool(self):
+        """Пул названий продавцов"""
+        return self.get_pool('merchant_name')
+
+    @staticmethod
+    def _choice(rng, values, size):
+        """Векторизованный аналог random.choice для списка строк"""
+        values = np.asarray(values, dtype=object)
+        return values[rng.integers(0, len(values), size=size)]
+
+    def _reference_day(self):
+        """Опорная дата векторизованной генерации (numpy datetime64[D])"""
+        return np.datetime64(self.reference_date or datetime.now().date(), 'D')
+
+    def _random_dates(self, rng, min_days_ago, max_days_ago, size):
+        """Случайные даты в интервале [сегодня - max_days_ago, сегодня - min_days_ago]"""
+        days_ago = rng.integers(min_days_ago, max_days_ago + 1, size=size)
+        return (self._reference_day() - days_ago.astype('timedelta64[D]')).astype(object)
+
+    @instrument()
+    def generate_customers_vectorized(self, num_customers=None, start_id=1, rng=None):
+        """
+        Векторизованная генерация клиентов из пулов Faker
+
+        Args:
+            num_customers: количество клиентов (по умолчанию self.num_customers)
+            start_id: первый customer_id
+            rng: генератор numpy (по умолчанию self.rng)
+
+        Returns:
+            DataFrame с данными клиентов
+        """
+        n = self.num_customers if num_customers is None else num_customers
+        rng = self.rng if rng is None else rng
+
+        customer_ids = np.arange(start_id, start_id + n, dtype='int64')
+        email_domains = self._choice(rng, self.get_pool('email_domain'), n)
+        emails = ('client' + pd.Series(customer_ids).astype(str) + '@'
+                  + pd.Series(email_domains)).to_numpy()
+
+        return self._finish(pd.DataFrame({
+            'customer_id': customer_ids,
+            'first_name': self._choice(rng, self.get_pool('first_name'), n),
+            'last_name': self._choice(rng, self.get_pool('last_name'), n),
+            'email': emails,
+            'phone': self._choice(rng, self.get_pool('phone'), n),
+            'date_of_birth': self._random_dates(rng, 18 * 365, 80 * 365, n),
+            'city': self._choice(rng, self.get_pool('city'), n),
+            'country': 'Russia',
+            'registration_date': self._random_dates(rng, 0, 5 * 365, n),
+            'customer_segment': self._choice(rng, self.CUSTOMER_SEGMENTS, n)
+        }), 'customers')
+
+    @instrument()
+    def generate_accounts_vectorized(self, customer_ids, accounts_per_customer=None,
+                                     start_id=1, rng=None):
+        """
+        Векторизованная генерация счетов (от 1 до 3 на клиента)
+
+        Args:
+            customer_ids: массив customer_id
+            accounts_per_customer: количество счетов каждого клиента
+                (по умолчанию генерируется из rng)
+            start_id: первый account_id
+            rng: генератор numpy (по умолчанию self.rng)
 
+        Returns:
+            DataFrame со счетами
+        """
+        rng = self.rng if rng is None else rng
+        customer_ids = np.asarray(customer_ids)
+        if accounts_per_customer is None:
+            accounts_per_customer = rng.integers(1, 4, size=len(customer_ids))
+
+        owners = np.repeat(customer_ids, accounts_per_customer)
+        n = len(owners)
+        account_ids = np.arange(start_id, start_id + n, dtype='int64')
+        # 40817810 - балансовый счет физлица в рублях; далее порядковый номер
+        account_numbers = ('40817810' + pd.Series(account_ids).astype(str).str.zfill(12)).to_numpy()
+
+        return self._finish(pd.DataFrame({
+            'account_id': account_ids,
+            'customer_id': owners,
+            'account_number': account_numbers,
+            'account_type': self._choice(rng, self.ACCOUNT_TYPES, n),
+            'currency': self._choice(rng, self.CURRENCIES, n),
+            'balance': np.round(rng.uniform(1000, 1000000, size=n), 2),
+            'opening_date': self._random_dates(rng, 0, 3 * 365, n),
+            'status': self._choice(rng, self.ACCOUNT_STATUSES, n)
+        }), 'accounts')
+
+    @instrument()
+    def generate_transactions_vectorized(self, accounts_df, num_transactions=None,
+                                         start_id=1, rng=None):
+        """
+        Векторизованная генерация транзакций на numpy.random.Generator
+
+        Все колонки генерируются массивами за один проход; при одинаковом
+        seed и reference_date результат воспроизводим.
+
+        Args:
+            accounts_df: DataFrame счетов (нужна колонка account_id)
+            num_transactions: количество транзакций (по умолчанию
+                self.num_transactions)
+            start_id: первый transaction_id
+            rng: генератор numpy (по умолчанию self.rng)
+
+        Returns:
+            DataFrame с транзакциями
+        """
+        n = self.num_transactions if num_transactions is None else num_transactions
+        rng = self.rng if rng is None else rng
+
+        end = self._reference_day().astype('datetime64[s]')
+        span_seconds = 365 * 24 * 60 * 60
+        transaction_dates = end - np.timedelta64(span_seconds, 's') + \
+            rng.integers(0, span_seconds, size=n).astype('timedelta64[s]')
+
+        merchant_pool = self.get_merchant_pool()
+        merchant_names = merchant_pool[rng.integers(0, len(merchant_pool), size=n)]
+        merchant_names[rng.random(n) <= 0.3] = None
+
+        account_ids = accounts_df['account_id'].to_numpy()
+
+        return self._finish(pd.DataFrame({
+            'transaction_id': np.arange(start_id, start_id + n, dtype='int64'),
+            'account_id': account_ids[rng.integers(0, len(account_ids), size=n)],
+            'transaction_date': transaction_dates.astype('datetime64[ns]'),
+            'transaction_type': self._choice(rng, self.TRANSACTION_TYPES, n),
+            'amount': np.round(rng.uniform(100, 50000, size=n), 2),
+            'currency': self._choice(rng, self.CURRENCIES, n),
+            'merchant_name': merchant_names,
+            'transaction_status': self._choice(rng, self.TRANSACTION_STATUSES, n),
+            'channel': self._choice(rng, self.CHANNELS, n)
+        }), 'transactions')
+
+    def iter_batches(self, batch_size=100000):
+        """
+        Векторизованная генерация порциями фиксированного размера
+
+        Ни одна таблица целиком в памяти не собирается: после выдачи
+        порции генератор переходит к следующей.
+
+        Args:
+            batch_size: количество строк в порции
+
+        Yields:
+            tuple: (название таблицы, DataFrame порции) - сначала клиенты
+                и их счета, затем транзакции
+        """
+        next_account_id = 1
+        for start_id in range(1, self.num_customers + 1, batch_size):
+            customers_df = self.generate_customers_vectorized(
+                num_customers=min(batch_size, self.num_customers - start_id + 1),
+                start_id=start_id
+            )
+            accounts_df = self.generate_accounts_vectorized(
+                customers_df['customer_id'].to_numpy(), start_id=next_account_id
+            )
+            next_account_id += len(accounts_df)
+            yield 'customers', customers_df
+            yield 'accounts', accounts_df
+
+        # Счета нумеруются подряд, поэтому для транзакций достаточно диапазона id
+        account_ids_df = pd.DataFrame({'account_id': np.arange(1, next_account_id)})
+        for start_id in range(1, self.num_transactions + 1, batch_size):
+            yield 'transactions', self.generate_transactions_vectorized(
+                account_ids_df,
+                num_transactions=min(batch_size, self.num_transactions - start_id + 1),
+                start_id=start_id
+            )
+
+    @instrument()
     def generate_branches(self):
-        """Генерация данных о банковских отделениях"""
+        """Генерация данных о банковских отделениях (воспроизводимо при заданном seed)"""
+        fake, rand = get_fake(), random
+        if self.seed is not None:
+            from faker import Faker
+
+            fake = Faker('ru_RU')
+            fake.seed_instance(self.seed)
+            rand = random.Random(self.seed)
         branches = []
         for i in range(1, 51):
             branches.append({
@@ -81,7 +330,7 @@ class BankingDataGenerator:
                 'branch_name': f'Branch {i}',
                 'city': fake.city(),
                 'address': fake.address(),
-                'region': random.choice(['Central', 'North', 'South', 'East', 'West']),
+                'region': rand.choice(['Central', 'North', 'South', 'East', 'West']),
                 'opening_date': fake.date_between(start_date='-10y', end_date='-1y')
             })
-        return pd.DataFrame(branches)
+        return self._finish(pd.DataFrame(branches), 'branches')
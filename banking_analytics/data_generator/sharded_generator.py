@@ -0,0 +1,219 @@
+# data_generator/sharded_generator.py
+"""
+Параллельная генерация синтетических данных блоками с записью шардов на диск
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_generator.fake_data_generator import BankingDataGenerator
+from etl.dtypes import to_compact_dtypes
+from monitoring.metrics import instrument
+
+
+# Идентификаторы потоков случайных чисел для SeedSequence
+STREAM_IDS = {
+    'customers': 1,
+    'accounts': 2,
+    'account_counts': 3,
+    'transactions': 4,
+}
+
+
+def _block_rng(seed, stream, block_index):
+    """Независимый генератор numpy для блока: зависит только от seed и номера блока"""
+    return np.random.default_rng(np.random.SeedSequence([seed, STREAM_IDS[stream], block_index]))
+
+
+def _write_shard(df, output_dir, table, block_index, file_format):
+    """Запись шарда таблицы на диск"""
+    table_dir = Path(output_dir) / table
+    table_dir.mkdir(parents=True, exist_ok=True)
+    path = table_dir / f"part-{block_index:05d}.{file_format}"
+    if file_format == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return str(path)
+
+
+def _generate_customer_block(task):
+    """Воркер: клиенты и их счета одного блока"""
+    generator = BankingDataGenerator(seed=task['seed'], pool_size=task['pool_size'],
+                                     reference_date=task['reference_date'])
+    block = task['block_index']
+
+    customers_df = generator.generate_customers_vectorized(
+        num_customers=task['num_rows'], start_id=task['start_id'],
+        rng=_block_rng(task['seed'], 'customers', block)
+    )
+    accounts_df = generator.generate_accounts_vectorized(
+        customers_df['customer_id'].to_numpy(),
+        accounts_per_customer=task['accounts_per_customer'],
+        start_id=task['start_account_id'],
+        rng=_block_rng(task['seed'], 'accounts', block)
+    )
+    return {
+        'customers': _write_shard(customers_df, task['output_dir'], 'customers', block,
+                                  task['file_format']),
+        'accounts': _write_shard(accounts_df, task['output_dir'], 'accounts', block,
+                                 task['file_format']),
+    }
+
+
+def _generate_transaction_block(task):
+    """Воркер: транзакции одного блока"""
+    generator = BankingDataGenerator(seed=task['seed'], pool_size=task['pool_size'],
+                                     reference_date=task['reference_date'])
+    block = task['block_index']
+
+    # Счета нумеруются подряд 1..total_accounts, поэтому достаточно их количества
+    accounts_df = pd.DataFrame({'account_id': np.arange(1, task['total_accounts'] + 1)})
+    transactions_df = generator.generate_transactions_vectorized(
+        accounts_df, num_transactions=task['num_rows'], start_id=task['start_id'],
+        rng=_block_rng(task['seed'], 'transactions', block)
+    )
+    return {
+        'transactions': _write_shard(transactions_df, task['output_dir'], 'transactions',
+                                     block, task['file_format']),
+    }
+
+
+class ShardedDataGenerator:
+    """
+    Многопроцессная генерация клиентов, счетов и транзакций
+
+    Диапазоны идентификаторов делятся на блоки фиксированного размера;
+    каждый блок получает собственный seed, производный от общего seed и
+    номера блока. Поэтому результат не зависит от числа воркеров: шарды
+    N процессов в сумме дают ровно тот же набор данных, что и один процесс.
+    """
+
+    def __init__(self, num_customers=1000, num_transactions=10000, seed=0,
+                 num_workers=None, customer_block_size=100000,
+                 transaction_block_size=1000000, output_dir=None,
+                 file_format='csv', pool_size=1000, reference_date=None,
+                 compact_dtypes=False):
+        """
+        Args:
+            num_customers: количество клиентов
+            num_transactions: количество транзакций
+            seed: общий seed генерации
+            num_workers: число процессов (по умолчанию - число ядер)
+            customer_block_size: клиентов в одном блоке
+            transaction_block_size: транзакций в одном блоке
+            output_dir: каталог для шардов
+            file_format: 'csv' или 'parquet'
+            pool_size: размер пулов значений Faker
+            reference_date: опорная дата (одна на все воркеры)
+            compact_dtypes: приводить прочитанные таблицы к компактным типам
+        """
+        self.num_customers = num_customers
+        self.num_transactions = num_transactions
+        self.seed = seed
+        self.num_workers = num_workers or os.cpu_count()
+        self.customer_block_size = customer_block_size
+        self.transaction_block_size = transaction_block_size
+        self.output_dir = Path(output_dir or 'data/shards')
+        self.file_format = file_format
+        self.pool_size = pool_size
+        self.reference_date = reference_date or datetime.now().date()
+        self.compact_dtypes = compact_dtypes
+
+    @staticmethod
+    def _blocks(total, block_size):
+        """Разбиение диапазона 1..total на блоки (номер, первый id, размер)"""
+        for block_index, start in enumerate(range(0, total, block_size)):
+            yield block_index, start + 1, min(block_size, total - start)
+
+    def _base_task(self):
+        return {
+            'seed': self.seed,
+            'pool_size': self.pool_size,
+            'reference_date': self.reference_date,
+            'output_dir': str(self.output_dir),
+            'file_format': self.file_format,
+        }
+
+    @instrument()
+    def run(self):
+        """
+        Генерация всех шардов
+
+        Returns:
+            dict: {таблица: отсортированный список путей к шардам}
+        """
+        print(f"Параллельная генерация: {self.num_workers} процессов, "
+              f"каталог {self.output_dir}")
+        start_time = datetime.now()
+
+        # Количество счетов каждого клиента считаем заранее, чтобы знать
+        # первый account_id каждого блока (нумерация счетов сквозная)
+        customer_tasks = []
+        next_account_id = 1
+        for block_index, start_id, num_rows in self._blocks(self.num_customers,
+                                                            self.customer_block_size):
+            counts = _block_rng(self.seed, 'account_counts', block_index).integers(1, 4, size=num_rows)
+            customer_tasks.append({
+                **self._base_task(),
+                'block_index': block_index,
+                'start_id': start_id,
+                'num_rows': num_rows,
+                'start_account_id': next_account_id,
+                'accounts_per_customer': counts,
+            })
+            next_account_id += int(counts.sum())
+        total_accounts = next_account_id - 1
+
+        transaction_tasks = [
+            {
+                **self._base_task(),
+                'block_index': block_index,
+                'start_id': start_id,
+                'num_rows': num_rows,
+                'total_accounts': total_accounts,
+            }
+            for block_index, start_id, num_rows in self._blocks(self.num_transactions,
+                                                                self.transaction_block_size)
+        ]
+
+        shards = {'customers': [], 'accounts': [], 'transactions': []}
+        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+            results = list(executor.map(_generate_customer_block, customer_tasks))
+            results += list(executor.map(_generate_transaction_block, transaction_tasks))
+        for result in results:
+            for table, path in result.items():
+                shards[table].append(path)
+
+        for table in shards:
+            shards[table].sort()
+
+        elapsed = (datetime.now() - start_time).total_seconds()
+        print(f"✓ Сгенерировано: {self.num_customers} клиентов, {total_accounts} счетов, "
+              f"{self.num_transactions} транзакций за {elapsed:.1f} сек")
+        return shards
+
+    def read_table(self, paths):
+        """
+        Объединение шардов таблицы в один DataFrame
+
+        Args:
+            paths: список путей к шардам (в порядке номеров блоков)
+
+        Returns:
+            DataFrame с данными таблицы
+        """
+        if self.file_format == 'parquet':
+            frames = [pd.read_parquet(path) for path in paths]
+        else:
+            frames = [pd.read_csv(path) for path in paths]
+        df = pd.concat(frames, ignore_index=True)
+
+        # Типы приводятся после объединения: категории шардов могут различаться
+        if self.compact_dtypes and paths:
+            df = to_compact_dtypes(df, Path(paths[0]).parent.name)
+        return df
@@ -2,16 +2,33 @@
 """
 Модуль для управления подключением к PostgreSQL
 """
+import hashlib
+import io
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 import psycopg2
 from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import pandas as pd
 
+from monitoring.metrics import instrument
+
+# Ошибки соединения и сериализации: порция повторяется после переподключения.
+# Остальные psycopg2.Error (DataError, IntegrityError, ...) - ошибки в данных
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
 
 class DatabaseConnection:
     """Управление подключением к PostgreSQL"""
 
     def __init__(self, host='localhost', database='trst_db', user='postgres',
-                 password='123', port=5432):
+                 password='123', port=5432, load_method='insert',
+                 copy_chunk_size=100000, pool_size=1, load_batch_size=0,
+                 max_retries=3, retry_backoff=1.0, isolate_rejects=True, run_id=None):
         """
         Инициализация параметров подключения
 
@@ -21,6 +38,18 @@ class DatabaseConnection:
             user: имя пользователя
             password: пароль
             port: порт PostgreSQL (по умолчанию 5432)
+            load_method: способ загрузки по умолчанию ('insert' или 'copy')
+            copy_chunk_size: размер порции строк для COPY
+            pool_size: размер пула соединений для параллельной загрузки
+                (1 - загрузка последовательно через основное соединение)
+            load_batch_size: размер порции для load_dataframe с COMMIT на
+                каждую порцию (0 - весь DataFrame одной транзакцией)
+            max_retries: повторы порции при обрыве соединения
+            retry_backoff: пауза перед первым повтором, сек (удваивается)
+            isolate_rejects: при ошибке в данных искать ошибочные строки
+                делением порции пополам и писать их в dwh.etl_rejects
+            run_id: идентификатор запуска пайплайна для load_id порционной
+                загрузки (None - load_id зависит только от данных и таблицы)
         """
         self.conn_params = {
             'host': host,
@@ -30,11 +59,23 @@ class DatabaseConnection:
             'port': port
         }
         self.conn = None
+        self.load_method = load_method
+        self.copy_chunk_size = copy_chunk_size
+        self.pool_size = pool_size
+        self.pool = None
+        self.load_batch_size = load_batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.isolate_rejects = isolate_rejects
+        self.run_id = run_id
 
     def connect(self):
         """Установка соединения с базой данных"""
         try:
             self.conn = psycopg2.connect(**self.conn_params)
+            if self.pool_size > 1:
+                self.pool = ThreadedConnectionPool(1, self.pool_size, **self.conn_params)
+                print(f"  Пул соединений: до {self.pool_size} соединений")
             print(f"✓ Подключение к PostgreSQL успешно установлено")
             print(f"  База данных: {self.conn_params['database']}")
             print(f"  Пользователь: {self.conn_params['user']}")
@@ -75,7 +116,60 @@ class DatabaseConnection:
             print(f"Ошибка выполнения запроса: {e}")
             raise
 
-    def load_dataframe(self, df, table_name, schema='staging'):
+    @contextmanager
+    def pooled_connection(self):
+        """
+        Соединение из пула на время блока with
+
+        Без пула (pool_size=1) открывается отдельное соединение, которое
+        закрывается на выходе.
+        """
+        if self.pool is None:
+            conn = psycopg2.connect(**self.conn_params)
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            self.pool.putconn(conn, close=bool(conn.closed))
+
+    @instrument()
+    def load_dataframes_parallel(self, jobs, max_workers=None):
+        """
+        Параллельная загрузка независимых таблиц через пул соединений
+
+        Args:
+            jobs: список кортежей (DataFrame, название таблицы, схема)
+            max_workers: число потоков (по умолчанию pool_size)
+
+        Время загрузки определяется самой медленной таблицей. Без пула
+        таблицы загружаются последовательно через основное соединение.
+        """
+        if self.pool is None:
+            for df, table_name, schema in jobs:
+                self.load_dataframe(df, table_name, schema=schema)
+            return
+
+        def load_job(job):
+            df, table_name, schema = job
+            with self.pooled_connection() as conn:
+                self.load_dataframe(df, table_name, schema=schema, conn=conn)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers or self.pool_size) as executor:
+            # list() пробрасывает первое исключение воркера
+            list(executor.map(load_job, jobs))
+        print(f"✓ Параллельно загружено таблиц: {len(jobs)} "
+              f"за {time.perf_counter() - start:.2f} сек")
+
+    @instrument()
+    def load_dataframe(self, df, table_name, schema='staging', method=None,
+                       chunk_size=None, conn=None, batch_size=None):
         """
         Загрузка DataFrame в PostgreSQL
 
@@ -83,48 +177,442 @@ class DatabaseConnection:
             df: pandas DataFrame для загрузки
             table_name: название таблицы
             schema: схема базы данных (по умолчанию 'staging')
+            method: 'insert' (execute_values) или 'copy' (COPY FROM STDIN
+                через временную таблицу); по умолчанию self.load_method
+            chunk_size: размер порции строк для CSV-буфера в режиме 'copy'
+            conn: соединение для загрузки (по умолчанию основное)
+            batch_size: размер порции с отдельным COMMIT (по умолчанию
+                self.load_batch_size; 0 - одна транзакция)
         """
         if df.empty:
             print(f"⚠ DataFrame пустой, пропуск загрузки в {schema}.{table_name}")
             return
 
+        method = method or self.load_method
+        chunk_size = chunk_size or self.copy_chunk_size
+        conn = conn or self.conn
+        batch_size = self.load_batch_size if batch_size is None else batch_size
+        if batch_size:
+            return self._load_batched(df, table_name, schema, method, chunk_size, conn,
+                                      batch_size)
+
+        start = time.perf_counter()
         try:
-            columns = ', '.join(df.columns)
-            values = [tuple(x) for x in df.values]
+            with conn.cursor() as cursor:
+                if method == 'copy':
+                    self._copy_merge(cursor, df, table_name, schema, chunk_size)
+                else:
+                    self._insert_values(cursor, df, table_name, schema)
+                conn.commit()
+
+            elapsed = time.perf_counter() - start
+            rate = len(df) / elapsed if elapsed > 0 else float('inf')
+            print(f"✓ Загружено {len(df)} записей в {schema}.{table_name} "
+                  f"({method}: {rate:,.0f} строк/сек)")
 
-            query = f"""
-            INSERT INTO {schema}.{table_name} ({columns})
-            VALUES %s
-            ON CONFLICT DO NOTHING
-            """
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"✗ Ошибка загрузки в {schema}.{table_name}: {e}")
+            raise
 
-            with self.conn.cursor() as cursor:
-                execute_values(cursor, query, values)
-                self.conn.commit()
+    @instrument()
+    def load_batches(self, batches, schema='staging', max_queued=2):
+        """
+        Загрузка потока порций с перекрытием генерации и загрузки
 
-            print(f"✓ Загружено {len(df)} записей в {schema}.{table_name}")
+        Порции производятся в отдельном потоке и передаются через
+        ограниченную очередь: пока текущая порция пишется в БД, следующая
+        уже генерируется, а в памяти одновременно не больше max_queued + 2
+        порций.
 
-        except psycopg2.Error as e:
-            self.conn.rollback()
-            print(f"✗ Ошибка загрузки в {schema}.{table_name}: {e}")
+        Args:
+            batches: итератор пар (название таблицы, DataFrame)
+            schema: схема базы данных (по умолчанию 'staging')
+            max_queued: максимальное число готовых порций в очереди
+
+        Returns:
+            dict: количество загруженных строк по таблицам
+        """
+        batch_queue = queue.Queue(maxsize=max_queued)
+        stop = threading.Event()
+        finished = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batch_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for item in batches:
+                    if not put(item):
+                        return
+                put(finished)
+            except Exception as e:
+                put(e)
+
+        producer = threading.Thread(target=produce, name='batch-producer', daemon=True)
+        producer.start()
+
+        totals = {}
+        try:
+            while True:
+                item = batch_queue.get()
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                table_name, df = item
+                self.load_dataframe(df, table_name, schema=schema)
+                totals[table_name] = totals.get(table_name, 0) + len(df)
+        finally:
+            stop.set()
+            producer.join()
+
+        for table_name, rows in totals.items():
+            print(f"✓ {schema}.{table_name}: всего {rows} записей")
+        return totals
+
+    def _load_batched(self, df, table_name, schema, method, chunk_size, conn, batch_size):
+        """
+        Загрузка порциями по batch_size строк, COMMIT на каждую порцию
+
+        Каждая порция пишется в dwh.etl_load_log в той же транзакции, что и
+        данные, поэтому журнал содержит ровно зафиксированные порции.
+        load_id детерминирован (_load_id), поэтому повторный вызов с теми же
+        данными - в том числе в новом процессе после сбоя - пропускает уже
+        зафиксированные порции и продолжает с первой незагруженной. При
+        обрыве соединения порция повторяется с экспоненциальной паузой после
+        переподключения. При ошибке в данных порция загружается заново с
+        поиском ошибочных строк (isolate_rejects), остальные ее строки
+        фиксируются.
+
+        Если conn взято из пула и оборвалось, загрузка продолжается через
+        новое соединение, а conn остается закрытым: для следующей загрузки
+        вызывающий код берет соединение из пула заново.
+
+        Returns:
+            dict: load_id, загружено, отклонено и пропущено (загружено
+                ранее) строк
+        """
+        num_batches = (len(df) + batch_size - 1) // batch_size
+        with conn.cursor() as cursor:
+            load_id = self._load_id(cursor, df, table_name, schema, batch_size)
+            cursor.execute(
+                "SELECT batch_no FROM dwh.etl_load_log WHERE load_id = %s", (load_id,)
+            )
+            committed = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+        if committed:
+            print(f"  {schema}.{table_name}: {len(committed)}/{num_batches} порций "
+                  f"уже загружены ранее (load_id {load_id}), продолжение")
+
+        own_conn = None
+        reconnect = False
+        loaded = rejected = skipped = 0
+        start = time.perf_counter()
+
+        try:
+            for batch_no, offset in enumerate(range(0, len(df), batch_size)):
+                batch = df.iloc[offset:offset + batch_size]
+                if batch_no in committed:
+                    skipped += len(batch)
+                    continue
+                attempt, isolate = 1, False
+                while True:
+                    try:
+                        if reconnect:
+                            conn = self._reconnect(conn)
+                            own_conn = None if conn is self.conn else conn
+                            reconnect = False
+                        batch_rejected = self._load_batch(
+                            conn, batch, table_name, schema, method, chunk_size,
+                            isolate, (load_id, batch_no, offset, attempt)
+                        )
+                        break
+                    except TRANSIENT_ERRORS as e:
+                        self._rollback_quietly(conn)
+                        if attempt > self.max_retries:
+                            print(f"✗ {schema}.{table_name}: порция {batch_no + 1}/{num_batches} "
+                                  f"не загружена после {self.max_retries} повторов: {e}")
+                            raise
+                        delay = self.retry_backoff * 2 ** (attempt - 1)
+                        print(f"⚠ {schema}.{table_name}: обрыв на порции {batch_no + 1}/"
+                              f"{num_batches}, повтор {attempt}/{self.max_retries} "
+                              f"через {delay:.1f} сек ({str(e).strip()})")
+                        time.sleep(delay)
+                        attempt += 1
+                        reconnect = True
+                    except psycopg2.Error as e:
+                        conn.rollback()
+                        if isolate or not self.isolate_rejects:
+                            print(f"✗ Ошибка загрузки в {schema}.{table_name} "
+                                  f"(порция {batch_no + 1}/{num_batches}): {e}")
+                            raise
+                        print(f"⚠ {schema}.{table_name}: ошибка в порции {batch_no + 1}/"
+                              f"{num_batches}, поиск ошибочных строк ({str(e).strip()})")
+                        isolate = True
+
+                loaded += len(batch) - batch_rejected
+                rejected += batch_rejected
+        finally:
+            if own_conn is not None:
+                # Соединение взамен оборванного соединения из пула
+                own_conn.close()
+
+        elapsed = time.perf_counter() - start
+        rate = loaded / elapsed if elapsed > 0 else float('inf')
+        print(f"✓ Загружено {loaded} записей в {schema}.{table_name} "
+              f"({method}, порций {num_batches}: {rate:,.0f} строк/сек)")
+        if rejected:
+            print(f"⚠ Отклонено строк: {rejected} (dwh.etl_rejects, load_id {load_id})")
+        return {'load_id': load_id, 'loaded': loaded, 'rejected': rejected, 'skipped': skipped}
+
+    def _load_id(self, cursor, df, table_name, schema, batch_size):
+        """
+        Детерминированный идентификатор порционной загрузки
+
+        Складывается из run_id, таблицы (с ее relfilenode, который меняется
+        при TRUNCATE и пересоздании - тогда загрузка начинается заново),
+        размера порции и хэша содержимого df. Поэтому df должен собираться
+        детерминированно: иначе повтор запуска не найдет свои порции.
+        """
+        cursor.execute(
+            "SELECT COALESCE(pg_relation_filenode(%(table)s::regclass), %(table)s::regclass::oid)",
+            {'table': f"{schema}.{table_name}"}
+        )
+        digest = hashlib.sha256()
+        digest.update(repr((self.run_id, schema, table_name, cursor.fetchone()[0],
+                            batch_size, list(df.columns))).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        return digest.hexdigest()[:32]
+
+    def _load_batch(self, conn, batch, table_name, schema, method, chunk_size, isolate,
+                    log_key):
+        """
+        Одна порция в одной транзакции: данные, отклоненные строки и запись журнала
+
+        Returns:
+            int: число отклоненных строк
+        """
+        load_id, batch_no, offset, attempt = log_key
+        rejects = []
+        with conn.cursor() as cursor:
+            if attempt > 1:
+                # COMMIT мог пройти, а ответ сервера потеряться вместе с соединением
+                cursor.execute(
+                    "SELECT rows_rejected FROM dwh.etl_load_log WHERE load_id = %s AND batch_no = %s",
+                    (load_id, batch_no)
+                )
+                committed = cursor.fetchone()
+                if committed:
+                    conn.rollback()
+                    return committed[0]
+
+            if isolate:
+                rejects = self._insert_isolating(cursor, batch, table_name, schema)
+                if rejects:
+                    self._write_rejects(cursor, rejects, load_id, batch_no, table_name, schema)
+            elif method == 'copy':
+                self._copy_merge(cursor, batch, table_name, schema, chunk_size)
+            else:
+                self._insert_values(cursor, batch, table_name, schema)
+
+            cursor.execute("""
+            INSERT INTO dwh.etl_load_log
+                (load_id, schema_name, table_name, batch_no, row_offset,
+                 rows_loaded, rows_rejected, attempts, load_method)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (load_id, schema, table_name, batch_no, offset,
+                  len(batch) - len(rejects), len(rejects), attempt,
+                  'insert' if isolate else method))
+        conn.commit()
+        return len(rejects)
+
+    def _insert_isolating(self, cursor, df, table_name, schema):
+        """
+        Вставка с поиском ошибочных строк делением пополам
+
+        Каждая часть вставляется под SAVEPOINT; при ошибке в данных часть
+        откатывается и делится дальше, пока ошибочная строка не останется
+        одна. Для k ошибочных строк из n нужно O(k log n) попыток.
+
+        Returns:
+            list: пары (строка Series, текст ошибки)
+        """
+        cursor.execute("SAVEPOINT isolate_rows")
+        try:
+            self._insert_values(cursor, df, table_name, schema)
+        except TRANSIENT_ERRORS:
             raise
+        except psycopg2.Error as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT isolate_rows")
+            cursor.execute("RELEASE SAVEPOINT isolate_rows")
+            if len(df) == 1:
+                return [(df.iloc[0], str(e).strip())]
+            middle = len(df) // 2
+            return (self._insert_isolating(cursor, df.iloc[:middle], table_name, schema)
+                    + self._insert_isolating(cursor, df.iloc[middle:], table_name, schema))
+        cursor.execute("RELEASE SAVEPOINT isolate_rows")
+        return []
+
+    @staticmethod
+    def _write_rejects(cursor, rejects, load_id, batch_no, table_name, schema):
+        """Запись отклоненных строк в dwh.etl_rejects (строка - JSON)"""
+        values = [
+            (load_id, schema, table_name, batch_no,
+             row.to_json(date_format='iso', force_ascii=False), error)
+            for row, error in rejects
+        ]
+        execute_values(cursor, """
+        INSERT INTO dwh.etl_rejects (load_id, schema_name, table_name, batch_no, row_data, error)
+        VALUES %s
+        """, values)
+
+    @staticmethod
+    def _rollback_quietly(conn):
+        """Откат транзакции на возможно уже оборванном соединении"""
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            pass
+
+    def _reconnect(self, conn):
+        """
+        Новое соединение взамен оборванного
+
+        Основное соединение заменяется в self.conn; соединение из пула
+        остается пулу (pooled_connection закроет его на выходе), а загрузка
+        продолжается через новое.
+        """
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        new_conn = psycopg2.connect(**self.conn_params)
+        if conn is self.conn:
+            self.conn = new_conn
+        print("  Соединение с PostgreSQL восстановлено")
+        return new_conn
+
+    def _insert_values(self, cursor, df, table_name, schema):
+        """Построчная вставка через execute_values с ON CONFLICT DO NOTHING"""
+        columns = ', '.join(df.columns)
+        # Пропуски категорий и Arrow-строк (NaN / pd.NA) передаем как NULL
+        values = [tuple(x) for x in df.astype(object).where(df.notna(), None).values]
+
+        query = f"""
+        INSERT INTO {schema}.{table_name} ({columns})
+        VALUES %s
+        ON CONFLICT DO NOTHING
+        """
+        execute_values(cursor, query, values)
 
-    def read_query(self, query):
+    def _copy_merge(self, cursor, df, table_name, schema, chunk_size):
+        """
+        Загрузка через COPY во временную таблицу и слияние в целевую
+
+        Временная таблица повторяет только типы колонок целевой таблицы
+        (без ограничений и DEFAULT), поэтому SERIAL-ключи и ON CONFLICT
+        отрабатывают уже при INSERT ... SELECT.
+        """
+        columns = ', '.join(df.columns)
+        temp_table = f"tmp_{table_name}_load"
+
+        cursor.execute(f"""
+        CREATE TEMP TABLE {temp_table} ON COMMIT DROP AS
+        SELECT {columns} FROM {schema}.{table_name} WITH NO DATA
+        """)
+        self.copy_dataframe(cursor, df, temp_table, chunk_size)
+        cursor.execute(f"""
+        INSERT INTO {schema}.{table_name} ({columns})
+        SELECT {columns} FROM {temp_table}
+        ON CONFLICT DO NOTHING
+        """)
+
+    @staticmethod
+    def copy_dataframe(cursor, df, table_name, chunk_size=100000):
+        """
+        Потоковая запись DataFrame в таблицу командой COPY FROM STDIN
+
+        Args:
+            cursor: курсор psycopg2 внутри открытой транзакции
+            df: pandas DataFrame
+            table_name: таблица-приемник (с указанием схемы при необходимости)
+            chunk_size: число строк, сериализуемых в CSV-буфер за один раз
+        """
+        columns = ', '.join(df.columns)
+        copy_sql = (f"COPY {table_name} ({columns}) FROM STDIN "
+                    f"WITH (FORMAT csv, NULL '\\N')")
+
+        for start in range(0, len(df), chunk_size):
+            buffer = io.StringIO()
+            df.iloc[start:start + chunk_size].to_csv(
+                buffer, header=False, index=False, na_rep='\\N'
+            )
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+
+    @instrument()
+    def read_query(self, query, params=None):
         """
         Чтение данных из базы с помощью SQL запроса
 
         Args:
             query: SQL запрос SELECT
+            params: параметры запроса (optional)
 
         Returns:
             pandas DataFrame с результатами
         """
         try:
-            return pd.read_sql(query, self.conn)
+            return pd.read_sql(query, self.conn, params=params)
         except Exception as e:
             print(f"Ошибка выполнения запроса: {e}")
             raise
 
+    def read_query_chunks(self, query, chunk_size=100000, params=None):
+        """
+        Потоковое чтение результата запроса порциями через серверный курсор
+
+        Используется отдельное соединение, чтобы COMMIT загрузок в основном
+        соединении не закрывал именованный курсор. Кортежи порции
+        освобождаются до передачи DataFrame дальше, а DataFrame - до
+        чтения следующей порции, поэтому генератор держит не больше одной
+        порции (копии в обработке ниже по цепочке - отдельно).
+
+        Args:
+            query: SQL запрос SELECT
+            chunk_size: количество строк в одной порции
+            params: параметры запроса (optional)
+
+        Yields:
+            pandas DataFrame с очередной порцией результата
+        """
+        stream_conn = psycopg2.connect(**self.conn_params)
+        try:
+            with stream_conn.cursor(name='stream_cursor') as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    columns = [column.name for column in cursor.description]
+                    chunk = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                    del rows
+                    yield chunk
+                    del chunk
+        except Exception as e:
+            print(f"Ошибка потокового чтения: {e}")
+            raise
+        finally:
+            stream_conn.close()
+
     def test_connection(self):
         """Проверка подключения к базе данных"""
         try:
@@ -140,6 +628,9 @@ class DatabaseConnection:
 
     def close(self):
         """Закрытие соединения"""
+        if self.pool:
+            self.pool.closeall()
+            self.pool = None
         if self.conn:
             self.conn.close()
             print("✓ Соединение с базой данных закрыто")
@@ -74,8 +74,11 @@ CREATE TABLE IF NOT EXISTS dwh.dim_customer (
     -- SCD Type 2 поля
     effective_date DATE,
     expiration_date DATE,
-    is_current BOOLEAN DEFAULT TRUE
+    is_current BOOLEAN DEFAULT TRUE,
+    -- Хэш отслеживаемых атрибутов (считается в pandas при SCD2-слиянии)
+    row_hash BIGINT
 );
+ALTER TABLE dwh.dim_customer ADD COLUMN IF NOT EXISTS row_hash BIGINT;
 
 CREATE TABLE IF NOT EXISTS dwh.dim_account (
     account_key SERIAL PRIMARY KEY,
@@ -117,9 +120,10 @@ CREATE TABLE IF NOT EXISTS dwh.dim_branch (
     address TEXT
 );
 
--- Fact Table (факты)
+-- Fact Table (факты), секционирована по месяцам date_key;
+-- месячные партиции создает DataLoader.ensure_fact_partitions
 CREATE TABLE IF NOT EXISTS dwh.fact_transactions (
-    transaction_key SERIAL PRIMARY KEY,
+    transaction_key SERIAL,
     transaction_id INTEGER,
     date_key INTEGER REFERENCES dwh.dim_date(date_key),
     customer_key INTEGER REFERENCES dwh.dim_customer(customer_key),
@@ -133,10 +137,87 @@ CREATE TABLE IF NOT EXISTS dwh.fact_transactions (
     exchange_rate DECIMAL(10, 4),
     transaction_status VARCHAR(50),
     channel VARCHAR(50),
-    merchant_name VARCHAR(200)
+    merchant_name VARCHAR(200),
+    -- Ключ секционирования обязан входить в первичный ключ
+    PRIMARY KEY (transaction_key, date_key)
+) PARTITION BY RANGE (date_key);
+
+-- Агрегаты для дашбордов (обновляются по затронутым date_key после загрузки фактов)
+CREATE TABLE IF NOT EXISTS dwh.agg_daily_account_type (
+    date_key INTEGER NOT NULL,
+    account_key INTEGER NOT NULL,
+    transaction_type_key INTEGER NOT NULL,
+    transaction_count BIGINT NOT NULL,
+    amount_rub_sum DECIMAL(18, 2),
+    amount_rub_avg DECIMAL(15, 2),
+    PRIMARY KEY (date_key, account_key, transaction_type_key)
+);
+
+CREATE TABLE IF NOT EXISTS dwh.agg_daily_channel (
+    date_key INTEGER NOT NULL,
+    channel VARCHAR(50) NOT NULL,
+    transaction_count BIGINT NOT NULL,
+    amount_rub_sum DECIMAL(18, 2),
+    amount_rub_avg DECIMAL(15, 2),
+    PRIMARY KEY (date_key, channel)
+);
+
+-- Состояние инкрементальной загрузки (watermark-и источников)
+CREATE TABLE IF NOT EXISTS dwh.etl_state (
+    source_table VARCHAR(100) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    last_timestamp TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Журнал порционной загрузки (DatabaseConnection.load_dataframe, LOAD_BATCH_SIZE)
+CREATE TABLE IF NOT EXISTS dwh.etl_load_log (
+    log_id BIGSERIAL PRIMARY KEY,
+    load_id VARCHAR(32) NOT NULL,
+    schema_name VARCHAR(63) NOT NULL,
+    table_name VARCHAR(63) NOT NULL,
+    batch_no INTEGER NOT NULL,
+    row_offset BIGINT NOT NULL,
+    rows_loaded INTEGER NOT NULL,
+    rows_rejected INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    load_method VARCHAR(10),
+    loaded_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE (load_id, batch_no)
+);
+
+-- Строки, отклоненные при порционной загрузке
+CREATE TABLE IF NOT EXISTS dwh.etl_rejects (
+    reject_id BIGSERIAL PRIMARY KEY,
+    load_id VARCHAR(32) NOT NULL,
+    schema_name VARCHAR(63) NOT NULL,
+    table_name VARCHAR(63) NOT NULL,
+    batch_no INTEGER NOT NULL,
+    row_data JSONB NOT NULL,
+    error TEXT,
+    rejected_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Индексы и FK, удаленные на время массовой загрузки fact таблицы
+-- (DataLoader._bulk_load_mode); строка удаляется после восстановления
+CREATE TABLE IF NOT EXISTS dwh.etl_dropped_objects (
+    table_name VARCHAR(127) NOT NULL,
+    object_name VARCHAR(63) NOT NULL,
+    object_type VARCHAR(20) NOT NULL,
+    definition TEXT NOT NULL,
+    dropped_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (table_name, object_name)
 );
 
 -- Индексы для оптимизации
 CREATE INDEX idx_fact_date ON dwh.fact_transactions(date_key);
 CREATE INDEX idx_fact_customer ON dwh.fact_transactions(customer_key);
 CREATE INDEX idx_fact_account ON dwh.fact_transactions(account_key);
+CREATE INDEX idx_dim_customer_current ON dwh.dim_customer(customer_id) WHERE is_current;
+
+-- Уникальные натуральные ключи: повторная загрузка (ON CONFLICT DO NOTHING)
+-- не дублирует строки измерений и фактов
+CREATE UNIQUE INDEX uq_dim_account_account_id ON dwh.dim_account(account_id);
+CREATE UNIQUE INDEX uq_dim_branch_branch_id ON dwh.dim_branch(branch_id);
+CREATE UNIQUE INDEX uq_dim_transaction_type ON dwh.dim_transaction_type(transaction_type);
+CREATE UNIQUE INDEX uq_fact_transaction_id ON dwh.fact_transactions(transaction_id, date_key);
@@ -0,0 +1,178 @@
+# etl/checkpoints.py
+"""
+Контрольные точки шагов пайплайна с хэшем содержимого
+"""
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+
+
+def content_hash(value):
+    """
+    Хэш содержимого результата шага
+
+    DataFrame хэшируется по колонкам, типам и значениям
+    (pandas.util.hash_pandas_object, без индекса), словари и списки -
+    рекурсивно, остальные значения - по repr.
+
+    Returns:
+        str: hex-строка sha256
+    """
+    digest = hashlib.sha256()
+    _update_hash(digest, value)
+    return digest.hexdigest()
+
+
+def _update_hash(digest, value):
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr(list(zip(value.columns, map(str, value.dtypes)))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(repr(key).encode())
+            _update_hash(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"[{len(value)}]".encode())
+        for item in value:
+            _update_hash(digest, item)
+    else:
+        digest.update(repr(value).encode())
+
+
+class CheckpointStore:
+    """
+    Результаты шагов на диске: каталог на шаг с manifest.json и outputs.pkl
+
+    Манифест хранит хэш входов шага (параметры и хэши результатов
+    шагов-зависимостей) и хэш его результата. Контрольная точка
+    действительна, только если хэш входов совпал. Манифест пишется
+    последним, поэтому прерванная запись не считается контрольной точкой.
+    run.json в корне описывает текущий запуск (start_run).
+    """
+
+    def __init__(self, base_dir):
+        """
+        Args:
+            base_dir: корневой каталог контрольных точек
+        """
+        self.base_dir = Path(base_dir)
+
+    @property
+    def run_path(self):
+        return self.base_dir / 'run.json'
+
+    def start_run(self):
+        """
+        Манифест запуска: незавершенный продолжается, иначе создается новый
+
+        Манифест фиксирует run_id и дату курсов валют на весь запуск,
+        поэтому повтор после сбоя не зависит от текущего времени.
+
+        Returns:
+            dict: run_id, rates_date, started_at, completed
+        """
+        try:
+            run = json.loads(self.run_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            run = None
+        if run is not None and not run['completed']:
+            print(f"Продолжение запуска {run['run_id']} от {run['started_at']}")
+            return run
+
+        run = {
+            'run_id': datetime.now().strftime('%Y%m%d_%H%M%S_') + uuid.uuid4().hex[:6],
+            'rates_date': date.today().isoformat(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'completed': False,
+        }
+        self._write_run(run)
+        print(f"Новый запуск {run['run_id']}")
+        return run
+
+    def complete_run(self, run):
+        """Отметка об успешном завершении: следующий запуск начнется заново"""
+        self._write_run({**run, 'completed': True})
+
+    def _write_run(self, run):
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.run_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(run, indent=2), encoding='utf-8')
+        os.replace(tmp_path, self.run_path)
+
+    def _manifest_path(self, stage):
+        return self.base_dir / stage / 'manifest.json'
+
+    def manifest(self, stage):
+        """Манифест шага или None"""
+        try:
+            return json.loads(self._manifest_path(stage).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def has(self, stage, input_hash):
+        manifest = self.manifest(stage)
+        return manifest is not None and manifest['input_hash'] == input_hash
+
+    def load(self, stage, input_hash):
+        """
+        Результат шага, если контрольная точка есть для этих входов
+
+        Returns:
+            tuple: (словарь результатов, хэш результата) или None
+        """
+        manifest = self.manifest(stage)
+        if manifest is None or manifest['input_hash'] != input_hash:
+            return None
+        outputs = {}
+        if manifest['has_outputs']:
+            outputs = pd.read_pickle(self.base_dir / stage / 'outputs.pkl')
+        return outputs, manifest['output_hash']
+
+    def save(self, stage, input_hash, outputs=None):
+        """
+        Сохранение результата шага
+
+        Args:
+            stage: название шага
+            input_hash: хэш входов шага
+            outputs: словарь результатов (DataFrame-ы и простые значения);
+                None - шаг без результата в памяти (загрузка в БД), для него
+                хэшем результата служит хэш входов
+
+        Returns:
+            str: хэш результата
+        """
+        stage_dir = self.base_dir / stage
+        stage_dir.mkdir(parents=True, exist_ok=True)
+        self._manifest_path(stage).unlink(missing_ok=True)
+
+        if outputs is not None:
+            # pickle сохраняет типы колонок (категории, Arrow-строки) как есть
+            tmp_path = stage_dir / f"outputs.{uuid.uuid4().hex}.tmp"
+            pd.to_pickle(outputs, tmp_path)
+            os.replace(tmp_path, stage_dir / 'outputs.pkl')
+            output_hash = content_hash(outputs)
+        else:
+            output_hash = input_hash
+
+        manifest = {
+            'stage': stage,
+            'input_hash': input_hash,
+            'output_hash': output_hash,
+            'has_outputs': outputs is not None,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._manifest_path(stage).write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+        return output_hash
+
+    def clear(self):
+        """Удаление всех контрольных точек"""
+        if self.base_dir.exists():
+            shutil.rmtree(self.base_dir)
+            print(f"✓ Контрольные точки удалены: {self.base_dir}")
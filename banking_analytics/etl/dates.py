@@ -0,0 +1,32 @@
+# etl/dates.py
+"""
+Вспомогательные функции для ключей измерения дат
+"""
+import numpy as np
+import pandas as pd
+
+
+def to_date_key(dates):
+    """
+    Ключ даты YYYYMMDD (year * 10000 + month * 100 + day)
+
+    Считается арифметикой над datetime64 без форматирования строк.
+
+    Args:
+        dates: Series, DatetimeIndex, массив или скаляр с датами
+
+    Returns:
+        numpy-массив int64 (для скаляра - int)
+    """
+    values = pd.to_datetime(dates)
+    if np.ndim(values) == 0:
+        return int(to_date_key([values])[0])
+
+    days = np.asarray(values, dtype='datetime64[ns]').astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    years = days.astype('datetime64[Y]')
+
+    year = years.astype('int64') + 1970
+    month = (months - years.astype('datetime64[M]')).astype('int64') + 1
+    day = (days - months.astype('datetime64[D]')).astype('int64') + 1
+    return year * 10000 + month * 100 + day
@@ -0,0 +1,125 @@
+# etl/dtypes.py
+"""
+Компактные типы колонок для DataFrame-ов пайплайна
+"""
+import numpy as np
+import pandas as pd
+
+
+# Таблица -> {колонка: тип}; 'string' - строка в Arrow (если есть pyarrow),
+# 'category' - колонка с небольшим числом различных значений,
+# 'int32' - идентификатор (остается int64, если значения не помещаются)
+TABLE_DTYPES = {
+    'customers': {
+        'customer_id': 'int32',
+        'first_name': 'string',
+        'last_name': 'string',
+        'email': 'string',
+        'phone': 'string',
+        'city': 'string',
+        'country': 'category',
+        'customer_segment': 'category',
+    },
+    'accounts': {
+        'account_id': 'int32',
+        'customer_id': 'int32',
+        'account_number': 'string',
+        'account_type': 'category',
+        'currency': 'category',
+        'status': 'category',
+    },
+    'transactions': {
+        'transaction_id': 'int32',
+        'account_id': 'int32',
+        'customer_id': 'int32',
+        'transaction_type': 'category',
+        'currency': 'category',
+        'merchant_name': 'string',
+        'transaction_status': 'category',
+        'channel': 'category',
+    },
+    'branches': {
+        'branch_id': 'int32',
+        'branch_name': 'string',
+        'city': 'string',
+        'address': 'string',
+        'region': 'category',
+    },
+}
+
+
+def string_dtype():
+    """Строковый тип на Arrow; без pyarrow строки остаются object"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    return pd.StringDtype('pyarrow')
+
+
+def _fits_int32(series):
+    if series.isna().any():
+        return False
+    if series.empty:
+        return True
+    info = np.iinfo('int32')
+    return info.min <= series.min() and series.max() <= info.max
+
+
+def to_compact_dtypes(df, table_name):
+    """
+    Приведение колонок DataFrame к компактным типам из TABLE_DTYPES
+
+    Значения не меняются: суммы и курсы остаются float64 (float32 теряет
+    копейки уже на суммах порядка 10^5), даты не трогаются.
+
+    Args:
+        df: pandas DataFrame
+        table_name: таблица из TABLE_DTYPES (остальные возвращаются как есть)
+
+    Returns:
+        DataFrame с компактными типами
+    """
+    schema = TABLE_DTYPES.get(table_name)
+    if schema is None:
+        return df
+
+    text_dtype = string_dtype()
+    dtypes = {}
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        if dtype == 'int32':
+            if not _fits_int32(df[column]):
+                continue
+        elif dtype == 'string':
+            if text_dtype is None:
+                continue
+            dtype = text_dtype
+        if df[column].dtype != dtype:
+            dtypes[column] = dtype
+
+    return df.astype(dtypes) if dtypes else df
+
+
+def memory_usage_mb(df):
+    """Полный объем DataFrame в памяти (с содержимым строк), МБ"""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def report_memory(frames):
+    """
+    Вывод объема памяти DataFrame-ов
+
+    Args:
+        frames: словарь {название: DataFrame}; остальные значения
+            (например, итераторы порций) пропускаются
+    """
+    total = 0.0
+    for name, df in frames.items():
+        if not isinstance(df, pd.DataFrame):
+            continue
+        size = memory_usage_mb(df)
+        total += size
+        print(f"  {name}: {len(df)} строк, {size:.1f} МБ")
+    print(f"  Всего: {total:.1f} МБ")
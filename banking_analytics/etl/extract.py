@@ -4,28 +4,61 @@
 """
 import pandas as pd
 from database.db_connection import DatabaseConnection
+from etl.dtypes import to_compact_dtypes
+from monitoring.metrics import instrument
 
 
 class DataExtractor:
     """Класс для извлечения данных из различных источников"""
 
-    def __init__(self, db_connection: DatabaseConnection):
+    def __init__(self, db_connection: DatabaseConnection, compact_dtypes=False):
         """
         Инициализация экстрактора данных
 
         Args:
             db_connection: экземпляр подключения к базе данных
+            compact_dtypes: приводить извлеченные таблицы к компактным типам
+                (etl.dtypes.TABLE_DTYPES)
         """
         self.db = db_connection
+        self.compact_dtypes = compact_dtypes
 
-    def extract_customers_from_staging(self):
+    def _finish(self, df, table_name):
+        """Приведение извлеченной таблицы к компактным типам (если включено)"""
+        return to_compact_dtypes(df, table_name) if self.compact_dtypes else df
+
+    @staticmethod
+    def _id_range_filter(column, id_range):
+        """
+        Условие отбора строк по диапазону идентификаторов (low, high]
+
+        Args:
+            column: колонка-идентификатор
+            id_range: кортеж (low, high) или None - без ограничения
+
+        Returns:
+            tuple: (SQL-фрагмент для WHERE, параметры запроса)
+        """
+        if id_range is None:
+            return "", None
+        low, high = id_range
+        return (f"AND {column} > %(low_id)s AND {column} <= %(high_id)s",
+                {'low_id': low, 'high_id': high})
+
+    @instrument()
+    def extract_customers_from_staging(self, id_range=None):
         """
         Извлечение данных клиентов из staging-слоя
 
+        Args:
+            id_range: диапазон customer_id (low, high] для инкрементальной
+                загрузки (optional)
+
         Returns:
             DataFrame с данными клиентов
         """
-        query = """
+        id_filter, params = self._id_range_filter('customer_id', id_range)
+        query = f"""
         SELECT 
             customer_id,
             first_name,
@@ -39,21 +72,28 @@ class DataExtractor:
             customer_segment
         FROM staging.customers
         WHERE customer_id IS NOT NULL
+        {id_filter}
         """
 
         print("Извлечение данных клиентов из staging...")
-        df = self.db.read_query(query)
+        df = self._finish(self.db.read_query(query, params), 'customers')
         print(f"Извлечено {len(df)} записей клиентов")
         return df
 
-    def extract_accounts_from_staging(self):
+    @instrument()
+    def extract_accounts_from_staging(self, id_range=None):
         """
         Извлечение данных счетов из staging-слоя
 
+        Args:
+            id_range: диапазон account_id (low, high] для инкрементальной
+                загрузки (optional)
+
         Returns:
             DataFrame с данными счетов
         """
-        query = """
+        id_filter, params = self._id_range_filter('account_id', id_range)
+        query = f"""
         SELECT 
             account_id,
             customer_id,
@@ -65,21 +105,15 @@ class DataExtractor:
             status
         FROM staging.accounts
         WHERE account_id IS NOT NULL
+        {id_filter}
         """
 
         print("Извлечение данных счетов из staging...")
-        df = self.db.read_query(query)
+        df = self._finish(self.db.read_query(query, params), 'accounts')
         print(f"Извлечено {len(df)} записей счетов")
         return df
 
-    def extract_transactions_from_staging(self):
-        """
-        Извлечение транзакций из staging-слоя
-
-        Returns:
-            DataFrame с транзакциями
-        """
-        query = """
+    TRANSACTIONS_QUERY = """
         SELECT 
             t.transaction_id,
             t.account_id,
@@ -97,19 +131,102 @@ class DataExtractor:
             AND t.transaction_status = 'Completed'
         """
 
+    @instrument()
+    def extract_transactions_from_staging(self, id_range=None):
+        """
+        Извлечение транзакций из staging-слоя
+
+        Args:
+            id_range: диапазон transaction_id (low, high] для инкрементальной
+                загрузки (optional)
+
+        Returns:
+            DataFrame с транзакциями
+        """
+        id_filter, params = self._id_range_filter('t.transaction_id', id_range)
         print("Извлечение транзакций из staging...")
-        df = self.db.read_query(query)
+        df = self._finish(self.db.read_query(self.TRANSACTIONS_QUERY + id_filter, params),
+                          'transactions')
         print(f"Извлечено {len(df)} транзакций")
         return df
 
-    def extract_branches_from_staging(self):
+    def stream_transactions_from_staging(self, chunk_size=100000, id_range=None):
+        """
+        Потоковое извлечение транзакций из staging-слоя порциями
+
+        Args:
+            chunk_size: количество транзакций в одной порции
+            id_range: диапазон transaction_id (low, high] (optional)
+
+        Yields:
+            DataFrame с очередной порцией транзакций
+        """
+        print(f"Потоковое извлечение транзакций из staging (порции по {chunk_size})...")
+        id_filter, params = self._id_range_filter('t.transaction_id', id_range)
+        total = 0
+        for chunk in self.db.read_query_chunks(self.TRANSACTIONS_QUERY + id_filter,
+                                               chunk_size, params):
+            total += len(chunk)
+            yield self._finish(chunk, 'transactions')
+        print(f"Извлечено {total} транзакций")
+
+    def extract_transaction_date_range(self, id_range=None):
+        """
+        Диапазон дат завершенных транзакций в staging-слое
+
+        Args:
+            id_range: диапазон transaction_id (low, high] (optional)
+
+        Returns:
+            tuple: (первая дата, последняя дата) или (None, None)
+        """
+        id_filter, params = self._id_range_filter('transaction_id', id_range)
+        query = f"""
+        SELECT 
+            MIN(transaction_date)::date AS date_from,
+            MAX(transaction_date)::date AS date_to
+        FROM staging.transactions
+        WHERE transaction_status = 'Completed'
+        {id_filter}
+        """
+        row = self.db.read_query(query, params).iloc[0]
+        if pd.isna(row['date_from']):
+            return None, None
+        return row['date_from'], row['date_to']
+
+    def count_transactions(self, id_range=None):
+        """
+        Число завершенных транзакций в staging-слое (без извлечения)
+
+        Args:
+            id_range: диапазон transaction_id (low, high] (optional)
+
+        Returns:
+            int: количество транзакций
+        """
+        id_filter, params = self._id_range_filter('transaction_id', id_range)
+        query = f"""
+        SELECT COUNT(*) AS row_count
+        FROM staging.transactions
+        WHERE transaction_status = 'Completed'
+        {id_filter}
+        """
+        return int(self.db.read_query(query, params).iloc[0]['row_count'])
+
+    @instrument()
+    def extract_branches_from_staging(self, id_range=None):
         """
         Извлечение данных отделений из staging-слоя
 
+        Args:
+            id_range: диапазон branch_id (low, high] для инкрементальной
+                загрузки (optional)
+
         Returns:
             DataFrame с данными отделений
         """
-        query = """
+        id_filter, params = self._id_range_filter('branch_id', id_range)
+        query = f"""
         SELECT 
             branch_id,
             branch_name,
@@ -119,19 +236,21 @@ class DataExtractor:
             opening_date
         FROM staging.branches
         WHERE branch_id IS NOT NULL
+        {id_filter}
         """
 
         print("Извлечение данных отделений из staging...")
-        df = self.db.read_query(query)
+        df = self._finish(self.db.read_query(query, params), 'branches')
         print(f"Извлечено {len(df)} записей отделений")
         return df
 
+    @instrument()
     def extract_exchange_rates_from_staging(self):
         """
-        Извлечение курсов валют из staging-слоя
+        Извлечение истории курсов валют из staging-слоя
 
         Returns:
-            DataFrame с курсами валют
+            DataFrame с курсами валют, отсортированный по дате
         """
         query = """
         SELECT 
@@ -140,32 +259,160 @@ class DataExtractor:
             eur_to_rub,
             usd_to_eur
         FROM staging.exchange_rates
-        ORDER BY date DESC
-        LIMIT 1
+        ORDER BY date
         """
 
         print("Извлечение курсов валют из staging...")
         df = self.db.read_query(query)
-        print(f"Извлечено курсов на дату: {df['date'].iloc[0] if not df.empty else 'N/A'}")
+        if df.empty:
+            print("Извлечено курсов на дату: N/A")
+        else:
+            print(f"Извлечено курсов за {len(df)} дат: "
+                  f"{df['date'].iloc[0]} - {df['date'].iloc[-1]}")
         return df
 
-    def extract_all_staging_data(self):
+    def extract_high_watermarks(self):
+        """
+        Текущие верхние границы идентификаторов в staging-таблицах
+
+        Returns:
+            dict: {таблица: {'last_id': ..., 'last_timestamp': ...}}
+        """
+        query = """
+        SELECT 'customers' AS source_table, MAX(customer_id) AS last_id,
+               NULL::timestamp AS last_timestamp
+        FROM staging.customers
+        UNION ALL
+        SELECT 'accounts', MAX(account_id), NULL FROM staging.accounts
+        UNION ALL
+        SELECT 'branches', MAX(branch_id), NULL FROM staging.branches
+        UNION ALL
+        SELECT 'transactions', MAX(transaction_id), MAX(transaction_date)
+        FROM staging.transactions
+        """
+        df = self.db.read_query(query)
+        return {
+            row.source_table: {
+                'last_id': int(row.last_id) if pd.notna(row.last_id) else 0,
+                'last_timestamp': (row.last_timestamp.to_pydatetime()
+                                   if pd.notna(row.last_timestamp) else None)
+            }
+            for row in df.itertuples(index=False)
+        }
+
+    @instrument()
+    def extract_all_staging_data(self, stream_chunk_size=None, id_ranges=None,
+                                 include_transactions=True):
         """
         Извлечение всех данных из staging одним вызовом
 
+        Args:
+            stream_chunk_size: если указан, транзакции возвращаются
+                итератором DataFrame-порций этого размера
+            id_ranges: словарь {таблица: (low, high)} для инкрементальной
+                загрузки; таблицы без диапазона извлекаются целиком
+            include_transactions: извлекать ли транзакции (в ELT-режиме
+                fact таблица строится в PostgreSQL и они не нужны)
+
         Returns:
             dict: словарь с DataFrames для каждой таблицы
         """
         print("\n=== Начало извлечения данных из staging ===\n")
 
+        id_ranges = id_ranges or {}
+        transactions_range = id_ranges.get('transactions')
+
         data = {
-            'customers': self.extract_customers_from_staging(),
-            'accounts': self.extract_accounts_from_staging(),
-            'transactions': self.extract_transactions_from_staging(),
-            'branches': self.extract_branches_from_staging(),
+            'customers': self.extract_customers_from_staging(id_ranges.get('customers')),
+            'accounts': self.extract_accounts_from_staging(id_ranges.get('accounts')),
+            'branches': self.extract_branches_from_staging(id_ranges.get('branches')),
             'exchange_rates': self.extract_exchange_rates_from_staging()
         }
+        if include_transactions:
+            data['transactions'] = (
+                self.stream_transactions_from_staging(stream_chunk_size, transactions_range)
+                if stream_chunk_size
+                else self.extract_transactions_from_staging(transactions_range)
+            )
+
+        print("\n=== Извлечение данных завершено ===\n")
+        return data
+
+    # Колонки staging-таблиц (как в SELECT-запросах выше)
+    STAGE_COLUMNS = {
+        'customers': ['customer_id', 'first_name', 'last_name', 'email', 'phone',
+                      'date_of_birth', 'city', 'country', 'registration_date',
+                      'customer_segment'],
+        'accounts': ['account_id', 'customer_id', 'account_number', 'account_type',
+                     'currency', 'balance', 'opening_date', 'status'],
+        'transactions': ['transaction_id', 'account_id', 'transaction_date',
+                         'transaction_type', 'amount', 'currency', 'merchant_name',
+                         'transaction_status', 'channel'],
+        'branches': ['branch_id', 'branch_name', 'city', 'address', 'region', 'opening_date'],
+        'exchange_rates': ['date', 'usd_to_rub', 'eur_to_rub', 'usd_to_eur'],
+    }
+    ID_COLUMNS = {
+        'customers': 'customer_id',
+        'accounts': 'account_id',
+        'transactions': 'transaction_id',
+        'branches': 'branch_id',
+    }
+
+    @instrument()
+    def extract_all_from_stage_store(self, stage_store, id_ranges=None,
+                                     date_from=None, date_to=None):
+        """
+        Извлечение staging-данных из локального Parquet-хранилища
+
+        Повторяет логику SQL-запросов staging: только завершенные
+        транзакции и customer_id из счетов (LEFT JOIN). Фильтры передаются
+        в pyarrow, поэтому лишние колонки и секции не читаются.
+
+        Args:
+            stage_store: экземпляр ParquetStageStore
+            id_ranges: словарь {таблица: (low, high)} для инкрементальной загрузки
+            date_from: начальная дата транзакций 'YYYY-MM-DD' (optional)
+            date_to: конечная дата транзакций 'YYYY-MM-DD' (optional)
+
+        Returns:
+            dict: словарь с DataFrames для каждой таблицы
+        """
+        print("\n=== Начало извлечения данных из stage-хранилища ===\n")
+        id_ranges = id_ranges or {}
+
+        def id_filters(table_name):
+            if table_name not in id_ranges:
+                return []
+            low, high = id_ranges[table_name]
+            column = self.ID_COLUMNS[table_name]
+            return [(column, '>', low), (column, '<=', high)]
+
+        data = {}
+        for table_name in ('customers', 'accounts', 'branches', 'exchange_rates'):
+            filters = id_filters(table_name) or None
+            data[table_name] = stage_store.read(table_name, columns=self.STAGE_COLUMNS[table_name],
+                                                filters=filters)
+
+        transaction_filters = [('transaction_status', '==', 'Completed')] + id_filters('transactions')
+        if date_from:
+            transaction_filters.append(('transaction_day', '>=', date_from))
+        if date_to:
+            transaction_filters.append(('transaction_day', '<=', date_to))
+        transactions = stage_store.read('transactions', columns=self.STAGE_COLUMNS['transactions'],
+                                        filters=transaction_filters)
+
+        # customer_id берем из всех счетов, а не только из новых
+        account_owners = stage_store.read('accounts', columns=['account_id', 'customer_id'])
+        transactions['customer_id'] = transactions['account_id'].map(
+            account_owners.set_index('account_id')['customer_id']
+        )
+        data['transactions'] = transactions
+        data['exchange_rates'] = data['exchange_rates'].sort_values('date').reset_index(drop=True)
+        for table_name in ('customers', 'accounts', 'transactions', 'branches'):
+            data[table_name] = self._finish(data[table_name], table_name)
 
+        for table_name, df in data.items():
+            print(f"Извлечено {len(df)} записей: {table_name}")
         print("\n=== Извлечение данных завершено ===\n")
         return data
 
@@ -1,49 +1,231 @@
 # etl/load.py
-from datetime import datetime
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
 import pandas as pd
 import numpy as np
+from etl.dates import to_date_key
+from monitoring.metrics import instrument
 
 
 class DataLoader:
     """Загрузка данных в схему звезда"""
 
-    def __init__(self, db_connection):
+    # Измерение -> (запрос ключей, натуральный ключ, суррогатный ключ)
+    DIMENSION_KEYS = {
+        'dim_customer': (
+            "SELECT customer_key, customer_id FROM dwh.dim_customer "
+            "WHERE is_current = TRUE ORDER BY customer_key",
+            'customer_id', 'customer_key'
+        ),
+        'dim_account': (
+            "SELECT account_key, account_id FROM dwh.dim_account ORDER BY account_key",
+            'account_id', 'account_key'
+        ),
+        'dim_transaction_type': (
+            "SELECT transaction_type_key, transaction_type FROM dwh.dim_transaction_type "
+            "ORDER BY transaction_type_key",
+            'transaction_type', 'transaction_type_key'
+        ),
+    }
+
+    # Атрибуты клиента, изменение которых создает новую версию в dim_customer
+    # (age меняется сам по себе и историю не порождает)
+    SCD2_TRACKED_COLUMNS = (
+        'first_name', 'last_name', 'full_name', 'email', 'phone',
+        'city', 'country', 'customer_segment', 'registration_date',
+    )
+    SCD2_OPEN_END = date(2099, 12, 31)
+
+    # Агрегаты для дашбордов: таблица -> SELECT по fact таблице
+    AGGREGATES = {
+        'agg_daily_account_type': """
+            SELECT date_key, account_key, transaction_type_key,
+                   COUNT(*), SUM(amount_rub), ROUND(AVG(amount_rub), 2)
+            FROM dwh.fact_transactions
+            WHERE {where}
+            GROUP BY date_key, account_key, transaction_type_key
+        """,
+        'agg_daily_channel': """
+            SELECT date_key, COALESCE(channel, 'Unknown'),
+                   COUNT(*), SUM(amount_rub), ROUND(AVG(amount_rub), 2)
+            FROM dwh.fact_transactions
+            WHERE {where}
+            GROUP BY date_key, COALESCE(channel, 'Unknown')
+        """,
+    }
+
+    # Число отделений для демо-привязки транзакций: branch_key = 1 + account_id % N
+    # (отделение определяется счетом, поэтому повторная сборка строк та же)
+    DEMO_BRANCH_COUNT = 50
+
+    # Колонки fact таблицы, которые заполняет ELT-запрос
+    ELT_FACT_COLUMNS = (
+        'transaction_id', 'date_key', 'customer_key', 'account_key',
+        'transaction_type_key', 'branch_key', 'amount_original', 'original_currency',
+        'amount_rub', 'exchange_rate', 'transaction_status', 'channel', 'merchant_name',
+    )
+
+    # Условия clean_transactions: завершенные транзакции без выбросов
+    ELT_TRANSACTION_FILTER = """
+        t.transaction_status = 'Completed'
+        AND ABS(t.amount) < 1000000
+        {id_filter}
+    """
+
+    ELT_DATE_KEY = """(EXTRACT(YEAR FROM t.transaction_date) * 10000
+        + EXTRACT(MONTH FROM t.transaction_date) * 100
+        + EXTRACT(DAY FROM t.transaction_date))::integer"""
+
+    # Та же логика, что clean_transactions + enrich_with_currency_rates +
+    # _build_fact_data, но целиком в PostgreSQL. Курсы - все колонки
+    # *_to_rub staging.exchange_rates (как get_rate_table), развернутые в
+    # таблицу (валюта, курс, интервал действия): курс действует от своей
+    # даты до следующей, самый ранний - и для более ранних транзакций.
+    # RUB и валюты без колонки курса получают 1.0. Ключи измерений -
+    # последние версии (как drop_duplicates(keep='last') в get_dimension_keys).
+    # amount_rub считается в float8 и приводится через text, чтобы округление
+    # до DECIMAL(15, 2) совпадало с загрузкой значений float из pandas.
+    ELT_FACT_SELECT = """
+        WITH customer_keys AS (
+            SELECT customer_id, MAX(customer_key) AS customer_key
+            FROM dwh.dim_customer WHERE is_current = TRUE GROUP BY customer_id
+        ),
+        account_keys AS (
+            SELECT account_id, MAX(account_key) AS account_key
+            FROM dwh.dim_account GROUP BY account_id
+        ),
+        transaction_type_keys AS (
+            SELECT transaction_type, MAX(transaction_type_key) AS transaction_type_key
+            FROM dwh.dim_transaction_type GROUP BY transaction_type
+        ),
+        rate_dates AS (
+            SELECT r.*,
+                   CASE WHEN r.date = MIN(r.date) OVER () THEN '-infinity'::timestamp
+                        ELSE r.date::timestamp END AS valid_from,
+                   LEAD(r.date) OVER (ORDER BY r.date)::timestamp AS valid_to
+            FROM staging.exchange_rates r
+        ),
+        fx_rates AS (
+            SELECT UPPER(LEFT(kv.key, -LENGTH('_to_rub'))) AS currency,
+                   kv.value::numeric AS rate, r.valid_from, r.valid_to
+            FROM rate_dates r
+            CROSS JOIN LATERAL jsonb_each_text(to_jsonb(r)) kv
+            WHERE RIGHT(kv.key, LENGTH('_to_rub')) = '_to_rub'
+        ),
+        source AS (
+            SELECT
+                t.transaction_id,
+                {date_key} AS date_key,
+                ck.customer_key,
+                ak.account_key,
+                tk.transaction_type_key,
+                1 + MOD(t.account_id, {branch_count}) AS branch_key,
+                ABS(t.amount) AS amount_original,
+                t.currency AS original_currency,
+                CASE WHEN t.currency = 'RUB' OR fx.currency IS NULL THEN 1.0
+                     ELSE fx.rate
+                END AS exchange_rate,
+                t.transaction_status,
+                t.channel,
+                t.merchant_name
+            FROM staging.transactions t
+            LEFT JOIN staging.accounts a ON t.account_id = a.account_id
+            JOIN customer_keys ck ON ck.customer_id = a.customer_id
+            JOIN account_keys ak ON ak.account_id = t.account_id
+            JOIN transaction_type_keys tk ON tk.transaction_type = t.transaction_type
+            LEFT JOIN fx_rates fx
+                ON fx.currency = t.currency
+                AND t.transaction_date >= fx.valid_from
+                AND (fx.valid_to IS NULL OR t.transaction_date < fx.valid_to)
+            WHERE {transaction_filter}
+        )
+        SELECT
+            transaction_id, date_key, customer_key, account_key, transaction_type_key,
+            branch_key, amount_original, original_currency,
+            (amount_original::float8 * exchange_rate::float8)::text::numeric AS amount_rub,
+            exchange_rate, transaction_status, channel, merchant_name
+        FROM source
+    """
+
+    def __init__(self, db_connection, fact_load_workers=1, bulk_load_threshold=None,
+                 maintenance_work_mem_mb=1024, swap_min_ratio=0.1):
+        """
+        Args:
+            db_connection: экземпляр DatabaseConnection
+            fact_load_workers: число параллельных соединений для загрузки
+                fact таблицы (1 - загрузка одним потоком); пул db_connection
+                должен быть больше на одно соединение (блокировки партиций)
+            bulk_load_threshold: от этого числа строк fact таблица грузится
+                без вторичных индексов и внешних ключей (None - никогда)
+            maintenance_work_mem_mb: общий бюджет памяти на перестроение
+                индексов, делится между параллельными CREATE INDEX
+            swap_min_ratio: при параллельной загрузке месяц пересобирается
+                и подменяется, только если его новых строк не меньше этой доли
+                строк партиции; меньшие порции дописываются в партицию
+                (0 - всегда подмена)
+        """
+        if fact_load_workers > 1 and fact_load_workers + 1 > db_connection.pool_size:
+            # Без пула каждый воркер открывал бы новое физическое соединение
+            raise ValueError(
+                f"fact_load_workers={fact_load_workers} требует пул соединений не меньше "
+                f"{fact_load_workers + 1} (сейчас {db_connection.pool_size}): "
+                f"увеличьте DB_POOL_SIZE"
+            )
         self.db = db_connection
+        self.fact_load_workers = fact_load_workers
+        self.bulk_load_threshold = bulk_load_threshold
+        self.maintenance_work_mem_mb = maintenance_work_mem_mb
+        self.swap_min_ratio = swap_min_ratio
+        # Месяцы (YYYYMM), для которых партиция fact таблицы уже создана
+        self._fact_partitions = set()
+        # Кэш суррогатных ключей: измерение -> Series (натуральный ключ -> ключ)
+        self._key_cache = {}
+
+    def get_dimension_keys(self, dimension):
+        """
+        Суррогатные ключи измерения из кэша (читаются из БД один раз)
+
+        Args:
+            dimension: название измерения из DIMENSION_KEYS
+
+        Returns:
+            Series с индексом по натуральному ключу и суррогатными ключами
+        """
+        if dimension not in self._key_cache:
+            query, natural_key, surrogate_key = self.DIMENSION_KEYS[dimension]
+            keys = self.db.read_query(query)
+            # При повторах натурального ключа берем последнюю (самую новую) версию
+            keys = keys.drop_duplicates(subset=[natural_key], keep='last')
+            self._key_cache[dimension] = pd.Series(
+                keys[surrogate_key].to_numpy(dtype='int64'),
+                index=pd.Index(keys[natural_key])
+            )
+        return self._key_cache[dimension]
 
+    def _invalidate_keys(self, dimension):
+        """Сброс кэша ключей после загрузки измерения"""
+        self._key_cache.pop(dimension, None)
+
+    @instrument()
     def load_dimensions(self, customers_df, accounts_df, branches_df, date_dim_df):
         """Загрузка измерений"""
         print("\nЗагрузка dimension таблиц...")
 
-        # dim_customer - с обогащенными данными
-        customers_clean = customers_df[[
-            'customer_id', 'first_name', 'last_name', 'full_name',
-            'email', 'phone', 'age', 'city', 'country',
-            'customer_segment', 'registration_date'
-        ]].copy()
-        customers_clean['effective_date'] = datetime.now().date()
-        customers_clean['expiration_date'] = pd.to_datetime('2099-12-31').date()
-        customers_clean['is_current'] = True
-
-        self.db.load_dataframe(customers_clean, 'dim_customer', schema='dwh')
-
         # dim_account - без customer_id
         accounts_clean = accounts_df[[
             'account_id', 'account_number', 'account_type',
             'currency', 'opening_date', 'status'
         ]].copy()
 
-        self.db.load_dataframe(accounts_clean, 'dim_account', schema='dwh')
-
         # dim_branch - ИСПРАВЛЕНО: без opening_date
         branches_clean = branches_df[[
             'branch_id', 'branch_name', 'city', 'region', 'address'
         ]].copy()
 
-        self.db.load_dataframe(branches_clean, 'dim_branch', schema='dwh')
-
-        # dim_date
-        self.db.load_dataframe(date_dim_df, 'dim_date', schema='dwh')
-
         # dim_transaction_type
         transaction_types = pd.DataFrame([
             {'transaction_type': 'Deposit', 'transaction_category': 'Income',
@@ -57,58 +239,853 @@ class DataLoader:
             {'transaction_type': 'ATM', 'transaction_category': 'Expense',
              'description': 'ATM withdrawal'}
         ])
-        self.db.load_dataframe(transaction_types, 'dim_transaction_type', schema='dwh')
+
+        # Измерения независимы друг от друга - загружаем параллельно
+        self.db.load_dataframes_parallel([
+            (accounts_clean, 'dim_account', 'dwh'),
+            (branches_clean, 'dim_branch', 'dwh'),
+            (date_dim_df, 'dim_date', 'dwh'),
+            (transaction_types, 'dim_transaction_type', 'dwh'),
+        ])
+        # dim_customer - SCD Type 2
+        self.merge_customer_dimension(customers_df)
+        for dimension in self.DIMENSION_KEYS:
+            self._invalidate_keys(dimension)
 
         print("✓ Dimension таблицы загружены")
 
-    def load_fact_table(self, transactions_df):
-        """Загрузка фактовой таблицы"""
-        print("\nЗагрузка fact таблицы...")
+    @classmethod
+    def customer_row_hash(cls, customers_df):
+        """
+        Хэш отслеживаемых атрибутов клиента (вектор int64)
 
-        # Получаем ключи из измерений
-        customers_keys = self.db.read_query(
-            "SELECT customer_key, customer_id FROM dwh.dim_customer WHERE is_current = TRUE"
+        Значения приводятся к object с None вместо пропусков, поэтому хэш
+        не зависит от dtype колонок (категории, Arrow-строки, object).
+        """
+        tracked = customers_df[list(cls.SCD2_TRACKED_COLUMNS)].astype(object)
+        tracked = tracked.where(tracked.notna(), None)
+        tracked['registration_date'] = tracked['registration_date'].map(
+            lambda value: None if value is None else pd.Timestamp(value).date()
         )
-        accounts_keys = self.db.read_query(
-            "SELECT account_key, account_id FROM dwh.dim_account"
+        return pd.util.hash_pandas_object(tracked, index=False).to_numpy().view('int64')
+
+    @instrument()
+    def merge_customer_dimension(self, customers_df):
+        """
+        SCD Type 2 слияние dim_customer одним SQL-запросом
+
+        Входные строки с хэшами копируются во временную таблицу; затем
+        текущие версии с другим хэшем закрываются, а для них и для новых
+        клиентов вставляются новые версии. Неизмененные клиенты не
+        затрагиваются.
+
+        Args:
+            customers_df: очищенные данные клиентов (DataTransformer.clean_customers)
+        """
+        if customers_df.empty:
+            return
+
+        columns = ['customer_id', *self.SCD2_TRACKED_COLUMNS, 'age']
+        incoming = customers_df[columns].drop_duplicates(subset=['customer_id'], keep='last')
+        incoming = incoming.assign(row_hash=self.customer_row_hash(incoming))
+        column_list = ', '.join(incoming.columns)
+
+        with self.db.pooled_connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"""
+                    CREATE TEMP TABLE tmp_dim_customer_merge ON COMMIT DROP AS
+                    SELECT {column_list} FROM dwh.dim_customer WITH NO DATA
+                    """)
+                    self.db.copy_dataframe(cursor, incoming, 'tmp_dim_customer_merge',
+                                           self.db.copy_chunk_size)
+                    # Основной запрос видит снимок до UPDATE, поэтому измененные
+                    # клиенты берутся из expired, а новые - по NOT EXISTS
+                    cursor.execute(f"""
+                    WITH expired AS (
+                        UPDATE dwh.dim_customer d
+                        SET expiration_date = %(today)s, is_current = FALSE
+                        FROM tmp_dim_customer_merge s
+                        WHERE d.customer_id = s.customer_id
+                            AND d.is_current
+                            AND d.row_hash IS DISTINCT FROM s.row_hash
+                        RETURNING d.customer_id
+                    ),
+                    inserted AS (
+                        INSERT INTO dwh.dim_customer ({column_list},
+                            effective_date, expiration_date, is_current)
+                        SELECT {', '.join('s.' + column for column in incoming.columns)},
+                            %(today)s, %(open_end)s, TRUE
+                        FROM tmp_dim_customer_merge s
+                        WHERE s.customer_id IN (SELECT customer_id FROM expired)
+                            OR NOT EXISTS (
+                                SELECT 1 FROM dwh.dim_customer d
+                                WHERE d.customer_id = s.customer_id AND d.is_current
+                            )
+                        RETURNING customer_id
+                    )
+                    SELECT (SELECT COUNT(DISTINCT customer_id) FROM expired),
+                           (SELECT COUNT(*) FROM inserted)
+                    """, {'today': datetime.now().date(), 'open_end': self.SCD2_OPEN_END})
+                    expired_count, inserted_count = cursor.fetchone()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        self._invalidate_keys('dim_customer')
+        print(f"✓ dwh.dim_customer (SCD2): {inserted_count - expired_count} новых клиентов, "
+              f"{expired_count} измененных, {len(incoming) - inserted_count} без изменений")
+
+    def get_existing_date_keys(self, start_date, end_date):
+        """
+        date_key из dwh.dim_date в диапазоне дат
+
+        Returns:
+            numpy-массив уже загруженных date_key
+        """
+        df = self.db.read_query(
+            "SELECT date_key FROM dwh.dim_date "
+            "WHERE date_key BETWEEN %(start_key)s AND %(end_key)s",
+            {'start_key': to_date_key(start_date), 'end_key': to_date_key(end_date)}
         )
-        transaction_type_keys = self.db.read_query(
-            "SELECT transaction_type_key, transaction_type FROM dwh.dim_transaction_type"
+        return df['date_key'].to_numpy()
+
+    @instrument()
+    def load_fact_table(self, transactions_df, bulk=None, row_estimate=None, refresh=True):
+        """
+        Загрузка фактовой таблицы (DataFrame или итератор DataFrame-порций)
+
+        Повторная загрузка тех же транзакций не дублирует строки: уже
+        загруженные (transaction_id, date_key) пропускаются.
+
+        Args:
+            transactions_df: обогащенные транзакции
+            bulk: True/False - принудительно включить/выключить режим
+                массовой загрузки; None - по порогу bulk_load_threshold
+            row_estimate: ожидаемое число строк итератора для сравнения
+                с порогом (размер итератора заранее неизвестен; без оценки
+                режим для итератора не включается)
+            refresh: пересчитать агрегаты по загруженным датам (False -
+                вызывающий код делает это сам через refresh_aggregates)
+
+        Returns:
+            list: отсортированные date_key загруженных строк
+        """
+        print("\nЗагрузка fact таблицы...")
+
+        if bulk is None:
+            rows = len(transactions_df) if isinstance(transactions_df, pd.DataFrame) else row_estimate
+            bulk = (self.bulk_load_threshold is not None and rows is not None
+                    and rows >= self.bulk_load_threshold)
+
+        chunks = [transactions_df] if isinstance(transactions_df, pd.DataFrame) else transactions_df
+        loaded_date_keys = set()
+        with self._bulk_load_mode() if bulk else nullcontext():
+            if self.fact_load_workers > 1:
+                self._load_fact_parallel(chunks, loaded_date_keys)
+            else:
+                for chunk in chunks:
+                    if chunk.empty:
+                        continue
+                    fact_data = self._build_fact_data(chunk)
+                    self.ensure_fact_partitions(fact_data['date_key'])
+                    self.db.load_dataframe(fact_data, 'fact_transactions', schema='dwh')
+                    loaded_date_keys.update(fact_data['date_key'].unique().tolist())
+
+        print("✓ Fact таблица загружена")
+        date_keys = sorted(int(key) for key in loaded_date_keys)
+        if refresh:
+            self.refresh_aggregates(date_keys)
+        return date_keys
+
+    @staticmethod
+    def _elt_id_filter(id_range):
+        """Отбор транзакций по диапазону transaction_id (low, high] для ELT-запросов"""
+        if id_range is None:
+            return "", {}
+        low, high = id_range
+        return ("AND t.transaction_id > %(low_id)s AND t.transaction_id <= %(high_id)s",
+                {'low_id': low, 'high_id': high})
+
+    def _elt_fact_select(self, id_range=None):
+        """ELT-запрос строк fact таблицы и его параметры"""
+        id_filter, params = self._elt_id_filter(id_range)
+        query = self.ELT_FACT_SELECT.format(
+            date_key=self.ELT_DATE_KEY,
+            branch_count=self.DEMO_BRANCH_COUNT,
+            transaction_filter=self.ELT_TRANSACTION_FILTER.format(id_filter=id_filter)
         )
+        return query, params
+
+    @instrument()
+    def load_fact_table_elt(self, id_range=None, bulk=None, refresh=True):
+        """
+        Загрузка fact таблицы из staging одним INSERT ... SELECT (ELT)
+
+        Фильтры, курсы валют и суррогатные ключи вычисляются в PostgreSQL,
+        транзакции в Python не передаются. Измерения должны быть загружены.
+        Уже загруженные (transaction_id, date_key) пропускаются.
+
+        Args:
+            id_range: диапазон transaction_id (low, high] для
+                инкрементальной загрузки (optional)
+            bulk: True/False - принудительно включить/выключить режим
+                массовой загрузки; None - по порогу bulk_load_threshold
+            refresh: пересчитать агрегаты по затронутым датам
+
+        Returns:
+            list: отсортированные затронутые date_key
+        """
+        print("\nЗагрузка fact таблицы (ELT в PostgreSQL)...")
+        id_filter, params = self._elt_id_filter(id_range)
+
+        # Затрагиваемые даты: для партиций, порога bulk-режима и агрегатов
+        date_counts = self.db.read_query(f"""
+        SELECT {self.ELT_DATE_KEY} AS date_key, COUNT(*) AS row_count
+        FROM staging.transactions t
+        WHERE {self.ELT_TRANSACTION_FILTER.format(id_filter=id_filter)}
+        GROUP BY 1
+        """, params)
+        if date_counts.empty:
+            print("⚠ Нет новых транзакций в staging")
+            return []
+
+        if bulk is None:
+            bulk = (self.bulk_load_threshold is not None
+                    and date_counts['row_count'].sum() >= self.bulk_load_threshold)
+
+        self.ensure_fact_partitions(date_counts['date_key'])
+        select, params = self._elt_fact_select(id_range)
+        columns = ', '.join(self.ELT_FACT_COLUMNS)
+
+        start = time.perf_counter()
+        with self._bulk_load_mode() if bulk else nullcontext():
+            with self.db.pooled_connection() as conn:
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(f"INSERT INTO dwh.fact_transactions ({columns}) {select} "
+                                       f"ON CONFLICT DO NOTHING", params)
+                        inserted = cursor.rowcount
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+        elapsed = time.perf_counter() - start
+        print(f"✓ Fact таблица загружена: {inserted} записей за {elapsed:.1f} сек")
+        date_keys = sorted(int(key) for key in date_counts['date_key'])
+        if refresh:
+            self.refresh_aggregates(date_keys)
+        return date_keys
+
+    @instrument()
+    def check_elt_parity(self, transactions_df, id_range=None):
+        """
+        Сравнение строк fact таблицы pandas-пути и ELT-запроса
+
+        Строки pandas-пути (_build_fact_data) копируются во временную таблицу
+        с типами fact таблицы и сравниваются с результатом ELT-запроса через
+        EXCEPT ALL в обе стороны.
+        Запись в fact таблицу не выполняется.
+
+        Args:
+            transactions_df: обогащенные транзакции (DataTransformer)
+            id_range: диапазон transaction_id, тот же, что при извлечении
+
+        Returns:
+            tuple: (строк только в pandas, строк только в ELT)
+        """
+        columns = ', '.join(self.ELT_FACT_COLUMNS)
+        fact_data = self._build_fact_data(transactions_df)[list(self.ELT_FACT_COLUMNS)]
+        select, params = self._elt_fact_select(id_range)
+
+        with self.db.pooled_connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"""
+                    CREATE TEMP TABLE tmp_fact_parity ON COMMIT DROP AS
+                    SELECT {columns} FROM dwh.fact_transactions WITH NO DATA
+                    """)
+                    self.db.copy_dataframe(cursor, fact_data, 'tmp_fact_parity',
+                                           self.db.copy_chunk_size)
+                    cursor.execute(f"""
+                    CREATE TEMP TABLE tmp_fact_parity_elt ON COMMIT DROP AS
+                    SELECT {columns} FROM dwh.fact_transactions WITH NO DATA;
+                    INSERT INTO tmp_fact_parity_elt ({columns})
+                    SELECT {columns} FROM ({select}) elt;
+                    SELECT
+                        (SELECT COUNT(*) FROM (SELECT * FROM tmp_fact_parity
+                            EXCEPT ALL SELECT * FROM tmp_fact_parity_elt) p),
+                        (SELECT COUNT(*) FROM (SELECT * FROM tmp_fact_parity_elt
+                            EXCEPT ALL SELECT * FROM tmp_fact_parity) e)
+                    """, params)
+                    only_pandas, only_elt = cursor.fetchone()
+            finally:
+                # Временные таблицы не нужны - откатываем транзакцию
+                conn.rollback()
+
+        if only_pandas or only_elt:
+            print(f"✗ Расхождение pandas и ELT: {only_pandas} строк только в pandas, "
+                  f"{only_elt} строк только в ELT")
+        else:
+            print(f"✓ pandas и ELT дают одинаковые строки fact таблицы ({len(fact_data)})")
+        return only_pandas, only_elt
+
+    @instrument()
+    def refresh_aggregates(self, date_keys):
+        """
+        Инкрементальное обновление агрегатов только для затронутых дат
+
+        Args:
+            date_keys: список date_key, по которым менялась fact таблица
+        """
+        if not date_keys:
+            return
+        self._refresh_aggregates("date_key = ANY(%(date_keys)s)",
+                                 {'date_keys': [int(key) for key in date_keys]})
+        print(f"✓ Агрегаты обновлены для {len(date_keys)} дат")
 
-        # Обогащаем транзакции ключами
-        transactions_enriched = transactions_df.merge(
-            customers_keys, left_on='customer_id', right_on='customer_id', how='left'
-        ).merge(
-            accounts_keys, left_on='account_id', right_on='account_id', how='left'
-        ).merge(
-            transaction_type_keys, left_on='transaction_type', right_on='transaction_type', how='left'
+    def _refresh_aggregates(self, where, params):
+        """Пересчет агрегатов по условию на date_key одной транзакцией"""
+        statements = []
+        for table, select in self.AGGREGATES.items():
+            statements.append(f"DELETE FROM dwh.{table} WHERE {where};")
+            statements.append(f"INSERT INTO dwh.{table} {select.format(where=where)};")
+        self.db.execute_query('\n'.join(statements), params)
+
+    @contextmanager
+    def _bulk_load_mode(self):
+        """
+        Массовая загрузка fact таблицы без вторичных индексов и внешних ключей
+
+        На время загрузки вторичные индексы и FK удаляются, чтобы каждая
+        строка не платила за обновление индексов и проверки ссылок. Их
+        определения в той же транзакции сохраняются в dwh.etl_dropped_objects,
+        поэтому после сбоя процесса они восстанавливаются при следующем
+        входе в режим (или вызовом restore_dropped_objects). После загрузки
+        (в том числе неудачной) каждый объект восстанавливается независимо
+        от остальных и выполняется ANALYZE.
+        """
+        # Объекты, не восстановленные прошлым (прерванным) запуском
+        failed = self.restore_dropped_objects()
+        if failed:
+            raise RuntimeError(f"Не восстановлены объекты прошлой массовой загрузки: "
+                               f"{', '.join(failed)}")
+
+        indexes = self.db.read_query("""
+        SELECT i.relname AS index_name, pg_get_indexdef(i.oid) AS definition
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = 'dwh.fact_transactions'::regclass
+            AND NOT x.indisprimary
+            AND NOT x.indisunique
+        """)
+        foreign_keys = self.db.read_query("""
+        SELECT conname AS constraint_name, pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint
+        WHERE conrelid = 'dwh.fact_transactions'::regclass
+            AND contype = 'f'
+        """)
+
+        print(f"Режим массовой загрузки: удаление {len(indexes)} индексов "
+              f"и {len(foreign_keys)} внешних ключей")
+        drop_sql = [f"ALTER TABLE dwh.fact_transactions DROP CONSTRAINT {row.constraint_name};"
+                    for row in foreign_keys.itertuples(index=False)]
+        drop_sql += [f"DROP INDEX dwh.{row.index_name};"
+                     for row in indexes.itertuples(index=False)]
+        if drop_sql:
+            self.db.execute_query("""
+            INSERT INTO dwh.etl_dropped_objects (table_name, object_name, object_type, definition)
+            SELECT 'dwh.fact_transactions', object_name, object_type, definition
+            FROM unnest(%(names)s::text[], %(types)s::text[], %(definitions)s::text[])
+                AS dropped (object_name, object_type, definition);
+            """ + '\n'.join(drop_sql), {
+                'names': foreign_keys['constraint_name'].tolist() + indexes['index_name'].tolist(),
+                'types': ['foreign_key'] * len(foreign_keys) + ['index'] * len(indexes),
+                'definitions': (foreign_keys['definition'].tolist()
+                                + indexes['definition'].tolist()),
+            })
+
+        try:
+            yield
+        finally:
+            failed = self.restore_dropped_objects()
+        if failed:
+            raise RuntimeError(f"Не восстановлены после массовой загрузки: {', '.join(failed)} "
+                               f"(определения сохранены в dwh.etl_dropped_objects)")
+
+    def restore_dropped_objects(self):
+        """
+        Восстановление индексов и FK fact таблицы из dwh.etl_dropped_objects
+
+        Индексы строятся параллельно, затем создаются FK; каждый объект -
+        в своей транзакции вместе с удалением его строки из журнала, поэтому
+        ошибка одного не мешает остальным, а журнал всегда соответствует
+        состоянию таблицы. ANALYZE выполняется в любом случае.
+
+        Returns:
+            list: имена объектов, которые восстановить не удалось
+        """
+        dropped = self.db.read_query("""
+        SELECT object_name, object_type, definition
+        FROM dwh.etl_dropped_objects
+        WHERE table_name = 'dwh.fact_transactions'
+        ORDER BY dropped_at, object_name
+        """)
+        if dropped.empty:
+            return []
+
+        indexes = dropped[dropped['object_type'] == 'index']
+        foreign_keys = dropped[dropped['object_type'] == 'foreign_key']
+        failed = self._rebuild_indexes(list(zip(indexes['object_name'], indexes['definition'])))
+        for row in foreign_keys.itertuples(index=False):
+            try:
+                self._restore_object(row.object_name,
+                                     f"ALTER TABLE dwh.fact_transactions "
+                                     f"ADD CONSTRAINT {row.object_name} {row.definition}")
+            except Exception as e:
+                print(f"✗ Внешний ключ {row.object_name} не восстановлен: {e}")
+                failed.append(row.object_name)
+
+        try:
+            self.db.execute_query("ANALYZE dwh.fact_transactions")
+        except Exception as e:
+            print(f"⚠ ANALYZE dwh.fact_transactions не выполнен: {e}")
+
+        restored = len(dropped) - len(failed)
+        print(f"{'⚠' if failed else '✓'} Восстановлено индексов и внешних ключей: "
+              f"{restored} из {len(dropped)}")
+        return failed
+
+    def _restore_object(self, object_name, statement, setup=None):
+        """Создание объекта и удаление его строки из журнала одной транзакцией"""
+        with self.db.pooled_connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    if setup:
+                        cursor.execute(setup)
+                    cursor.execute(statement)
+                    cursor.execute(
+                        "DELETE FROM dwh.etl_dropped_objects "
+                        "WHERE table_name = 'dwh.fact_transactions' AND object_name = %s",
+                        (object_name,)
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _rebuild_indexes(self, indexes):
+        """
+        Параллельное построение индексов с учетом бюджета maintenance_work_mem
+
+        Потоков не больше размера пула соединений: ThreadedConnectionPool
+        не ждет свободного соединения, а бросает PoolError. Бюджет памяти
+        делится между одновременно строящимися индексами.
+
+        Args:
+            indexes: список (имя индекса, определение из pg_get_indexdef)
+
+        Returns:
+            list: имена индексов, которые построить не удалось
+        """
+        if not indexes:
+            return []
+        workers = min(len(indexes), self.db.pool_size)
+        work_mem_mb = max(64, self.maintenance_work_mem_mb // workers)
+
+        def build(index):
+            name, definition = index
+            # Для секционированной таблицы pg_get_indexdef возвращает ON ONLY -
+            # такой индекс не строится на партициях
+            self._restore_object(name, definition.replace(' ON ONLY ', ' ON '),
+                                 setup=f"SET LOCAL maintenance_work_mem = '{work_mem_mb}MB'")
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(build, index): index[0] for index in indexes}
+            for future, name in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"✗ Индекс {name} не перестроен: {e}")
+                    failed.append(name)
+        print(f"{'⚠' if failed else '✓'} Перестроено индексов: "
+              f"{len(indexes) - len(failed)} из {len(indexes)} "
+              f"({workers} потоков, maintenance_work_mem = {work_mem_mb}MB на индекс)")
+        return failed
+
+    @staticmethod
+    def _partition_bounds(month):
+        """
+        Имя и границы месячной партиции fact таблицы
+
+        Args:
+            month: месяц в формате YYYYMM
+
+        Returns:
+            tuple: (имя партиции, нижняя граница date_key, верхняя граница)
+        """
+        year, month_num = divmod(int(month), 100)
+        next_year, next_month = (year + 1, 1) if month_num == 12 else (year, month_num + 1)
+        return (f"fact_transactions_y{year}m{month_num:02d}",
+                year * 10000 + month_num * 100 + 1,
+                next_year * 10000 + next_month * 100 + 1)
+
+    def ensure_fact_partitions(self, date_keys):
+        """
+        Создание недостающих месячных партиций для диапазона дат загрузки
+
+        Args:
+            date_keys: значения date_key загружаемых строк
+        """
+        for month in np.unique(np.asarray(date_keys) // 100):
+            if month in self._fact_partitions:
+                continue
+            name, start, end = self._partition_bounds(month)
+            self.db.execute_query(f"""
+            CREATE TABLE IF NOT EXISTS dwh.{name}
+            PARTITION OF dwh.fact_transactions
+            FOR VALUES FROM ({start}) TO ({end})
+            """)
+            self._fact_partitions.add(month)
+
+    @instrument()
+    def replace_fact_month(self, transactions_df, month):
+        """
+        Перезагрузка месяца fact таблицы заменой партиции целиком
+
+        Данные месяца пишутся в отдельную таблицу, затем в одной транзакции
+        старая партиция отсоединяется и удаляется, а новая подключается на
+        ее место - без построчного DELETE.
+
+        Args:
+            transactions_df: обогащенные транзакции (лишние месяцы отбрасываются)
+            month: месяц в формате YYYYMM
+        """
+        name, start, end = self._partition_bounds(month)
+        new_name = f"{name}_new"
+        print(f"\nПерезагрузка партиции dwh.{name}...")
+
+        fact_data = self._build_fact_data(transactions_df)
+        fact_data = fact_data[(fact_data['date_key'] >= start) & (fact_data['date_key'] < end)]
+
+        # CHECK с границами партиции позволяет ATTACH без полного сканирования
+        self.db.execute_query(f"""
+        DROP TABLE IF EXISTS dwh.{new_name};
+        CREATE TABLE dwh.{new_name} (LIKE dwh.fact_transactions INCLUDING DEFAULTS);
+        ALTER TABLE dwh.{new_name} ADD CONSTRAINT {new_name}_bounds
+            CHECK (date_key >= {start} AND date_key < {end});
+        """)
+        self.db.load_dataframe(fact_data, new_name, schema='dwh')
+
+        exists = self.db.read_query(
+            "SELECT to_regclass(%(name)s) IS NOT NULL AS exists",
+            {'name': f"dwh.{name}"}
+        )['exists'].iloc[0]
+        detach_old = f"""
+        ALTER TABLE dwh.fact_transactions DETACH PARTITION dwh.{name};
+        DROP TABLE dwh.{name};
+        """ if exists else ""
+
+        self.db.execute_query(f"""
+        {detach_old}
+        ALTER TABLE dwh.{new_name} RENAME TO {name};
+        ALTER TABLE dwh.fact_transactions ATTACH PARTITION dwh.{name}
+            FOR VALUES FROM ({start}) TO ({end});
+        ALTER TABLE dwh.{name} DROP CONSTRAINT {new_name}_bounds;
+        """)
+        self._fact_partitions.add(int(month))
+        self._refresh_aggregates("date_key >= %(start)s AND date_key < %(end)s",
+                                 {'start': start, 'end': end})
+        print(f"✓ Партиция dwh.{name} заменена ({len(fact_data)} записей)")
+
+    def _load_fact_parallel(self, chunks, loaded_date_keys):
+        """
+        Параллельная загрузка fact таблицы по месячным партициям
+
+        Месяц, где новых строк мало относительно партиции (меньше
+        swap_min_ratio ее строк), дописывается в партицию обычной вставкой
+        с ON CONFLICT DO NOTHING - без работы, пропорциональной партиции.
+        Для остальных каждый воркер через свое соединение собирает
+        отдельную таблицу месяца: текущее содержимое партиции плюс новые
+        строки командой COPY, затем строит на ней первичный ключ, индексы
+        и внешние ключи fact таблицы. Индексы и проверки ссылок оплачиваются
+        параллельно и один раз на строку. В конце одна транзакция подменяет
+        партиции собранными таблицами (DETACH / ATTACH, как
+        replace_fact_month): при ошибке любого воркера они не меняются.
+
+        С первого подменяемого месяца до подмены fact таблица (ONLY) и
+        подменяемые партиции заблокированы отдельным соединением в режиме
+        SHARE ROW EXCLUSIVE: чтение разрешено, а вставки других сеансов
+        ждут подмены и не теряются. Подмена выполняется в транзакции этой
+        блокировки. Новые партиции создаются подменой, а не заранее.
+
+        Параллелизм - по месяцам: строки одного месяца пишет один воркер.
+        Способ загрузки месяца выбирается по первой порции с его строками.
+
+        Args:
+            chunks: итерируемый набор DataFrame-порций транзакций
+            loaded_date_keys: множество, пополняемое загруженными date_key
+        """
+        suffix = uuid.uuid4().hex[:8]
+        # Подменяемый месяц -> (партиция, таблица сборки, границы date_key)
+        months = {}
+        # Месяцы, которые дописываются в партицию
+        appended = set()
+        total = 0
+
+        with self.db.pooled_connection() as lock_conn:
+            try:
+                with ThreadPoolExecutor(max_workers=self.fact_load_workers) as executor:
+                    for chunk in chunks:
+                        if chunk.empty:
+                            continue
+                        fact_data = self._build_fact_data(chunk)
+                        tasks = []
+                        for month, rows in fact_data.groupby(
+                                fact_data['date_key'].to_numpy() // 100):
+                            month = int(month)
+                            name, start, end = self._partition_bounds(month)
+                            if month in appended:
+                                tasks.append((self._append_month, name, rows))
+                                continue
+                            first_touch = month not in months
+                            if first_touch:
+                                with lock_conn.cursor() as cursor:
+                                    # Размер партиции читается в транзакции блокировок:
+                                    # основное соединение не должно держать партицию
+                                    partition_rows = self._partition_rows(cursor, name)
+                                    if (partition_rows is not None
+                                            and len(rows) < self.swap_min_ratio * partition_rows):
+                                        appended.add(month)
+                                        tasks.append((self._append_month, name, rows))
+                                        continue
+                                    self._lock_partition(cursor, name, partition_rows is not None,
+                                                         lock_parent=not months)
+                                months[month] = (name, f"{name}_load_{suffix}", start, end)
+                            tasks.append((self._copy_month, months[month], rows, first_touch))
+                        # list() пробрасывает первое исключение воркера
+                        list(executor.map(lambda task: task[0](*task[1:]), tasks))
+                        total += len(fact_data)
+                        loaded_date_keys.update(fact_data['date_key'].unique().tolist())
+
+                    if not months and not appended:
+                        print("⚠ Нет строк для загрузки в dwh.fact_transactions")
+                        return
+
+                    constraints, indexes = self._fact_table_ddl()
+                    list(executor.map(
+                        lambda month: self._index_month(months[month][1], constraints, indexes),
+                        months
+                    ))
+
+                # Барьер: все месяцы собраны - подменяем партиции одной транзакцией.
+                # Основное соединение только читало (read_query не фиксирует
+                # транзакцию) - завершаем его транзакцию, иначе ее блокировки
+                # ACCESS SHARE на партициях не дадут выполнить DETACH
+                self.db.conn.rollback()
+                swap_sql = []
+                for name, load_name, start, end in months.values():
+                    with lock_conn.cursor() as cursor:
+                        exists = self._partition_rows(cursor, name) is not None
+                    if exists:
+                        swap_sql.append(f"ALTER TABLE dwh.fact_transactions "
+                                        f"DETACH PARTITION dwh.{name};")
+                        swap_sql.append(f"DROP TABLE dwh.{name};")
+                    swap_sql.append(f"ALTER TABLE dwh.{load_name} RENAME TO {name};")
+                    swap_sql.append(f"ALTER TABLE dwh.fact_transactions ATTACH PARTITION dwh.{name} "
+                                    f"FOR VALUES FROM ({start}) TO ({end});")
+                    swap_sql.append(f"ALTER TABLE dwh.{name} DROP CONSTRAINT {load_name}_bounds;")
+                if swap_sql:
+                    with lock_conn.cursor() as cursor:
+                        cursor.execute('\n'.join(swap_sql))
+                lock_conn.commit()
+                self._fact_partitions.update(months)
+                self._fact_partitions.update(appended)
+                months_swapped = len(months)
+                months.clear()
+                print(f"✓ Загружено {total} записей в dwh.fact_transactions "
+                      f"({self.fact_load_workers} потоков; месяцев подменено: {months_swapped}, "
+                      f"дописано: {len(appended)})")
+            except Exception:
+                # Откат снимает блокировки партиций
+                lock_conn.rollback()
+                raise
+            finally:
+                # Таблицы сборки остаются только при ошибке - удаляем их
+                if months:
+                    self.db.execute_query('\n'.join(
+                        f"DROP TABLE IF EXISTS dwh.{load_name};"
+                        for _, load_name, _, _ in months.values()
+                    ))
+
+    @staticmethod
+    def _partition_rows(cursor, name):
+        """
+        Число строк партиции: оценка планировщика, без нее - точный подсчет
+
+        Returns:
+            число строк или None, если партиции нет
+        """
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)",
+                       (f"dwh.{name}",))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        if row[0] >= 0:
+            return row[0]
+        # Партиция еще не анализировалась
+        cursor.execute(f"SELECT COUNT(*) FROM dwh.{name}")
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def _lock_partition(cursor, name, exists, lock_parent):
+        """
+        Блокировка подменяемой партиции до подмены (SHARE ROW EXCLUSIVE)
+
+        Первой блокируется сама fact таблица (ONLY - без партиций): вставка
+        через нее иначе держала бы ее ROW EXCLUSIVE в ожидании партиции, а
+        DETACH при подмене ждал бы эту вставку - взаимная блокировка.
+        Отсутствующую партицию блокировать не нужно, ее строки в нее не
+        попадут, пока fact таблица заблокирована.
+        """
+        if lock_parent:
+            cursor.execute("LOCK TABLE ONLY dwh.fact_transactions IN SHARE ROW EXCLUSIVE MODE")
+        if exists:
+            cursor.execute(f"LOCK TABLE dwh.{name} IN SHARE ROW EXCLUSIVE MODE")
+
+    def _append_month(self, name, rows):
+        """Дозапись строк месяца в партицию (ON CONFLICT DO NOTHING) через соединение из пула"""
+        with self.db.pooled_connection() as conn:
+            self.db.load_dataframe(rows, name, schema='dwh', method='copy', conn=conn,
+                                   batch_size=0)
+
+    def _copy_month(self, month_tables, rows, first_touch):
+        """
+        Запись строк месяца в его таблицу сборки через соединение из пула
+
+        При первом обращении таблица создается с CHECK по границам месяца
+        (ATTACH без полного сканирования) и заполняется текущими строками
+        партиции.
+        """
+        name, load_name, start, end = month_tables
+        with self.db.pooled_connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    if first_touch:
+                        cursor.execute(f"""
+                        CREATE TABLE dwh.{load_name} (LIKE dwh.fact_transactions INCLUDING DEFAULTS);
+                        ALTER TABLE dwh.{load_name} ADD CONSTRAINT {load_name}_bounds
+                            CHECK (date_key >= {start} AND date_key < {end});
+                        """)
+                        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (f"dwh.{name}",))
+                        if cursor.fetchone()[0]:
+                            cursor.execute(f"INSERT INTO dwh.{load_name} SELECT * FROM dwh.{name}")
+                    self.db.copy_dataframe(cursor, rows, f"dwh.{load_name}",
+                                           self.db.copy_chunk_size)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _fact_table_ddl(self):
+        """
+        Ограничения и самостоятельные индексы fact таблицы
+
+        Returns:
+            tuple: (определения ограничений PK/UNIQUE/FK, определения
+                индексов без ограничения за ними)
+        """
+        constraints = self.db.read_query("""
+        SELECT pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint
+        WHERE conrelid = 'dwh.fact_transactions'::regclass
+            AND contype IN ('p', 'u', 'f')
+        ORDER BY contype DESC
+        """)['definition'].tolist()
+        indexes = self.db.read_query("""
+        SELECT pg_get_indexdef(x.indexrelid) AS definition
+        FROM pg_index x
+        WHERE x.indrelid = 'dwh.fact_transactions'::regclass
+            AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+        """)['definition'].tolist()
+        return constraints, indexes
+
+    def _index_month(self, load_name, constraints, indexes):
+        """
+        Ключ, индексы и внешние ключи fact таблицы на таблице сборки месяца
+
+        ATTACH PARTITION подключает совпадающие индексы и ограничения
+        вместо того, чтобы строить их заново под блокировкой fact таблицы.
+        Повторно загруженные транзакции удаляются до построения уникального
+        индекса: остается строка, записанная первой (с меньшим
+        transaction_key), как при ON CONFLICT DO NOTHING.
+        """
+        statements = [f"""
+        DELETE FROM dwh.{load_name} WHERE ctid IN (
+            SELECT ctid FROM (
+                SELECT ctid, ROW_NUMBER() OVER (
+                    PARTITION BY transaction_id, date_key ORDER BY transaction_key
+                ) AS copy_no
+                FROM dwh.{load_name}
+            ) copies
+            WHERE copy_no > 1
+        );"""]
+        statements += [f"ALTER TABLE dwh.{load_name} ADD {definition};"
+                       for definition in constraints]
+        # Имя индекса опускаем - PostgreSQL сгенерирует его для таблицы сборки
+        statements += [re.sub(r'^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?dwh\.fact_transactions ',
+                              rf'CREATE \1INDEX ON dwh.{load_name} ', definition) + ';'
+                       for definition in indexes]
+        with self.db.pooled_connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute('\n'.join(statements))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _build_fact_data(self, transactions_df):
+        """Сборка строк fact таблицы из обогащенных транзакций"""
+        customer_keys = self.get_dimension_keys('dim_customer')
+        account_keys = self.get_dimension_keys('dim_account')
+        transaction_type_keys = self.get_dimension_keys('dim_transaction_type')
+
+        # Позиции ключей в кэше за один проход по каждой колонке (без merge)
+        customer_pos = customer_keys.index.get_indexer(transactions_df['customer_id'])
+        account_pos = account_keys.index.get_indexer(transactions_df['account_id'])
+        transaction_type_pos = transaction_type_keys.index.get_indexer(
+            transactions_df['transaction_type']
         )
 
-        # Создаем date_key
-        transactions_enriched['date_key'] = pd.to_datetime(
-            transactions_enriched['transaction_date']
-        ).dt.strftime('%Y%m%d').astype(int)
-
-        # Выбираем нужные колонки для fact таблицы
-        fact_data = transactions_enriched[[
-            'transaction_id', 'date_key', 'customer_key', 'account_key',
-            'transaction_type_key', 'amount', 'currency', 'amount_rub',
-            'exchange_rate', 'transaction_status', 'channel', 'merchant_name'
-        ]].copy()
+        # Отбрасываем строки с пропущенными ключами (позиция -1)
+        valid = (customer_pos >= 0) & (account_pos >= 0) & (transaction_type_pos >= 0)
 
-        # Переименовываем колонки
-        fact_data = fact_data.rename(columns={
-            'amount': 'amount_original',
-            'currency': 'original_currency'
-        })
+        # Создаем date_key
+        date_key = to_date_key(transactions_df['transaction_date'])
 
-        # Добавляем branch_key (случайно для демо)
-        fact_data['branch_key'] = np.random.randint(1, 51, size=len(fact_data))
+        def column(name):
+            return transactions_df[name].to_numpy()[valid]
 
-        # Удаляем строки с пропущенными ключами
-        fact_data = fact_data.dropna(subset=['customer_key', 'account_key', 'transaction_type_key'])
+        fact_data = pd.DataFrame({
+            'transaction_id': column('transaction_id'),
+            'date_key': date_key[valid],
+            'customer_key': customer_keys.to_numpy()[customer_pos[valid]],
+            'account_key': account_keys.to_numpy()[account_pos[valid]],
+            'transaction_type_key': transaction_type_keys.to_numpy()[transaction_type_pos[valid]],
+            'amount_original': column('amount'),
+            'original_currency': column('currency'),
+            'amount_rub': column('amount_rub'),
+            'exchange_rate': column('exchange_rate'),
+            'transaction_status': column('transaction_status'),
+            'channel': column('channel'),
+            'merchant_name': column('merchant_name'),
+        })
 
-        self.db.load_dataframe(fact_data, 'fact_transactions', schema='dwh')
+        # Добавляем branch_key (по счету для демо)
+        fact_data['branch_key'] = 1 + column('account_id').astype('int64') % self.DEMO_BRANCH_COUNT
 
-        print("✓ Fact таблица загружена")
+        return fact_data
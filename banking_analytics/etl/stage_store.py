@@ -0,0 +1,147 @@
+# etl/stage_store.py
+"""
+Локальное колоночное хранилище staging-данных (Parquet)
+"""
+import os
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+
+class ParquetStageStore:
+    """
+    Staging-слой в файлах Parquet под Config.DATA_DIR
+
+    Транзакции секционируются по дню (hive-каталоги transaction_day=YYYY-MM-DD),
+    поэтому фильтр по дате отбрасывает лишние каталоги целиком, а фильтры
+    по остальным колонкам проверяются по статистике row group-ов.
+    Запись добавляет только строки с новыми первичными ключами, как загрузка
+    в PostgreSQL staging с ON CONFLICT DO NOTHING: хранимая строка не
+    заменяется, данные прошлых запусков сохраняются (нужны инкрементальному
+    режиму).
+    """
+
+    # Таблица -> (исходная колонка даты, колонка-секция)
+    PARTITION_COLUMNS = {
+        'transactions': ('transaction_date', 'transaction_day'),
+    }
+    # Первичные ключи staging-таблиц (как в schema_creation.sql)
+    PRIMARY_KEYS = {
+        'customers': 'customer_id',
+        'accounts': 'account_id',
+        'transactions': 'transaction_id',
+        'branches': 'branch_id',
+        'exchange_rates': 'date',
+    }
+
+    def __init__(self, base_dir):
+        """
+        Args:
+            base_dir: корневой каталог хранилища
+        """
+        self.base_dir = Path(base_dir)
+
+    @staticmethod
+    def _pyarrow():
+        """Ленивый импорт pyarrow (нужен только для этого хранилища)"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(
+                "Для Parquet staging-хранилища требуется пакет pyarrow: pip install pyarrow"
+            ) from e
+        return pa, pq
+
+    def table_path(self, table_name):
+        return self.base_dir / table_name
+
+    def exists(self, table_name):
+        return self.table_path(table_name).exists()
+
+    def write(self, df, table_name):
+        """
+        Запись DataFrame в хранилище (вставка новых ключей)
+
+        Строки df с ключом, который уже хранится (или повторяется в df),
+        отбрасываются - побеждает первая запись, как при ON CONFLICT DO
+        NOTHING. Несекционированная таблица переписывается целиком через
+        временный файл; у секционированной переписываются только дни, куда
+        попали новые строки.
+
+        Args:
+            df: pandas DataFrame
+            table_name: название таблицы
+        """
+        pa, pq = self._pyarrow()
+        path = self.table_path(table_name)
+        key = self.PRIMARY_KEYS[table_name]
+        incoming = len(df)
+        df = df.drop_duplicates(subset=[key], keep='first')
+        if self.exists(table_name):
+            # Анти-соединение по ключу: хранимые строки не заменяются
+            stored = pq.read_table(str(path), columns=[key],
+                                   filters=[(key, 'in', df[key].tolist())])
+            df = df[~df[key].isin(stored.column(key).to_pandas())]
+            if df.empty:
+                print(f"✓ Новых записей нет в stage-хранилище: {table_name} "
+                      f"({incoming} уже сохранены)")
+                return
+        written = len(df)
+
+        if table_name in self.PARTITION_COLUMNS:
+            date_column, partition_column = self.PARTITION_COLUMNS[table_name]
+            df = df.assign(**{
+                partition_column: pd.to_datetime(df[date_column]).dt.strftime('%Y-%m-%d')
+            })
+            if self.exists(table_name):
+                kept = self.read(table_name, filters=[
+                    (partition_column, 'in', sorted(set(df[partition_column])))
+                ])
+                df = pd.concat([kept.assign(**{
+                    partition_column: pd.to_datetime(kept[date_column]).dt.strftime('%Y-%m-%d')
+                }), df], ignore_index=True)
+            pq.write_to_dataset(
+                pa.Table.from_pandas(df, preserve_index=False),
+                root_path=str(path),
+                partition_cols=[partition_column],
+                existing_data_behavior='delete_matching'
+            )
+        else:
+            if self.exists(table_name):
+                df = pd.concat([self.read(table_name), df], ignore_index=True)
+            path.mkdir(parents=True, exist_ok=True)
+            # Файлы с точкой в начале pyarrow при чтении пропускает
+            tmp_path = path / f".part-0.{uuid.uuid4().hex}.tmp"
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), str(tmp_path))
+            os.replace(tmp_path, path / 'part-0.parquet')
+
+        skipped = incoming - written
+        print(f"✓ Записано {written} записей в stage-хранилище: {table_name}"
+              + (f" (пропущено {skipped} с уже сохраненными ключами)" if skipped else ""))
+
+    def read(self, table_name, columns=None, filters=None):
+        """
+        Чтение таблицы с проекцией колонок и фильтрами
+
+        Args:
+            table_name: название таблицы
+            columns: список колонок (None - все)
+            filters: фильтры pyarrow, например
+                [('transaction_status', '==', 'Completed'),
+                 ('transaction_day', '>=', '2024-01-01')]
+
+        Returns:
+            DataFrame с данными
+        """
+        _, pq = self._pyarrow()
+        table = pq.read_table(str(self.table_path(table_name)),
+                              columns=columns, filters=filters)
+        df = table.to_pandas()
+
+        if table_name in self.PARTITION_COLUMNS:
+            partition_column = self.PARTITION_COLUMNS[table_name][1]
+            if partition_column in df.columns and (columns is None or partition_column not in columns):
+                df = df.drop(columns=[partition_column])
+        return df
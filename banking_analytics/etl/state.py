@@ -0,0 +1,70 @@
+# etl/state.py
+"""
+Модуль хранения состояния инкрементальной загрузки (watermark-ов)
+"""
+from database.db_connection import DatabaseConnection
+
+
+class EtlState:
+    """Watermark-и источников в таблице dwh.etl_state"""
+
+    def __init__(self, db_connection: DatabaseConnection):
+        """
+        Инициализация хранилища состояния
+
+        Args:
+            db_connection: экземпляр подключения к базе данных
+        """
+        self.db = db_connection
+
+    def get_watermarks(self):
+        """
+        Чтение сохраненных watermark-ов
+
+        Returns:
+            dict: {таблица-источник: последний обработанный id}
+        """
+        df = self.db.read_query("SELECT source_table, last_id FROM dwh.etl_state")
+        return {row.source_table: int(row.last_id) for row in df.itertuples(index=False)}
+
+    def get_id_ranges(self, high_watermarks):
+        """
+        Диапазоны новых строк для каждого источника
+
+        Args:
+            high_watermarks: текущие верхние границы из
+                DataExtractor.extract_high_watermarks()
+
+        Returns:
+            dict: {таблица-источник: (последний обработанный id, текущий max id)}
+        """
+        watermarks = self.get_watermarks()
+        id_ranges = {}
+        for source, high in high_watermarks.items():
+            low = watermarks.get(source, 0)
+            id_ranges[source] = (low, max(low, high['last_id']))
+            print(f"  {source}: новые id в диапазоне ({low}, {id_ranges[source][1]}]")
+        return id_ranges
+
+    def update_watermarks(self, high_watermarks):
+        """
+        Сохранение watermark-ов после успешной загрузки
+
+        Args:
+            high_watermarks: словарь {таблица: {'last_id', 'last_timestamp'}}
+        """
+        query = """
+        INSERT INTO dwh.etl_state (source_table, last_id, last_timestamp, updated_at)
+        VALUES (%(source_table)s, %(last_id)s, %(last_timestamp)s, NOW())
+        ON CONFLICT (source_table) DO UPDATE SET
+            last_id = GREATEST(dwh.etl_state.last_id, EXCLUDED.last_id),
+            last_timestamp = COALESCE(EXCLUDED.last_timestamp, dwh.etl_state.last_timestamp),
+            updated_at = NOW()
+        """
+        for source, high in high_watermarks.items():
+            self.db.execute_query(query, {
+                'source_table': source,
+                'last_id': high['last_id'],
+                'last_timestamp': high['last_timestamp']
+            })
+        print("✓ Watermark-и обновлены")
@@ -2,6 +2,8 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from etl.dates import to_date_key
+from monitoring.metrics import instrument
 
 
 class DataTransformer:
@@ -10,6 +12,7 @@ class DataTransformer:
     def __init__(self, exchange_rates_df):
         self.exchange_rates = exchange_rates_df
 
+    @instrument()
     def clean_customers(self, df):
         """Очистка и обогащение данных клиентов"""
         # Удаление дубликатов
@@ -37,8 +40,12 @@ class DataTransformer:
 
         return df
 
+    @instrument()
     def clean_transactions(self, df):
-        """Очистка транзакций"""
+        """Очистка транзакций (DataFrame или итератор DataFrame-порций)"""
+        if not isinstance(df, pd.DataFrame):
+            return (self.clean_transactions(chunk) for chunk in df)
+
         # Удаление незавершенных транзакций для анализа
         df = df[df['transaction_status'] == 'Completed'].copy()
 
@@ -51,34 +58,93 @@ class DataTransformer:
 
         return df
 
+    def get_rate_table(self):
+        """
+        Таблица исторических курсов валют к рублю
+
+        Returns:
+            tuple: (список валют, отсортированные даты курсов,
+                    матрица курсов [дата x валюта]); последняя колонка
+                    матрицы - курс 1.0 для неизвестных валют
+        """
+        rates = self.exchange_rates.sort_values('date')
+        currencies = ['RUB']
+        rate_columns = []
+        for column in rates.columns:
+            if column.endswith('_to_rub'):
+                currencies.append(column[:-len('_to_rub')].upper())
+                rate_columns.append(column)
+
+        ones = np.ones((len(rates), 1))
+        rate_matrix = np.hstack([ones, rates[rate_columns].to_numpy(dtype='float64'), ones])
+        rate_dates = pd.to_datetime(rates['date']).to_numpy(dtype='datetime64[ns]')
+
+        return currencies, rate_dates, rate_matrix
+
+    @instrument()
     def enrich_with_currency_rates(self, transactions_df):
-        """Обогащение данных курсами валют через API"""
-        # Получаем курсы валют
-        rates = self.exchange_rates.iloc[0]
-
-        def convert_to_rub(row):
-            """Конвертация всех валют в рубли"""
-            if row['currency'] == 'RUB':
-                return row['amount'], 1.0
-            elif row['currency'] == 'USD':
-                return row['amount'] * rates['usd_to_rub'], rates['usd_to_rub']
-            elif row['currency'] == 'EUR':
-                return row['amount'] * rates['eur_to_rub'], rates['eur_to_rub']
-            return row['amount'], 1.0
-
-        # ИСПРАВЛЕНО: Используем apply с правильным типом результата
-        result = transactions_df.apply(convert_to_rub, axis=1, result_type='expand')
-        transactions_df['amount_rub'] = result[0]
-        transactions_df['exchange_rate'] = result[1]
+        """Обогащение данных курсами валют на дату транзакции (as-of join)"""
+        if not isinstance(transactions_df, pd.DataFrame):
+            return (self.enrich_with_currency_rates(chunk) for chunk in transactions_df)
+
+        currencies, rate_dates, rate_matrix = self.get_rate_table()
+
+        # Код валюты -> колонка матрицы курсов; неизвестные валюты получают
+        # код -1, то есть последнюю колонку с курсом 1.0
+        codes = pd.Categorical(transactions_df['currency'], categories=currencies).codes
+
+        # Строка матрицы - последний курс на дату транзакции (бинарный поиск,
+        # O(n log m)); транзакции раньше первого курса берут самый ранний курс
+        if 'transaction_date' in transactions_df.columns and len(rate_dates) > 1:
+            transaction_dates = pd.to_datetime(
+                transactions_df['transaction_date']
+            ).to_numpy(dtype='datetime64[ns]')
+            date_idx = np.searchsorted(rate_dates, transaction_dates, side='right') - 1
+            np.clip(date_idx, 0, None, out=date_idx)
+        else:
+            date_idx = np.full(len(transactions_df), len(rate_dates) - 1)
+
+        exchange_rate = rate_matrix[date_idx, codes]
+        transactions_df['amount_rub'] = transactions_df['amount'].to_numpy(dtype='float64') * exchange_rate
+        transactions_df['exchange_rate'] = exchange_rate
 
         return transactions_df
 
-    def create_date_dimension(self, start_date, end_date):
-        """Создание измерения дат"""
+    def get_date_range(self, transactions_df):
+        """
+        Диапазон дат транзакций
+
+        Returns:
+            tuple: (первая дата, последняя дата) или (None, None) без транзакций
+        """
+        if transactions_df.empty:
+            return None, None
+        dates = pd.to_datetime(transactions_df['transaction_date'])
+        return dates.min().date(), dates.max().date()
+
+    @instrument()
+    def create_date_dimension(self, start_date, end_date, existing_date_keys=None):
+        """
+        Создание измерения дат
+
+        Args:
+            start_date: первая дата
+            end_date: последняя дата
+            existing_date_keys: date_key, которые уже есть в dwh.dim_date
+                (такие даты пропускаются)
+        """
+        if start_date is None or end_date is None:
+            return pd.DataFrame()
+
         dates = pd.date_range(start=start_date, end=end_date, freq='D')
+        date_keys = to_date_key(dates)
+        if existing_date_keys is not None:
+            is_new = ~np.isin(date_keys, existing_date_keys)
+            dates = dates[is_new]
+            date_keys = date_keys[is_new]
 
         date_dim = pd.DataFrame({
-            'date_key': dates.strftime('%Y%m%d').astype(int),
+            'date_key': date_keys,
             'date': dates,
             'year': dates.year,
             'quarter': dates.quarter,
@@ -95,7 +161,7 @@ class DataTransformer:
 
     def aggregate_transaction_metrics(self, transactions_df):
         """Агрегация метрик для анализа"""
-        metrics = transactions_df.groupby(['account_id', 'transaction_type']).agg({
+        metrics = transactions_df.groupby(['account_id', 'transaction_type'], observed=True).agg({
             'amount_rub': ['sum', 'mean', 'count'],
             'transaction_id': 'count'
         }).reset_index()
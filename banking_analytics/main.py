@@ -1,93 +1,172 @@
 # main.py
-from config.config import get_config
-from data_generator.fake_data_generator import BankingDataGenerator
-from api.currency_api import CurrencyAPI
-from database.db_connection import DatabaseConnection
-from etl.extract import DataExtractor
-from etl.transform import DataTransformer
-from etl.load import DataLoader
+"""
+CLI пайплайна Banking Analytics
+
+    python main.py              # весь пайплайн в одном процессе (как all)
+    python main.py all
+    python main.py all --resume # с контрольными точками: после сбоя повторный
+                                # запуск пропускает шаги с неизменными входами
+    python main.py generate     # данные и курсы валют -> артефакт generated
+    python main.py stage        # артефакт generated -> PostgreSQL staging
+    python main.py transform    # staging -> очистка и обогащение -> артефакт transformed
+    python main.py load         # артефакт transformed -> DWH и проверка
+
+Тяжелые модули (pandas, Faker, psycopg2, httpx) импортируются внутри
+команд, поэтому --help и разбор аргументов их не загружают. Время
+импорта при старте:
+    python -X importtime main.py --help 2> importtime.log
+"""
+import argparse
 import os
+import sys
+
+from config.config import get_config
 
 
-def main():
-    # Получаем конфигурацию (можно задать через export ENV=prod)
-    config = get_config()
+def run_all(config, resume=False, fresh=False):
+    """Все шаги в одном процессе; потоковые режимы разрешены без контрольных точек"""
+    from pipeline import Pipeline
+
+    if resume:
+        from etl.checkpoints import CheckpointStore
+
+        if config.STREAM_BATCH_SIZE or config.EXTRACT_CHUNK_SIZE:
+            print("⚠ Потоковые режимы не сохраняются в контрольные точки - данные "
+                  "загружаются целиком")
+        store = CheckpointStore(config.CHECKPOINT_DIR)
+        if fresh:
+            store.clear()
+        pipeline = Pipeline(config, streaming=False)
+        try:
+            pipeline.run_checkpointed(store)
+        finally:
+            pipeline.close()
+        return
+
+    pipeline = Pipeline(config)
+    pipeline.start_exchange_rates()
+    pipeline.generate()
+    pipeline.connect()
+    try:
+        pipeline.fetch_exchange_rates()
+        pipeline.stage()
+        pipeline.extract()
+        pipeline.transform()
+        pipeline.load()
+        pipeline.verify()
+    finally:
+        pipeline.close()
+
+
+def run_generate(config):
+    """Генерация данных и курсов валют без подключения к PostgreSQL"""
+    from pipeline import Pipeline
+
+    pipeline = Pipeline(config, streaming=False)
+    pipeline.start_exchange_rates()
+    pipeline.generate()
+    pipeline.fetch_exchange_rates()
+    pipeline.save_artifact('generated', pipeline.data)
+
+
+def run_stage(config):
+    """Загрузка сгенерированных данных в staging"""
+    from pipeline import Pipeline
+
+    pipeline = Pipeline(config, streaming=False)
+    pipeline.data = pipeline.load_artifact('generated')
+    pipeline.connect()
+    try:
+        pipeline.stage()
+    finally:
+        pipeline.close()
+
+
+def run_transform(config):
+    """Извлечение из staging, очистка и обогащение"""
+    from pipeline import Pipeline
+
+    pipeline = Pipeline(config, streaming=False)
+    pipeline.connect()
+    try:
+        pipeline.extract()
+        pipeline.transform()
+        pipeline.save_artifact('transformed', {**pipeline.transformed, 'state': pipeline.state})
+    finally:
+        pipeline.close()
+
+
+def run_load(config):
+    """Загрузка измерений и fact таблицы в DWH и проверка"""
+    from pipeline import Pipeline
+
+    pipeline = Pipeline(config, streaming=False)
+    transformed = pipeline.load_artifact('transformed')
+    pipeline.state = transformed.pop('state')
+    pipeline.transformed = transformed
+    pipeline.connect()
+    try:
+        pipeline.load()
+        pipeline.verify()
+    finally:
+        pipeline.close()
+
+
+COMMANDS = {
+    'all': (run_all, "весь пайплайн в одном процессе"),
+    'generate': (run_generate, "генерация данных и курсов валют в артефакт"),
+    'stage': (run_stage, "загрузка сгенерированных данных в staging"),
+    'transform': (run_transform, "извлечение из staging и трансформация в артефакт"),
+    'load': (run_load, "загрузка в DWH и проверка"),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Banking Analytics Pipeline")
+    parser.add_argument('--env', help="окружение конфигурации (по умолчанию ENV или dev)")
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    for name, (_, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text)
+    all_parser = subparsers.choices['all']
+    all_parser.add_argument('--resume', action='store_true', default=None,
+                            help="контрольные точки шагов в CHECKPOINT_DIR: продолжить "
+                                 "незавершенный запуск (по умолчанию CHECKPOINTS=1)")
+    all_parser.add_argument('--fresh', action='store_true',
+                            help="удалить контрольные точки перед запуском "
+                                 "(включает --resume)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    command = args.command or 'all'
+
+    # Получаем конфигурацию (можно задать через export ENV=prod или --env)
+    config = get_config(args.env)
 
     print(f"=== {config.PROJECT_NAME} v{config.VERSION} ===")
-    print(f"Окружение: {os.getenv('ENV', 'development')}\n")
-
-    # 1. Генерация данных
-    print("1. Генерация данных...")
-    generator = BankingDataGenerator(
-        num_customers=config.NUM_CUSTOMERS,
-        num_transactions=config.NUM_TRANSACTIONS
-    )
-    customers_df = generator.generate_customers()
-    accounts_df = generator.generate_accounts(len(customers_df))
-    transactions_df = generator.generate_transactions(accounts_df)
-    branches_df = generator.generate_branches()
-
-    # 2. Получение курсов валют через API
-    print("\n2. Получение курсов валют...")
-    currency_api = CurrencyAPI()
-    exchange_rates_df = currency_api.get_exchange_rates()
-
-    # 3. Подключение к PostgreSQL
-    print("\n3. Подключение к PostgreSQL...")
-    db = DatabaseConnection(
-        host=config.DB_HOST,
-        database=config.DB_NAME,
-        user=config.DB_USER,
-        password=config.DB_PASSWORD,
-        port=config.DB_PORT
-    )
-    db.connect()
-
-    # 4. Загрузка в staging
-    print("\n4. Загрузка в staging...")
-    db.load_dataframe(customers_df, 'customers', schema=config.STAGING_SCHEMA)
-    db.load_dataframe(accounts_df, 'accounts', schema=config.STAGING_SCHEMA)
-    db.load_dataframe(transactions_df, 'transactions', schema=config.STAGING_SCHEMA)
-    db.load_dataframe(branches_df, 'branches', schema=config.STAGING_SCHEMA)
-    db.load_dataframe(exchange_rates_df, 'exchange_rates', schema=config.STAGING_SCHEMA)
-
-    # 5. Извлечение данных из staging (НОВОЕ!)
-    print("\n5. Извлечение данных из staging...")
-    extractor = DataExtractor(db)
-    staging_data = extractor.extract_all_staging_data()
-
-    # 6. Обработка и обогащение
-    print("\n6. Обработка и обогащение данных...")
-    transformer = DataTransformer(staging_data['exchange_rates'])
-
-    customers_clean = transformer.clean_customers(staging_data['customers'])
-    transactions_clean = transformer.clean_transactions(staging_data['transactions'])
-    transactions_enriched = transformer.enrich_with_currency_rates(transactions_clean)
-
-    date_dim_df = transformer.create_date_dimension('2023-01-01', '2025-12-31')
-
-    # 7. Загрузка в DWH
-    print("\n7. Загрузка в схему звезда...")
-    loader = DataLoader(db)
-    loader.load_dimensions(customers_clean, staging_data['accounts'],
-                           staging_data['branches'], date_dim_df)
-    loader.load_fact_table(transactions_enriched)
-
-    # 8. Проверка
-    print("\n8. Проверка результатов...")
-    query = """
-    SELECT 
-        COUNT(*) as total_transactions,
-        SUM(amount_rub) as total_amount_rub,
-        AVG(amount_rub) as avg_amount_rub
-    FROM dwh.fact_transactions
-    """
-    result = db.read_query(query)
-    print(result)
-
-    db.close()
-    print("\n=== Pipeline выполнен успешно! ===")
+    print(f"Окружение: {args.env or os.getenv('ENV', 'development')}")
+    print(f"Команда: {command}\n")
+
+    if config.METRICS_ENABLED:
+        from monitoring.metrics import metrics
+
+        metrics.configure(config.METRICS_LOG,
+                          profile_dir=config.PROFILE_DIR if config.PROFILE_STAGES else None,
+                          trace_memory=config.TRACE_MEMORY)
+        print(f"Метрики этапов: {config.METRICS_LOG} (run_id {metrics.run_id})\n")
+
+    run, _ = COMMANDS[command]
+    if command == 'all':
+        resume, fresh = getattr(args, 'resume', None), getattr(args, 'fresh', False)
+        if resume is None:
+            resume = config.CHECKPOINTS_ENABLED
+        run(config, resume=resume or fresh, fresh=fresh)
+    else:
+        run(config)
+    print(f"\n=== Pipeline ({command}) выполнен успешно! ===")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
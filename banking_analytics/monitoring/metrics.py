@@ -0,0 +1,233 @@
+# monitoring/metrics.py
+"""
+Метрики этапов пайплайна: время, строки, память и профили cProfile
+"""
+import cProfile
+import collections.abc
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+def peak_rss_mb():
+    """
+    Пиковый RSS процесса, МБ
+
+    resource дает максимум за все время жизни процесса (не за отдельный
+    этап); без него (Windows) берется текущий RSS через psutil.
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().rss / 1024 ** 2
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def count_rows(value):
+    """
+    Количество строк в результате этапа
+
+    Args:
+        value: DataFrame, словарь DataFrame-ов или другое значение
+
+    Returns:
+        int или None, если строки посчитать нельзя (например, итератор)
+    """
+    import pandas as pd
+
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, dict):
+        counts = [len(df) for df in value.values() if isinstance(df, pd.DataFrame)]
+        return sum(counts) if counts else None
+    return None
+
+
+class StageMetrics:
+    """
+    Сборщик метрик этапов с записью в JSON Lines
+
+    Каждый этап - одна строка файла: время (wall и CPU процесса), строки на
+    входе и выходе, строк в секунду, пиковый RSS процесса на начало и конец
+    этапа (peak_rss_start_mb / peak_rss_end_mb - пик за жизнь процесса:
+    рост означает, что этап поднял пик) и, если включен tracemalloc, пик
+    выделенной Python-памяти за этап. Пик tracemalloc общий на процесс,
+    поэтому он считается только для этапов верхнего уровня в главном
+    потоке; у вложенных этапов и этапов в потоках пула traced_peak_mb
+    пустой. Вложенные этапы помнят родителя. Пока сборщик не настроен,
+    этапы не замеряются.
+    """
+
+    def __init__(self):
+        self.log_path = None
+        self.profile_dir = None
+        self.trace_memory = False
+        self.run_id = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        return self.log_path is not None
+
+    def configure(self, log_path, profile_dir=None, trace_memory=False):
+        """
+        Включение сбора метрик
+
+        Args:
+            log_path: JSONL-файл для записей этапов (дописывается)
+            profile_dir: каталог для дампов cProfile по этапам (None - без профиля)
+            trace_memory: считать пик памяти этапа через tracemalloc
+                (заметно замедляет выполнение)
+        """
+        self.log_path = Path(log_path)
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        if self.profile_dir:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.run_id = datetime.now().strftime('%Y%m%d_%H%M%S_') + uuid.uuid4().hex[:6]
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _start_profile(self):
+        """cProfile для этапа верхнего уровня в текущем потоке (если доступен)"""
+        if self.profile_dir is None or getattr(self._local, 'profiling', False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Профилировщик уже активен в другом потоке (Python 3.12+)
+            return None
+        self._local.profiling = True
+        return profile
+
+    def _stop_profile(self, profile, name):
+        profile.disable()
+        self._local.profiling = False
+        path = self.profile_dir / f"{self.run_id}_{name}.prof"
+        profile.dump_stats(str(path))
+        return str(path)
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Замер этапа
+
+        Args:
+            name: название этапа
+            rows_in: строк на входе (optional)
+
+        Yields:
+            dict записи этапа; rows_in/rows_out можно дополнить внутри блока
+            (discard=True - не записывать этап)
+        """
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        if not self.enabled:
+            yield record
+            return
+
+        stack = self._stack()
+        record['parent'] = stack[-1] if stack else None
+        # reset_peak() сбросил бы пик объемлющего или параллельного этапа
+        trace_memory = (self.trace_memory and not stack
+                        and threading.current_thread() is threading.main_thread())
+        stack.append(name)
+        profile = self._start_profile()
+        if trace_memory:
+            tracemalloc.reset_peak()
+        peak_rss_start = peak_rss_mb()
+        started_at = datetime.now()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        status, error = 'ok', None
+        try:
+            yield record
+        except BaseException as e:
+            status, error = 'error', repr(e)
+            raise
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            stack.pop()
+            rows = record['rows_out'] if record['rows_out'] is not None else record['rows_in']
+            record.update({
+                'run_id': self.run_id,
+                'started_at': started_at.isoformat(timespec='milliseconds'),
+                'wall_sec': round(wall, 4),
+                'cpu_sec': round(cpu, 4),
+                'rows_per_sec': round(rows / wall, 1) if rows is not None and wall > 0 else None,
+                'peak_rss_start_mb': peak_rss_start,
+                'peak_rss_end_mb': peak_rss_mb(),
+                'traced_peak_mb': (tracemalloc.get_traced_memory()[1] / 1024 ** 2
+                                   if trace_memory else None),
+                'thread': threading.current_thread().name,
+                'status': status,
+                'error': error,
+                'profile': self._stop_profile(profile, name) if profile else None,
+            })
+            if not record.pop('discard', False):
+                self._write(record)
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock, open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+# Общий сборщик процесса; настраивается в main.py
+metrics = StageMetrics()
+
+
+def instrument(name=None):
+    """
+    Декоратор: замер вызова функции или метода как этапа
+
+    Строки на входе - длина первого аргумента-DataFrame, на выходе -
+    размер результата (DataFrame или словарь DataFrame-ов). Вызовы,
+    вернувшие итератор, не записываются.
+
+    Args:
+        name: название этапа (по умолчанию Класс.метод)
+    """
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            # pandas импортируется только при включенных метриках
+            import pandas as pd
+
+            rows_in = next((len(arg) for arg in (*args, *kwargs.values())
+                            if isinstance(arg, pd.DataFrame)), None)
+            with metrics.stage(stage_name, rows_in=rows_in) as record:
+                result = func(*args, **kwargs)
+                record['rows_out'] = count_rows(result)
+                # Ленивый результат (генератор порций): вызов только создает его,
+                # работа идет в вызовах по порциям, которые замеряются отдельно
+                record['discard'] = isinstance(result, collections.abc.Iterator)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,604 @@
+# pipeline.py
+"""
+Шаги ETL-пайплайна для CLI (main.py)
+
+Каждый шаг импортирует модули, которые нужны только ему, поэтому
+подкоманда generate не загружает psycopg2, а load - Faker. На уровне
+модуля импортируется только monitoring.metrics (без pandas).
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from monitoring.metrics import instrument
+
+
+def write_staging_in_background(db, staging_jobs):
+    """
+    Загрузка в PostgreSQL staging через отдельные соединения (фоновая запись)
+
+    Соединение берется из пула на каждую таблицу: порционная загрузка
+    при обрыве переходит на новое соединение, а оборванное не должно
+    достаться следующей таблице.
+    """
+    for df, table_name, schema in staging_jobs:
+        with db.pooled_connection() as conn:
+            db.load_dataframe(df, table_name, schema=schema, conn=conn)
+
+
+class Pipeline:
+    """
+    Состояние и шаги пайплайна
+
+    В режиме all шаги выполняются подряд в одном процессе. Отдельные
+    подкоманды передают данные друг другу через артефакты в
+    Config.ARTIFACTS_DIR (pickle сохраняет типы колонок).
+    """
+
+    # Таблицы, которые создает шаг генерации
+    GENERATED_TABLES = ('customers', 'accounts', 'transactions', 'branches')
+
+    def __init__(self, config, streaming=True):
+        """
+        Args:
+            config: класс конфигурации (config.get_config())
+            streaming: разрешить потоковые режимы (STREAM_BATCH_SIZE,
+                EXTRACT_CHUNK_SIZE); итераторы порций нельзя сохранить
+                в артефакт, поэтому отдельные подкоманды их отключают
+        """
+        self.config = config
+        self.streaming = streaming
+        self.db = None
+        self.generator = None
+        self.extractor = None
+        self.data = {}
+        self.staging_data = {}
+        self.transformed = {}
+        self.state = {}
+        self.fact_date_keys = []
+        self.stage_store = None
+        self._loader = None
+        self._rates_executor = None
+        self._rates_future = None
+        self._side_writer = None
+        self._staging_write = None
+
+    @property
+    def stream_batch_size(self):
+        return self.config.STREAM_BATCH_SIZE if self.streaming else 0
+
+    @property
+    def elt_mode(self):
+        return self.config.TRANSFORM_MODE == 'elt'
+
+    @property
+    def use_stage_store(self):
+        # ELT читает PostgreSQL staging напрямую - Parquet-хранилище ему не нужно
+        return (self.config.STAGE_STORE_ENABLED and not self.stream_batch_size
+                and not self.elt_mode)
+
+    # --- Артефакты между подкомандами ---
+
+    def artifact_path(self, name):
+        return self.config.ARTIFACTS_DIR / f"{name}.pkl"
+
+    def save_artifact(self, name, objects):
+        """Сохранение словаря объектов шага в Config.ARTIFACTS_DIR"""
+        import pandas as pd
+
+        path = self.artifact_path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pd.to_pickle(objects, path)
+        print(f"✓ Артефакт сохранен: {path}")
+
+    def load_artifact(self, name):
+        """Чтение артефакта предыдущей подкоманды"""
+        import pandas as pd
+
+        path = self.artifact_path(name)
+        if not path.exists():
+            raise FileNotFoundError(
+                f"Нет артефакта {path}: сначала выполните предыдущую подкоманду"
+            )
+        print(f"Чтение артефакта: {path}")
+        return pd.read_pickle(path)
+
+    # --- Шаги ---
+
+    def start_exchange_rates(self):
+        """
+        Запуск получения курсов валют в фоновом потоке
+
+        Запрос идет параллельно с генерацией данных и подключением к
+        PostgreSQL; результат забирает fetch_exchange_rates().
+        """
+        from api.currency_api import CurrencyAPI
+
+        config = self.config
+        currency_api = CurrencyAPI(
+            base_url=config.CURRENCY_API_URL,
+            archive_url=config.CURRENCY_ARCHIVE_URL,
+            cache_dir=config.RATES_CACHE_DIR,
+            cache_ttl=config.RATES_CACHE_TTL,
+            timeout=config.API_TIMEOUT,
+            max_concurrency=config.API_MAX_CONCURRENCY
+        )
+        archive_dir = config.CBR_ARCHIVE_DIR if config.CBR_ARCHIVE_DIR.exists() else None
+        self._rates_executor = ThreadPoolExecutor(max_workers=1)
+        self._rates_future = self._rates_executor.submit(currency_api.get_exchange_rates,
+                                                         archive_dir=archive_dir,
+                                                         history_days=config.CBR_HISTORY_DAYS)
+
+    @instrument('1_generate')
+    def generate(self):
+        """1. Генерация клиентов, счетов, транзакций и отделений"""
+        from data_generator.fake_data_generator import BankingDataGenerator
+        from etl.dtypes import report_memory
+
+        config = self.config
+        print("1. Генерация данных...")
+        self.generator = BankingDataGenerator(
+            num_customers=config.NUM_CUSTOMERS,
+            num_transactions=config.NUM_TRANSACTIONS,
+            seed=config.GENERATOR_SEED,
+            compact_dtypes=config.COMPACT_DTYPES
+        )
+        if self.stream_batch_size:
+            # Клиенты, счета и транзакции генерируются порциями на шаге 4
+            print(f"Потоковый режим: генерация порциями по {self.stream_batch_size} "
+                  f"вместе с загрузкой в staging")
+        elif config.GENERATOR_MODE == 'sharded':
+            from data_generator.sharded_generator import ShardedDataGenerator
+
+            sharded_generator = ShardedDataGenerator(
+                num_customers=config.NUM_CUSTOMERS,
+                num_transactions=config.NUM_TRANSACTIONS,
+                seed=config.GENERATOR_SEED or 0,
+                num_workers=config.GENERATOR_WORKERS,
+                output_dir=config.DATA_DIR / 'shards',
+                file_format=config.GENERATOR_SHARD_FORMAT,
+                compact_dtypes=config.COMPACT_DTYPES
+            )
+            shards = sharded_generator.run()
+            for table_name in ('customers', 'accounts', 'transactions'):
+                self.data[table_name] = sharded_generator.read_table(shards[table_name])
+        elif config.GENERATOR_MODE == 'vectorized':
+            # Все таблицы - из numpy.random.Generator и пулов Faker по seed
+            self.data['customers'] = self.generator.generate_customers_vectorized()
+            self.data['accounts'] = self.generator.generate_accounts_vectorized(
+                self.data['customers']['customer_id'].to_numpy()
+            )
+            self.data['transactions'] = self.generator.generate_transactions_vectorized(
+                self.data['accounts']
+            )
+        else:
+            self.data['customers'] = self.generator.generate_customers()
+            self.data['accounts'] = self.generator.generate_accounts(len(self.data['customers']))
+            self.data['transactions'] = self.generator.generate_transactions(
+                self.data['accounts']
+            )
+        self.data['branches'] = self.generator.generate_branches()
+        if not self.stream_batch_size:
+            print("Память DataFrame-ов:")
+            report_memory(self.data)
+
+    @instrument('2_connect')
+    def connect(self):
+        """2. Подключение к PostgreSQL"""
+        from database.db_connection import DatabaseConnection
+
+        config = self.config
+        print("\n2. Подключение к PostgreSQL...")
+        self.db = DatabaseConnection(
+            host=config.DB_HOST,
+            database=config.DB_NAME,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            port=config.DB_PORT,
+            load_method=config.LOAD_METHOD,
+            copy_chunk_size=config.COPY_CHUNK_SIZE,
+            pool_size=config.DB_POOL_SIZE,
+            load_batch_size=config.LOAD_BATCH_SIZE,
+            max_retries=config.LOAD_MAX_RETRIES,
+            retry_backoff=config.LOAD_RETRY_BACKOFF,
+            isolate_rejects=config.LOAD_ISOLATE_REJECTS
+        )
+        self.db.connect()
+
+    @instrument('3_exchange_rates')
+    def fetch_exchange_rates(self):
+        """3. Ожидание курсов валют, запрошенных в start_exchange_rates()"""
+        print("\n3. Получение курсов валют...")
+        self.data['exchange_rates'] = self._rates_future.result()
+        self._rates_executor.shutdown()
+
+    @instrument('4_staging')
+    def stage(self):
+        """4. Загрузка в staging (и в Parquet-хранилище, если включено)"""
+        config = self.config
+        print("\n4. Загрузка в staging...")
+        staging_jobs = [
+            (self.data['branches'], 'branches', config.STAGING_SCHEMA),
+            (self.data['exchange_rates'], 'exchange_rates', config.STAGING_SCHEMA),
+        ]
+        if self.stream_batch_size:
+            self.db.load_batches(self.generator.iter_batches(self.stream_batch_size),
+                                 schema=config.STAGING_SCHEMA)
+        else:
+            staging_jobs = [
+                (self.data['customers'], 'customers', config.STAGING_SCHEMA),
+                (self.data['accounts'], 'accounts', config.STAGING_SCHEMA),
+                (self.data['transactions'], 'transactions', config.STAGING_SCHEMA),
+            ] + staging_jobs
+
+        if self.use_stage_store:
+            from etl.stage_store import ParquetStageStore
+
+            self.stage_store = ParquetStageStore(config.STAGE_STORE_DIR)
+            for df, table_name, _ in staging_jobs:
+                self.stage_store.write(df, table_name)
+            # PostgreSQL staging пишется в фоне, дальше пайплайн читает Parquet
+            self._side_writer = ThreadPoolExecutor(max_workers=1)
+            self._staging_write = self._side_writer.submit(write_staging_in_background,
+                                                           self.db, staging_jobs)
+        else:
+            # Staging-таблицы независимы - при DB_POOL_SIZE > 1 грузятся параллельно
+            self.db.load_dataframes_parallel(staging_jobs)
+
+    def wait_staging_write(self):
+        """Ожидание фоновой записи в PostgreSQL staging"""
+        if self._staging_write:
+            self._staging_write.result()
+            self._side_writer.shutdown()
+            self._staging_write = None
+
+    @instrument('5_extract')
+    def extract(self):
+        """5. Извлечение данных из staging"""
+        from etl.dtypes import report_memory
+        from etl.extract import DataExtractor
+
+        config = self.config
+        print("\n5. Извлечение данных из staging...")
+        self.extractor = DataExtractor(self.db, compact_dtypes=config.COMPACT_DTYPES)
+        id_ranges = None
+        if config.INCREMENTAL:
+            from etl.state import EtlState
+
+            print("Инкрементальный режим: извлекаются только новые строки")
+            # Watermark-и считаются по PostgreSQL staging - ждем фоновую запись
+            self.wait_staging_write()
+            high_watermarks = self.extractor.extract_high_watermarks()
+            id_ranges = EtlState(self.db).get_id_ranges(high_watermarks)
+            self.state['high_watermarks'] = high_watermarks
+        self.state['transactions_range'] = (id_ranges or {}).get('transactions')
+
+        if self.use_stage_store:
+            if self.stage_store is None:
+                from etl.stage_store import ParquetStageStore
+
+                self.stage_store = ParquetStageStore(config.STAGE_STORE_DIR)
+            self.staging_data = self.extractor.extract_all_from_stage_store(
+                self.stage_store, id_ranges=id_ranges
+            )
+        else:
+            chunk_size = config.EXTRACT_CHUNK_SIZE if self.streaming else 0
+            # В ELT-режиме транзакции извлекаются только для сверки с pandas
+            self.staging_data = self.extractor.extract_all_staging_data(
+                stream_chunk_size=None if self.elt_mode else chunk_size or None,
+                id_ranges=id_ranges,
+                include_transactions=not self.elt_mode or config.ELT_PARITY_CHECK
+            )
+
+        print("Память DataFrame-ов:")
+        report_memory(self.staging_data)
+
+    @instrument('6_transform')
+    def transform(self):
+        """6. Очистка, обогащение и измерение дат"""
+        from etl.extract import DataExtractor
+        from etl.load import DataLoader
+        from etl.transform import DataTransformer
+
+        print("\n6. Обработка и обогащение данных...")
+        staging_data = self.staging_data
+        transformer = DataTransformer(staging_data['exchange_rates'])
+
+        self.transformed = {
+            'customers': transformer.clean_customers(staging_data['customers']),
+            'accounts': staging_data['accounts'],
+            'branches': staging_data['branches'],
+        }
+        if 'transactions' in staging_data:
+            transactions_clean = transformer.clean_transactions(staging_data['transactions'])
+            self.transformed['transactions'] = transformer.enrich_with_currency_rates(
+                transactions_clean
+            )
+
+        # Измерение дат покрывает диапазон транзакций; уже загруженные даты пропускаем
+        if self.use_stage_store:
+            date_from, date_to = transformer.get_date_range(staging_data['transactions'])
+        else:
+            # Шаг 5 мог быть восстановлен из контрольной точки без extractor-а
+            extractor = self.extractor or DataExtractor(self.db)
+            date_from, date_to = extractor.extract_transaction_date_range(
+                self.state['transactions_range']
+            )
+        existing_date_keys = (DataLoader(self.db).get_existing_date_keys(date_from, date_to)
+                              if date_from is not None else None)
+        self.transformed['date_dim'] = transformer.create_date_dimension(
+            date_from, date_to, existing_date_keys
+        )
+
+    @instrument('7_load_dwh')
+    def load(self):
+        """7. Загрузка измерений и fact таблицы в DWH"""
+        print("\n7. Загрузка в схему звезда...")
+        self.load_dimensions()
+        self.load_facts()
+        self.refresh_aggregates()
+        self.update_watermarks()
+
+    @property
+    def loader(self):
+        """DataLoader шага 7 (создается при первом обращении)"""
+        if self._loader is None:
+            from etl.load import DataLoader
+
+            config = self.config
+            self._loader = DataLoader(
+                self.db,
+                fact_load_workers=config.FACT_LOAD_WORKERS,
+                bulk_load_threshold=config.BULK_LOAD_THRESHOLD,
+                maintenance_work_mem_mb=config.MAINTENANCE_WORK_MEM_MB,
+                swap_min_ratio=config.FACT_SWAP_MIN_RATIO
+            )
+        return self._loader
+
+    def load_dimensions(self):
+        """7a. Загрузка измерений"""
+        transformed = self.transformed
+        self.loader.load_dimensions(transformed['customers'], transformed['accounts'],
+                                    transformed['branches'], transformed['date_dim'])
+
+    def load_facts(self):
+        """7b. Загрузка fact таблицы без пересчета агрегатов"""
+        import pandas as pd
+
+        config = self.config
+        loader = self.loader
+        transactions_range = self.state.get('transactions_range')
+
+        if self.elt_mode:
+            if config.ELT_PARITY_CHECK:
+                loader.check_elt_parity(self.transformed['transactions'], transactions_range)
+            date_keys = loader.load_fact_table_elt(transactions_range, refresh=False)
+        else:
+            transactions = self.transformed['transactions']
+            row_estimate = None
+            if not isinstance(transactions, pd.DataFrame) and config.BULK_LOAD_THRESHOLD:
+                from etl.extract import DataExtractor
+
+                # Потоковое извлечение: размер порций заранее неизвестен,
+                # порог массовой загрузки сравнивается с числом строк staging
+                row_estimate = (self.extractor or DataExtractor(self.db)).count_transactions(
+                    transactions_range
+                )
+            date_keys = loader.load_fact_table(transactions, row_estimate=row_estimate,
+                                               refresh=False)
+        self.fact_date_keys = date_keys
+
+    def refresh_aggregates(self):
+        """7c. Пересчет агрегатов по датам, загруженным в fact таблицу"""
+        self.loader.refresh_aggregates(self.fact_date_keys)
+
+    def update_watermarks(self):
+        """7d. Сдвиг watermark-ов инкрементальной загрузки"""
+        if self.config.INCREMENTAL:
+            from etl.state import EtlState
+
+            EtlState(self.db).update_watermarks(self.state['high_watermarks'])
+
+    @instrument('8_verify')
+    def verify(self):
+        """8. Проверка результатов по дневным агрегатам"""
+        print("\n8. Проверка результатов...")
+        # Читаем дневные агрегаты вместо полного сканирования fact таблицы
+        query = """
+        SELECT
+            SUM(transaction_count) as total_transactions,
+            SUM(amount_rub_sum) as total_amount_rub,
+            SUM(amount_rub_sum) / NULLIF(SUM(transaction_count), 0) as avg_amount_rub
+        FROM dwh.agg_daily_channel
+        """
+        result = self.db.read_query(query)
+        print(result)
+
+    def extract_inputs(self):
+        """
+        Состояние БД, которое читает шаг извлечения
+
+        Верхние границы id в PostgreSQL staging (туда пишут и другие
+        запуски), последняя дата курсов и, в инкрементальном режиме,
+        watermark-и dwh.etl_state. Входит в хэш входов шага 5, чтобы
+        восстановленное извлечение не пропускало новые строки staging.
+        """
+        from etl.extract import DataExtractor
+
+        rates = self.db.read_query(
+            "SELECT COUNT(*) AS row_count, MAX(date) AS last_date FROM staging.exchange_rates"
+        )
+        inputs = {
+            'staging': DataExtractor(self.db).extract_high_watermarks(),
+            'exchange_rates': rates.iloc[0].tolist(),
+        }
+        if self.config.INCREMENTAL:
+            from etl.state import EtlState
+
+            inputs['etl_state'] = EtlState(self.db).get_watermarks()
+        return inputs
+
+    def run_checkpointed(self, store):
+        """
+        Все шаги через StageRunner: при повторном запуске шаги с
+        неизменными входами не выполняются, а восстанавливаются из store
+
+        Запуск описывается манифестом store.start_run(): незавершенный
+        запуск продолжается с тем же run_id и той же датой курсов, даже
+        если повтор идет на следующий день.
+
+        Args:
+            store: etl.checkpoints.CheckpointStore
+        """
+        config = self.config
+        run = store.start_run()
+        runner = StageRunner(store, run['run_id'])
+        db_params = {'host': config.DB_HOST, 'port': config.DB_PORT, 'database': config.DB_NAME}
+
+        # Дата курсов фиксируется в манифесте при старте запуска
+        rates_params = {'date': run['rates_date'],
+                        'history_days': config.CBR_HISTORY_DAYS,
+                        'base_url': config.CURRENCY_API_URL,
+                        'archive_url': config.CURRENCY_ARCHIVE_URL}
+        if not store.has('3_exchange_rates', runner.input_hash(rates_params)):
+            self.start_exchange_rates()
+
+        runner.run('1_generate', self.generate,
+                   params={'num_customers': config.NUM_CUSTOMERS,
+                           'num_transactions': config.NUM_TRANSACTIONS,
+                           'mode': config.GENERATOR_MODE,
+                           'seed': config.GENERATOR_SEED,
+                           'shard_format': config.GENERATOR_SHARD_FORMAT,
+                           'compact_dtypes': config.COMPACT_DTYPES},
+                   outputs=lambda: {name: self.data[name] for name in self.GENERATED_TABLES},
+                   restore=self.data.update)
+        self.connect()
+        # Порционная загрузка продолжает зафиксированные порции этого запуска
+        self.db.run_id = run['run_id']
+        runner.run('3_exchange_rates', self.fetch_exchange_rates, params=rates_params,
+                   outputs=lambda: {'exchange_rates': self.data['exchange_rates']},
+                   restore=self.data.update)
+
+        def stage_and_wait():
+            # Отметка о загрузке staging ставится только после фоновой записи
+            self.stage()
+            self.wait_staging_write()
+
+        runner.run('4_staging', stage_and_wait, deps=('1_generate', '3_exchange_rates'),
+                   params={**db_params, 'stage_store': self.use_stage_store})
+
+        def restore_extract(saved):
+            self.staging_data = saved['staging_data']
+            self.state = saved['state']
+
+        runner.run('5_extract', self.extract, deps=('4_staging',),
+                   params={'database': self.extract_inputs(),
+                           'incremental': config.INCREMENTAL,
+                           'compact_dtypes': config.COMPACT_DTYPES,
+                           'stage_store': self.use_stage_store,
+                           'transform_mode': config.TRANSFORM_MODE,
+                           'elt_parity_check': config.ELT_PARITY_CHECK},
+                   outputs=lambda: {'staging_data': self.staging_data, 'state': self.state},
+                   restore=restore_extract)
+        # Существующие date_key из dwh.dim_date в хэш не входят: восстановленное
+        # измерение дат может содержать уже загруженные даты, а измерения
+        # грузятся с ON CONFLICT DO NOTHING по натуральному ключу
+        runner.run('6_transform', self.transform, deps=('5_extract',),
+                   outputs=lambda: self.transformed,
+                   restore=lambda saved: setattr(self, 'transformed', saved))
+
+        self.run_load_steps(runner, db_params)
+        self.verify()
+        store.complete_run(run)
+
+    def run_load_steps(self, runner, db_params):
+        """
+        Шаг 7 через StageRunner: измерения, факты, агрегаты, watermark-и
+
+        У каждого подшага своя контрольная точка: сбой после загрузки фактов
+        не повторяет ее. Повтор подшага, чья контрольная точка не успела
+        записаться, не дублирует строки - натуральные ключи измерений и
+        (transaction_id, date_key) фактов уникальны.
+
+        Args:
+            runner: StageRunner запуска с выполненным шагом 6_transform
+            db_params: параметры подключения, входящие в хэш шагов
+        """
+        config = self.config
+        print("\n7. Загрузка в схему звезда...")
+        load_params = {**db_params, 'transform_mode': config.TRANSFORM_MODE}
+        runner.run('7a_load_dimensions', self.load_dimensions, deps=('6_transform',),
+                   params=load_params)
+        runner.run('7b_load_fact', self.load_facts, deps=('7a_load_dimensions',),
+                   params=load_params,
+                   outputs=lambda: {'fact_date_keys': self.fact_date_keys},
+                   restore=lambda saved: setattr(self, 'fact_date_keys', saved['fact_date_keys']))
+        runner.run('7c_aggregates', self.refresh_aggregates, deps=('7b_load_fact',),
+                   params=db_params)
+        runner.run('7d_watermarks', self.update_watermarks, deps=('7c_aggregates',),
+                   params={**db_params, 'incremental': config.INCREMENTAL})
+
+    def close(self):
+        """Завершение фоновой записи и закрытие соединения"""
+        self.wait_staging_write()
+        if self.db:
+            self.db.close()
+
+
+class StageRunner:
+    """
+    Шаги пайплайна как DAG с контрольными точками
+
+    Хэш входов шага складывается из его параметров конфигурации и хэшей
+    результатов шагов, от которых он зависит. Если для этого хэша есть
+    контрольная точка, шаг не выполняется, а его результат читается с
+    диска: после сбоя на позднем шаге повторный запуск сразу доходит до
+    него. Шаги с побочным эффектом в БД (staging, DWH) сохраняют только
+    отметку о выполнении.
+
+    Шаг 2 (подключение) и шаг 8 (проверка) выполняются всегда.
+    """
+
+    def __init__(self, store, run_id=None):
+        """
+        Args:
+            store: etl.checkpoints.CheckpointStore
+            run_id: идентификатор запуска; входит в хэш каждого шага, поэтому
+                контрольные точки прошлых запусков не используются
+        """
+        self.store = store
+        self.run_id = run_id
+        self.hashes = {}
+
+    def input_hash(self, params=None, deps=()):
+        from etl.checkpoints import content_hash
+
+        return content_hash({'run_id': self.run_id, 'params': params,
+                             'deps': {dep: self.hashes[dep] for dep in deps}})
+
+    def run(self, name, func, params=None, deps=(), outputs=None, restore=None):
+        """
+        Выполнение шага или восстановление его результата
+
+        Args:
+            name: название шага
+            func: функция шага без аргументов
+            params: параметры, влияющие на результат шага
+            deps: шаги, результаты которых использует этот шаг
+            outputs: функция, возвращающая словарь результатов после func
+                (None - шаг без результата в памяти)
+            restore: функция, принимающая словарь результатов из контрольной точки
+
+        Returns:
+            bool: True, если шаг выполнялся
+        """
+        input_hash = self.input_hash(params, deps)
+        checkpoint = self.store.load(name, input_hash)
+        if checkpoint is not None:
+            saved, self.hashes[name] = checkpoint
+            if restore:
+                restore(saved)
+            print(f"✓ Шаг {name}: входы не изменились, результат из контрольной точки")
+            return False
+
+        func()
+        self.hashes[name] = self.store.save(name, input_hash, outputs() if outputs else None)
+        return True
@@ -0,0 +1,90 @@
+# tests/conftest.py
+"""
+Общие фикстуры тестов
+
+Тесты с базой данных выполняются во временной базе (как бенчмарки) на
+сервере из config (DB_HOST, DB_PORT, DB_USER, DB_PASSWORD) и пропускаются,
+если PostgreSQL недоступен. Запуск из каталога banking_analytics:
+    python -m pytest -q
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.config import get_config  # noqa: E402
+
+
+@pytest.fixture
+def config():
+    return get_config()
+
+
+@pytest.fixture
+def db(config):
+    """Подключенный DatabaseConnection к временной базе со схемами staging и dwh"""
+    import psycopg2
+
+    from benchmarks.run_benchmarks import throwaway_database
+    from create_schemas import create_schemas
+
+    try:
+        database = throwaway_database(config)
+        connection = database.__enter__()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL недоступен: {e}")
+    try:
+        create_schemas(connection)
+        yield connection
+    finally:
+        database.__exit__(None, None, None)
+
+
+@pytest.fixture
+def transformed(db):
+    """
+    Очищенные и обогащенные данные, как после шага 6_transform
+
+    Небольшой набор с фиксированным seed загружается в staging временной
+    базы и проходит извлечение и преобразование пайплайна.
+    """
+    import pandas as pd
+
+    from benchmarks.run_benchmarks import synthetic_exchange_rates
+    from data_generator.fake_data_generator import BankingDataGenerator
+    from etl.extract import DataExtractor
+    from etl.transform import DataTransformer
+
+    generator = BankingDataGenerator(num_customers=200, num_transactions=2000, seed=7)
+    customers_df = generator.generate_customers_vectorized()
+    accounts_df = generator.generate_accounts_vectorized(customers_df['customer_id'].to_numpy())
+    transactions_df = generator.generate_transactions_vectorized(accounts_df)
+    transaction_dates = pd.to_datetime(transactions_df['transaction_date'])
+    exchange_rates_df = synthetic_exchange_rates(transaction_dates.min().date(),
+                                                 transaction_dates.max().date(), seed=7)
+    for df, table_name in [(customers_df, 'customers'), (accounts_df, 'accounts'),
+                           (transactions_df, 'transactions'),
+                           (generator.generate_branches(), 'branches'),
+                           (exchange_rates_df, 'exchange_rates')]:
+        db.load_dataframe(df, table_name, schema='staging')
+
+    staging_data = DataExtractor(db).extract_all_staging_data()
+    transformer = DataTransformer(staging_data['exchange_rates'])
+    date_from, date_to = transformer.get_date_range(staging_data['transactions'])
+    return {
+        'customers': transformer.clean_customers(staging_data['customers']),
+        'accounts': staging_data['accounts'],
+        'branches': staging_data['branches'],
+        'transactions': transformer.enrich_with_currency_rates(
+            transformer.clean_transactions(staging_data['transactions'])
+        ),
+        'date_dim': transformer.create_date_dimension(date_from, date_to),
+    }
+
+
+def table_counts(db, *tables):
+    """Число строк таблиц dwh: имя -> количество"""
+    return {table: int(db.read_query(f"SELECT COUNT(*) AS n FROM dwh.{table}")['n'].iloc[0])
+            for table in tables}
@@ -0,0 +1,20 @@
+# tests/test_bulk_load.py
+"""
+Восстановление индексов после массовой загрузки в пределах пула соединений
+"""
+from etl.load import DataLoader
+
+
+def test_rebuild_indexes_with_more_indexes_than_pool(db):
+    db.close()
+    db.pool_size = 2
+    db.connect()
+    # pg_sleep держит соединение, чтобы построения шли одновременно
+    indexes = [(f"idx_test_{column}",
+                f"SELECT pg_sleep(0.2); "
+                f"CREATE INDEX idx_test_{column} ON dwh.dim_account ({column})")
+               for column in ('account_number', 'account_type', 'currency')]
+
+    assert DataLoader(db)._rebuild_indexes(indexes) == []
+    built = db.read_query("SELECT indexname FROM pg_indexes WHERE indexname LIKE 'idx_test_%'")
+    assert sorted(built['indexname']) == sorted(name for name, _ in indexes)
@@ -0,0 +1,30 @@
+# tests/test_fact_build.py
+"""
+Сборка строк fact таблицы детерминирована: повторная сборка дает тот же
+load_id порционной загрузки и совпадает с ELT-запросом
+"""
+from etl.load import DataLoader
+
+
+def build_fact_data(db, transformed):
+    """Строки fact таблицы новым DataLoader (кэш ключей читается из БД заново)"""
+    return DataLoader(db)._build_fact_data(transformed['transactions'])
+
+
+def test_fact_load_id_is_stable(db, transformed):
+    DataLoader(db).load_dimensions(transformed['customers'], transformed['accounts'],
+                                   transformed['branches'], transformed['date_dim'])
+    first = build_fact_data(db, transformed)
+    second = build_fact_data(db, transformed)
+
+    with db.conn.cursor() as cursor:
+        first_id = db._load_id(cursor, first, 'fact_transactions', 'dwh', 1000)
+        second_id = db._load_id(cursor, second, 'fact_transactions', 'dwh', 1000)
+    assert first_id == second_id
+
+
+def test_elt_parity_including_branch_key(db, transformed):
+    loader = DataLoader(db)
+    loader.load_dimensions(transformed['customers'], transformed['accounts'],
+                           transformed['branches'], transformed['date_dim'])
+    assert loader.check_elt_parity(transformed['transactions']) == (0, 0)
@@ -0,0 +1,106 @@
+# tests/test_parallel_load.py
+"""
+Параллельная загрузка fact таблицы: дозапись малых порций и блокировка
+подменяемых партиций
+"""
+import threading
+
+import psycopg2
+import pytest
+
+from conftest import table_counts
+from etl.load import DataLoader
+
+
+@pytest.fixture
+def loader(db, transformed):
+    """DataLoader с двумя воркерами fact таблицы и загруженными измерениями"""
+    db.close()
+    db.pool_size = 3
+    db.connect()
+    loader = DataLoader(db, fact_load_workers=2, swap_min_ratio=0.1)
+    loader.load_dimensions(transformed['customers'], transformed['accounts'],
+                           transformed['branches'], transformed['date_dim'])
+    return loader
+
+
+def partition_filenodes(db):
+    """Партиция fact таблицы -> relfilenode (меняется при подмене)"""
+    nodes = db.read_query("""
+    SELECT c.relname, pg_relation_filenode(c.oid) AS filenode
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'dwh.fact_transactions'::regclass
+    """)
+    db.conn.rollback()
+    return dict(zip(nodes['relname'], nodes['filenode']))
+
+
+def test_small_delta_is_appended(db, transformed, loader):
+    transactions = transformed['transactions']
+    held_out = transactions['transaction_id'] % 20 == 0
+    loader.load_fact_table(transactions[~held_out])
+    filenodes = partition_filenodes(db)
+    partition_rows = db.read_query("""
+    SELECT date_key / 100 AS month, COUNT(*) AS n FROM dwh.fact_transactions GROUP BY 1
+    """).set_index('month')['n']
+    delta_rows = (loader._build_fact_data(transactions[held_out])['date_key'] // 100).value_counts()
+
+    loader.load_fact_table(transactions[held_out])
+
+    swapped = {loader._partition_bounds(month)[0]
+               for month, rows in delta_rows.items()
+               if rows >= 0.1 * partition_rows.get(month, 0)}
+    assert len(swapped) < len(delta_rows)
+    after = partition_filenodes(db)
+    for name, filenode in filenodes.items():
+        assert (after[name] != filenode) == (name in swapped)
+    assert table_counts(db, 'fact_transactions')['fact_transactions'] == len(
+        loader._build_fact_data(transactions)
+    )
+
+
+def test_concurrent_insert_survives_swap(db, config, transformed, loader):
+    transactions = transformed['transactions']
+    loader.load_fact_table(transactions.iloc[:10])
+    month_key = int(loader._build_fact_data(transactions.iloc[:1])['date_key'].iloc[0])
+    index_month = loader._index_month
+    inserted, errors = [], []
+
+    def insert_concurrently():
+        conn = psycopg2.connect(host=config.DB_HOST, port=config.DB_PORT, user=config.DB_USER,
+                                password=config.DB_PASSWORD,
+                                database=db.conn_params['database'])
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                INSERT INTO dwh.fact_transactions (transaction_id, date_key, customer_key,
+                    account_key, transaction_type_key, amount_rub, channel)
+                SELECT -1, date_key, customer_key, account_key, transaction_type_key,
+                    amount_rub, channel
+                FROM dwh.fact_transactions WHERE date_key = %s LIMIT 1
+                """, (month_key,))
+            conn.commit()
+            inserted.append(True)
+        except psycopg2.Error as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    writer = threading.Thread(target=insert_concurrently)
+
+    def index_month_with_writer(*args):
+        # Вставка другого сеанса между сборкой и подменой партиции
+        if writer.ident is None:
+            writer.start()
+            writer.join(timeout=1)
+        index_month(*args)
+
+    loader._index_month = index_month_with_writer
+    loader.load_fact_table(transactions.iloc[10:])
+    writer.join()
+
+    assert not errors
+    assert inserted
+    found = db.read_query("SELECT COUNT(*) AS n FROM dwh.fact_transactions "
+                          "WHERE transaction_id = -1")['n'].iloc[0]
+    assert found == 1
@@ -0,0 +1,101 @@
+# tests/test_resume.py
+"""
+Повтор шага 7 после сбоя не дублирует строки измерений и фактов
+"""
+import pytest
+
+from conftest import table_counts
+from etl.checkpoints import CheckpointStore
+from etl.load import DataLoader
+from pipeline import Pipeline, StageRunner
+
+DWH_TABLES = ('dim_customer', 'dim_account', 'dim_branch', 'dim_date',
+              'dim_transaction_type', 'fact_transactions', 'agg_daily_channel')
+
+
+def make_pipeline(config, db, transformed):
+    """Пайплайн с результатом шага 6 и подключением к временной базе"""
+    pipeline = Pipeline(config, streaming=False)
+    pipeline.db = db
+    pipeline.transformed = transformed
+    pipeline.state = {'transactions_range': None}
+    return pipeline
+
+
+def make_runner(store):
+    """StageRunner запуска 'test' с отметкой о выполненном шаге 6"""
+    runner = StageRunner(store, run_id='test')
+    runner.hashes['6_transform'] = 'transformed'
+    return runner
+
+
+class InjectedFailure(Exception):
+    pass
+
+
+def test_resume_after_failure_following_fact_load(db, transformed, tmp_path, config):
+    store = CheckpointStore(tmp_path)
+    pipeline = make_pipeline(config, db, transformed)
+
+    def fail(*args, **kwargs):
+        raise InjectedFailure()
+
+    # Сбой на пересчете агрегатов - факты уже загружены и зафиксированы
+    pipeline.loader.refresh_aggregates = fail
+    with pytest.raises(InjectedFailure):
+        pipeline.run_load_steps(make_runner(store), {})
+    loaded = table_counts(db, *DWH_TABLES)
+    assert loaded['fact_transactions'] > 0
+
+    resumed = make_pipeline(config, db, transformed)
+    resumed.run_load_steps(make_runner(store), {})
+
+    counts = table_counts(db, *DWH_TABLES)
+    assert counts['fact_transactions'] == loaded['fact_transactions']
+    assert counts['dim_account'] == loaded['dim_account']
+    assert counts['agg_daily_channel'] > 0
+
+
+def test_replay_of_committed_fact_load(db, transformed, tmp_path, config):
+    store = CheckpointStore(tmp_path)
+    save = store.save
+
+    def save_failing_on_fact(stage, *args, **kwargs):
+        # Факты зафиксированы в БД, но контрольная точка шага не записана
+        if stage == '7b_load_fact':
+            raise InjectedFailure()
+        return save(stage, *args, **kwargs)
+
+    store.save = save_failing_on_fact
+    with pytest.raises(InjectedFailure):
+        make_pipeline(config, db, transformed).run_load_steps(make_runner(store), {})
+    loaded = table_counts(db, *DWH_TABLES)
+
+    # Повтор выполняет 7b заново: загрузка фактов идемпотентна
+    store.save = save
+    make_pipeline(config, db, transformed).run_load_steps(make_runner(store), {})
+
+    counts = table_counts(db, *DWH_TABLES)
+    assert counts['fact_transactions'] == loaded['fact_transactions'] > 0
+    for dimension in ('dim_customer', 'dim_account', 'dim_branch', 'dim_date',
+                      'dim_transaction_type'):
+        assert counts[dimension] == loaded[dimension]
+
+
+@pytest.mark.parametrize('mode', ['pandas', 'elt'])
+def test_fact_load_is_idempotent(db, transformed, mode):
+    loader = DataLoader(db)
+    loader.load_dimensions(transformed['customers'], transformed['accounts'],
+                           transformed['branches'], transformed['date_dim'])
+    for _ in range(2):
+        if mode == 'elt':
+            loader.load_fact_table_elt()
+        else:
+            loader.load_fact_table(transformed['transactions'])
+        loader.load_dimensions(transformed['customers'], transformed['accounts'],
+                               transformed['branches'], transformed['date_dim'])
+
+    counts = table_counts(db, 'fact_transactions', 'dim_account', 'dim_transaction_type')
+    assert counts['fact_transactions'] == len(loader._build_fact_data(transformed['transactions']))
+    assert counts['dim_account'] == len(transformed['accounts'])
+    assert counts['dim_transaction_type'] == 5
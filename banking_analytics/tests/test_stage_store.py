@@ -0,0 +1,43 @@
+# tests/test_stage_store.py
+"""
+Parquet staging-хранилище: побеждает первая запись ключа, как ON CONFLICT DO NOTHING
+"""
+import pandas as pd
+import pytest
+
+from etl.stage_store import ParquetStageStore
+
+pytest.importorskip('pyarrow')
+
+
+def transactions(ids, amount, day):
+    return pd.DataFrame({
+        'transaction_id': ids,
+        'account_id': 1,
+        'transaction_date': pd.Timestamp(day),
+        'amount': float(amount),
+    })
+
+
+def test_same_key_twice_keeps_first_write(tmp_path):
+    store = ParquetStageStore(tmp_path)
+    store.write(pd.DataFrame({'branch_id': [1, 2], 'branch_name': ['first', 'first']}),
+                'branches')
+    store.write(pd.DataFrame({'branch_id': [2, 3], 'branch_name': ['second', 'second']}),
+                'branches')
+
+    stored = store.read('branches').sort_values('branch_id')
+    assert stored['branch_id'].tolist() == [1, 2, 3]
+    assert stored['branch_name'].tolist() == ['first', 'first', 'second']
+
+
+def test_partitioned_same_key_twice_keeps_first_write(tmp_path):
+    store = ParquetStageStore(tmp_path)
+    store.write(transactions([1, 2], 100, '2024-01-01'), 'transactions')
+    # Ключ 2 повторно с другой суммой и в другой день - хранимая строка остается
+    store.write(transactions([2, 3], 200, '2024-01-02'), 'transactions')
+
+    stored = store.read('transactions').sort_values('transaction_id')
+    assert stored['transaction_id'].tolist() == [1, 2, 3]
+    assert stored['amount'].tolist() == [100.0, 100.0, 200.0]
+    assert stored['transaction_date'].dt.day.tolist() == [1, 1, 2]